@@ -0,0 +1,451 @@
+"""
+Define a bounding volume hierarchy over world space boxes of scene objects, for culling and ray queries.
+The tree is a linear BVH: objects are sorted along a Morton curve through their box centers, then grouped in leaves of
+a few objects and paired up into a complete binary tree stored in heap order. Building, refitting and queries all work
+on whole tree levels with NumPy, so there is no per-node Python code.
+First version in 10/18/2026
+
+:author: Zack(Wanzhi Wang)
+:version: 2026.10.18
+"""
+
+import time
+
+import numpy as np
+
+from Displayable import Displayable
+
+# corners of an empty box. Finite, so empty boxes fail every test without producing nan
+EMPTY = 1e30
+# levels a ray query descends per test. A ray crosses few boxes, so testing 8 grandchildren costs about the same as 2
+RAY_STRIDE = 3
+
+
+def spreadBits(x):
+    """
+    Insert two zero bits between each of the lower 10 bits of x, for 30-bit 3D Morton codes
+    """
+    x = x.astype(np.uint32) & 0x3FF
+    x = (x | (x << 16)) & 0x030000FF
+    x = (x | (x << 8)) & 0x0300F00F
+    x = (x | (x << 4)) & 0x030C30C3
+    x = (x | (x << 2)) & 0x09249249
+    return x
+
+
+def mortonCodes(points, boxMin, boxMax):
+    """
+    :param points: points in shape (n, 3)
+    :param boxMin: minimum corner of the box the points are quantized in
+    :param boxMax: maximum corner of the box the points are quantized in
+    :return: 30-bit Morton code of every point
+    :rtype: numpy.ndarray
+    """
+    size = np.where(boxMax > boxMin, boxMax - boxMin, 1)
+    grid = np.clip((points - boxMin) / size * 1023, 0, 1023)
+    return (spreadBits(grid[:, 0]) << 2) | (spreadBits(grid[:, 1]) << 1) | spreadBits(grid[:, 2])
+
+
+def componentBounds(components):
+    """
+    World space boxes of Components, from their Displayables' local boxes and transformationMat.
+    Components without a Displayable get empty boxes.
+
+    :param components: Components to measure
+    :type components: list
+    :return: box minimum corners and maximum corners, both in shape (n, 3)
+    :rtype: tuple
+    """
+    n = len(components)
+    localMin = np.full((n, 3), EMPTY)
+    localMax = np.full((n, 3), -EMPTY)
+    matrices = np.tile(np.identity(4), (n, 1, 1))
+    for i, c in enumerate(components):
+        if isinstance(c.displayObj, Displayable) and c.transformationMat is not None:
+            _, _, localMin[i], localMax[i] = c.displayObj.localBounds()
+            matrices[i] = c.transformationMat
+    valid = localMin[:, 0] <= localMax[:, 0]
+
+    # all 8 corners, transformed as row vectors since matrices are stored in column-major order
+    select = np.array([[(k >> axis) & 1 for axis in range(3)] for k in range(8)], dtype=bool)
+    corners = np.where(select[np.newaxis], localMax[:, np.newaxis, :], localMin[:, np.newaxis, :])
+    corners = np.concatenate([corners, np.ones((n, 8, 1))], axis=2) @ matrices
+    corners = corners[:, :, 0:3] / corners[:, :, 3:4]
+    boxMin = np.where(valid[:, np.newaxis], corners.min(axis=1), EMPTY)
+    boxMax = np.where(valid[:, np.newaxis], corners.max(axis=1), -EMPTY)
+    return boxMin, boxMax
+
+
+class BVH:
+    """
+    Complete binary tree in heap order: node i has children 2i+1 and 2i+2, and the leaves are the last leafNum nodes.
+    Leaf k holds objects order[k * leafSize:(k + 1) * leafSize]. Every node stores the box around its objects.
+    """
+    leafSize = 4
+
+    objectNum = 0
+    depth = 0  # levels below the root
+    leafNum = 0
+    order = None  # object indices sorted along the Morton curve, padded with -1
+    slots = None  # position of every object in order, the inverse of order
+    nodeMin = None  # (nodeNum, 3)
+    nodeMax = None  # (nodeNum, 3)
+    objectMin = None  # current object boxes, (objectNum, 3)
+    objectMax = None
+    objects = None  # optional payload, like the Components the boxes came from
+    # trees built by fromComponent are told about moved Components, refitComponents refits only those
+    changed = None  # set of object indices Component.update recomputed since the last refitComponents
+    graphRows = None  # FlatSceneGraph -> (object indices, node indices, world matrices at the last refit)
+
+    def __init__(self, boxMin, boxMax, objects=None, leafSize=4):
+        """
+        :param boxMin: object box minimum corners in shape (n, 3)
+        :type boxMin: numpy.ndarray
+        :param boxMax: object box maximum corners in shape (n, 3)
+        :type boxMax: numpy.ndarray
+        :param objects: anything indexed like the boxes, returned by the query helpers
+        :type objects: list
+        :param leafSize: maximum number of objects in a leaf
+        :type leafSize: int
+        """
+        self.leafSize = leafSize
+        self.objects = objects
+        self.changed = set()
+        self.graphRows = {}
+        self.build(boxMin, boxMax)
+
+    @classmethod
+    def fromComponent(cls, root, leafSize=4):
+        """
+        Build over all Components with a Displayable in a Component tree. Call root.update() before this.
+        The Components are bound to the tree, Component.update reports their new transformations through markChanged.
+
+        :type root: Component
+        :rtype: BVH
+        """
+        components = []
+        stack = [root]
+        while stack:
+            c = stack.pop()
+            if isinstance(c.displayObj, Displayable):
+                components.append(c)
+            stack.extend(c.children)
+        tree = cls(*componentBounds(components), objects=components, leafSize=leafSize)
+        graphRows = {}
+        for i, c in enumerate(components):
+            c.bvh = tree
+            c.bvhIndex = i
+            if c.sceneGraph is not None:
+                graphRows.setdefault(c.sceneGraph, ([], []))
+                graphRows[c.sceneGraph][0].append(i)
+                graphRows[c.sceneGraph][1].append(c.nodeIndex)
+        for graph, (indices, nodes) in graphRows.items():
+            nodes = np.array(nodes)
+            tree.graphRows[graph] = (np.array(indices), nodes, graph.worldMats[nodes].copy())
+        return tree
+
+    def release(self):
+        """
+        Unbind the Components of a tree built by fromComponent
+        """
+        for c in self.objects or ():
+            if c.bvh is self:
+                c.bvh = None
+                c.bvhIndex = None
+        self.changed = set()
+        self.graphRows = {}
+
+    def markChanged(self, index):
+        """
+        Record that an object moved, it is refit by the next refitComponents
+        """
+        self.changed.add(index)
+
+    def refitComponents(self):
+        """
+        Refit the boxes of the Components which moved since the last call: those reported through markChanged, and
+        those bound to a FlatSceneGraph whose world matrices changed, which are found with one comparison per graph.
+
+        :return: number of refit objects
+        :rtype: int
+        """
+        for graph, (indices, nodes, mats) in self.graphRows.items():
+            current = graph.worldMats[nodes]
+            moved = np.flatnonzero(np.any(current != mats, axis=(1, 2)))
+            if moved.size:
+                mats[moved] = current[moved]
+                self.changed.update(indices[moved].tolist())
+        if not self.changed:
+            return 0
+        changed = np.fromiter(self.changed, dtype=np.int64, count=len(self.changed))
+        self.changed = set()
+        self.objectMin[changed], self.objectMax[changed] = componentBounds([self.objects[i] for i in changed])
+        self.refit(self.objectMin, self.objectMax, changed)
+        return changed.size
+
+    def build(self, boxMin, boxMax):
+        """
+        Sort objects along the Morton curve and build the tree over them
+        """
+        boxMin = np.asarray(boxMin, dtype=np.float64)
+        boxMax = np.asarray(boxMax, dtype=np.float64)
+        self.objectNum = boxMin.shape[0]
+        self.leafNum = max(1, -(-self.objectNum // self.leafSize))
+        self.depth = int(np.ceil(np.log2(self.leafNum))) if self.leafNum > 1 else 0
+        self.leafNum = 1 << self.depth
+
+        valid = boxMin[:, 0] <= boxMax[:, 0]
+        centers = (boxMin + boxMax) / 2
+        if valid.any():
+            codes = mortonCodes(centers, centers[valid].min(axis=0), centers[valid].max(axis=0))
+        else:
+            codes = np.zeros(self.objectNum, dtype=np.uint32)
+        self.order = np.full(self.leafNum * self.leafSize, -1, dtype=np.int64)
+        self.order[:self.objectNum] = np.argsort(codes, kind="stable")
+        self.slots = np.empty(self.objectNum, dtype=np.int64)
+        self.slots[self.order[:self.objectNum]] = np.arange(self.objectNum)
+
+        nodeNum = 2 * self.leafNum - 1
+        self.nodeMin = np.empty((nodeNum, 3))
+        self.nodeMax = np.empty((nodeNum, 3))
+        self.refit(boxMin, boxMax)
+
+    def leafStart(self):
+        return self.leafNum - 1
+
+    def refit(self, boxMin, boxMax, changed=None):
+        """
+        Update boxes after objects moved, keeping the tree structure. Far moves make the tree looser, call build again
+        if queries slow down.
+
+        :param boxMin: new object box minimum corners in shape (n, 3)
+        :param boxMax: new object box maximum corners in shape (n, 3)
+        :param changed: indices of the objects which moved. If given, only their leaves and ancestors are refit
+        :type changed: numpy.ndarray
+        """
+        self.objectMin = np.asarray(boxMin, dtype=np.float64)
+        self.objectMax = np.asarray(boxMax, dtype=np.float64)
+        padded = self.order >= 0
+        first = self.leafStart()
+        if self.objectNum == 0:
+            self.nodeMin[:] = EMPTY
+            self.nodeMax[:] = -EMPTY
+            return
+
+        if changed is None:
+            leafMin = np.where(padded[:, np.newaxis], self.objectMin[self.order], EMPTY)
+            leafMax = np.where(padded[:, np.newaxis], self.objectMax[self.order], -EMPTY)
+            self.nodeMin[first:] = leafMin.reshape(self.leafNum, self.leafSize, 3).min(axis=1)
+            self.nodeMax[first:] = leafMax.reshape(self.leafNum, self.leafSize, 3).max(axis=1)
+            for level in range(self.depth - 1, -1, -1):
+                start, end = (1 << level) - 1, (1 << (level + 1)) - 1
+                children = slice(2 * start + 1, 2 * end + 1)
+                self.nodeMin[start:end] = self.nodeMin[children].reshape(-1, 2, 3).min(axis=1)
+                self.nodeMax[start:end] = self.nodeMax[children].reshape(-1, 2, 3).max(axis=1)
+            return
+
+        leaves = np.unique(self.slots[np.asarray(changed)] // self.leafSize)
+        members = self.order.reshape(self.leafNum, self.leafSize)[leaves]
+        valid = members >= 0
+        safe = np.where(valid, members, 0)
+        self.nodeMin[first + leaves] = np.where(valid[:, :, np.newaxis], self.objectMin[safe], EMPTY).min(axis=1)
+        self.nodeMax[first + leaves] = np.where(valid[:, :, np.newaxis], self.objectMax[safe], -EMPTY).max(axis=1)
+        nodes = first + leaves
+        while nodes.size and nodes[0] > 0:
+            nodes = np.unique((nodes - 1) // 2)
+            self.nodeMin[nodes] = np.minimum(self.nodeMin[2 * nodes + 1], self.nodeMin[2 * nodes + 2])
+            self.nodeMax[nodes] = np.maximum(self.nodeMax[2 * nodes + 1], self.nodeMax[2 * nodes + 2])
+
+    def _traverse(self, test, stride=1):
+        """
+        Walk down the tree stride levels at a time, keeping the nodes for which test(nodes) is True
+
+        :param test: callable(node indices) -> mask
+        :param stride: levels to skip per test. Skipping changes nothing but the number of tests, since a box
+                       contains every box below it, so narrow queries take several levels at once
+        :return: object indices in the leaves reached
+        :rtype: numpy.ndarray
+        """
+        nodes = np.zeros(1, dtype=np.int64)
+        nodes = nodes[test(nodes)]
+        level = 0
+        while level < self.depth:
+            if nodes.size == 0:
+                return nodes
+            step = min(stride, self.depth - level)
+            # descendants of node i step levels down are (i + 1) * 2^step - 1 onwards
+            nodes = ((nodes[:, np.newaxis] + 1 << step) - 1 + np.arange(1 << step)).ravel()
+            nodes = nodes[test(nodes)]
+            level += step
+        leaves = nodes - self.leafStart()
+        objects = self.order.reshape(self.leafNum, self.leafSize)[leaves].ravel()
+        return objects[objects >= 0]
+
+    def frustumQuery(self, frustum):
+        """
+        :param frustum: view frustum
+        :type frustum: Frustum
+        :return: indices of the objects whose boxes may be inside the frustum
+        :rtype: numpy.ndarray
+        """
+        objects = self._traverse(lambda nodes: frustum.boxesVisible(self.nodeMin[nodes], self.nodeMax[nodes]))
+        return objects[frustum.boxesVisible(self.objectMin[objects], self.objectMax[objects])]
+
+    @staticmethod
+    def raySlabs(direction):
+        """
+        Per-axis terms of the slab test which only depend on the ray, computed once per query
+
+        :return: indices of the axes the ray is parallel to, inverse direction, and mask of positive axes
+        :rtype: tuple
+        """
+        zero = direction == 0
+        inverse = 1 / np.where(zero, 1, direction)
+        return np.flatnonzero(zero), inverse, inverse > 0
+
+    @staticmethod
+    def rayBoxes(origin, direction, boxMin, boxMax, maxDistance=np.inf, slabs=None):
+        """
+        Slab test of one ray against many boxes
+
+        :param slabs: result of raySlabs(direction), to skip recomputing it for every call of the same ray
+        :return: mask of hit boxes, and the entry distance along the ray of every box
+        :rtype: tuple
+        """
+        parallel, inverse, positive = BVH.raySlabs(direction) if slabs is None else slabs
+        # pick the near and far corner of every box by the direction sign, so empty boxes with min > max are missed
+        near = (np.where(positive, boxMin, boxMax) - origin) * inverse
+        far = (np.where(positive, boxMax, boxMin) - origin) * inverse
+        inside = True
+        if parallel.size:
+            # a ray parallel to a slab only hits boxes whose slab contains the origin
+            near[:, parallel] = -np.inf
+            far[:, parallel] = np.inf
+            inside = ((boxMin[:, parallel] <= origin[parallel]) & (origin[parallel] <= boxMax[:, parallel])).all(axis=1)
+        tNear = near.max(axis=1)
+        tFar = far.min(axis=1)
+        hit = inside & (tNear <= tFar) & (tFar >= 0) & (tNear <= maxDistance)
+        return hit, np.maximum(tNear, 0)
+
+    def rayQuery(self, origin, direction, maxDistance=np.inf):
+        """
+        Find objects whose boxes a ray passes through
+
+        :param origin: ray origin in world space
+        :type origin: numpy.ndarray
+        :param direction: ray direction in world space, doesn't need to be normalized
+        :type direction: numpy.ndarray
+        :param maxDistance: ignore boxes entered further than this, in units of direction length
+        :type maxDistance: float
+        :return: hit object indices sorted by entry distance, and their entry distances
+        :rtype: tuple
+        """
+        origin = np.asarray(origin, dtype=np.float64)
+        direction = np.asarray(direction, dtype=np.float64)
+        slabs = self.raySlabs(direction)
+        objects = self._traverse(lambda nodes: self.rayBoxes(origin, direction, self.nodeMin[nodes],
+                                                             self.nodeMax[nodes], maxDistance, slabs)[0],
+                                 stride=RAY_STRIDE)
+        hit, distances = self.rayBoxes(origin, direction, self.objectMin[objects], self.objectMax[objects],
+                                       maxDistance, slabs)
+        objects, distances = objects[hit], distances[hit]
+        order = np.argsort(distances, kind="stable")
+        return objects[order], distances[order]
+
+    @staticmethod
+    def boxDistances(point, boxMin, boxMax):
+        """
+        :return: shortest and longest distance from point to every box
+        :rtype: tuple
+        """
+        nearest = np.maximum(np.maximum(boxMin - point, point - boxMax), 0)
+        furthest = np.maximum(np.abs(point - boxMin), np.abs(point - boxMax))
+        return np.linalg.norm(nearest, axis=1), np.linalg.norm(furthest, axis=1)
+
+    def nearest(self, point):
+        """
+        Find the object whose box is closest to point, 0 if point is inside it
+
+        :param point: query point in world space
+        :type point: numpy.ndarray
+        :return: object index and distance, or (-1, inf) if there is no object
+        :rtype: tuple
+        """
+        point = np.asarray(point, dtype=np.float64)
+
+        def test(nodes):
+            # some object lies within the furthest distance of every non-empty node, so no object can be closer than
+            # the smallest such distance, prune nodes which cannot have anything nearer
+            near, far = self.boxDistances(point, self.nodeMin[nodes], self.nodeMax[nodes])
+            nonEmpty = self.nodeMin[nodes, 0] <= self.nodeMax[nodes, 0]
+            if not nonEmpty.any():
+                return nonEmpty
+            return nonEmpty & (near <= far[nonEmpty].min())
+
+        objects = self._traverse(test)
+        if objects.size == 0:
+            return -1, np.inf
+        distances, _ = self.boxDistances(point, self.objectMin[objects], self.objectMax[objects])
+        best = np.argmin(distances)
+        return int(objects[best]), float(distances[best])
+
+
+def benchmark(counts=(1000, 10000, 100000), queries=100):
+    """
+    Print build, refit and query time of random boxes against object count
+    """
+    from Frustum import Frustum
+    from GLUtility import GLUtility
+
+    rng = np.random.default_rng(0)
+    glUtility = GLUtility()
+    frustum = Frustum(glUtility.view([0, 0, 60], [0, 0, 0], [0, 1, 0]),
+                      glUtility.perspective(45, 800, 600, 0.01, 100))
+    print("objects   build(ms)  refit(ms)  refit 1%(ms)  frustum(ms)  ray(ms)  nearest(ms)  linear ray(ms)")
+    for n in counts:
+        centers = rng.uniform(-50, 50, (n, 3))
+        halfSize = rng.uniform(0.1, 0.5, (n, 1))
+
+        start = time.perf_counter()
+        bvh = BVH(centers - halfSize, centers + halfSize)
+        buildTime = time.perf_counter() - start
+
+        centers += rng.normal(0, 0.1, (n, 3))
+        start = time.perf_counter()
+        bvh.refit(centers - halfSize, centers + halfSize)
+        refitTime = time.perf_counter() - start
+
+        moved = rng.choice(n, max(1, n // 100), replace=False)
+        centers[moved] += rng.normal(0, 0.1, (moved.size, 3))
+        start = time.perf_counter()
+        bvh.refit(centers - halfSize, centers + halfSize, moved)
+        partialTime = time.perf_counter() - start
+
+        start = time.perf_counter()
+        bvh.frustumQuery(frustum)
+        frustumTime = time.perf_counter() - start
+
+        origins = rng.uniform(-50, 50, (queries, 3))
+        directions = rng.normal(size=(queries, 3))
+        start = time.perf_counter()
+        for o, d in zip(origins, directions):
+            bvh.rayQuery(o, d)
+        rayTime = (time.perf_counter() - start) / queries
+
+        start = time.perf_counter()
+        for o in origins:
+            bvh.nearest(o)
+        nearestTime = (time.perf_counter() - start) / queries
+
+        start = time.perf_counter()
+        for o, d in zip(origins, directions):
+            BVH.rayBoxes(o, d, centers - halfSize, centers + halfSize)
+        linearTime = (time.perf_counter() - start) / queries
+
+        print(f"{n:>7}  {buildTime * 1000:>10.2f} {refitTime * 1000:>10.2f} {partialTime * 1000:>13.2f} "
+              f"{frustumTime * 1000:>12.2f} {rayTime * 1000:>8.3f} {nearestTime * 1000:>12.3f} "
+              f"{linearTime * 1000:>15.3f}")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -17,6 +17,8 @@ from Material import Material
 from Point import Point
 from ColorType import ColorType
 from Displayable import Displayable
+from Frustum import Frustum
+from RenderQueue import RenderQueue
 from Quaternion import Quaternion
 from GLUtility import GLUtility
 from GLBuffer import Texture
@@ -49,9 +51,32 @@ except ImportError:
 
 class Component:
     children = None  # list
-
-    # the homogeneous transformation matrix for the current joint
-    transformationMat = None
+    parent = None  # Component, set by addChild
+
+    # the homogeneous transformation matrix for the current joint, see the transformationMat property
+    _transformationMat = None
+    # its inverse transpose for shading normals, computed on the first read after transformationMat changed
+    _normalMat = None
+
+    # set by FlatSceneGraph.fromComponent. A bound component pushes changed parameters into the graph's arrays, and its
+    # transformationMat is a view on the graph's world matrix. Flatten again after changing the tree structure
+    sceneGraph = None
+    nodeIndex = None
+
+    # this joint's own transformation without the parent's one. It is cached, and only rebuilt when localDirty is set
+    localMat = None
+    # localDirty is set when any of this joint's own transformation parameters changed. worldDirty is set on the
+    # changed joint and all its ancestors, so update can skip any subtree in which nothing changed
+    localDirty = True
+    worldDirty = True
+    parentMat = None  # parent transformation matrix transformationMat was last computed with
+
+    # world space bounding spheres, updated together with transformationMat. They are None if there is nothing to draw
+    boundingCenter = None  # this component's Displayable
+    boundingRadius = None
+    subtreeCenter = None  # this component and all its descendants
+    subtreeRadius = None
+    drawableNum = 0  # number of Displayables in this subtree
 
     # a instance of class which inherit from Displayable
     # if this class is used as skeleton, then keep this empty
@@ -85,6 +110,22 @@ class Component:
     material = None
     renderingRouting = None
 
+    # instanced rendering: None to be grouped automatically with Components sharing the same mesh, False to never be
+    # instanced, anything else to be grouped with the Components declaring the same key
+    instanceKey = None
+    instanceGroup = None  # the InstanceGroup drawing this component, Component.draw skips it if set
+    instanceIndex = None
+
+    # static subtrees are baked into merged world space meshes, staticBatch is the StaticBatch drawing this component
+    static = False
+    staticBatch = None
+    # the IndirectRenderer drawing this component, and its row there
+    indirectRenderer = None
+    drawIndex = None
+    # the BVH built over this component, and its object index there
+    bvh = None
+    bvhIndex = None
+
     glUtility = None
 
     def __init__(self, position, display_obj=None):
@@ -141,16 +182,36 @@ class Component:
         # prevent the duplicate child to be added to the self.children
         if child not in self.children:
             self.children.append(child)
+            child.parent = self
+            child.markDirty()
 
     def clear(self):
         """
         remove all children and destroy them
         """
-        for c in self.children:
+        for c in list(self.children):
             c.clear()
+            # give back the shared mesh, so geometry cache knows it is no longer used by this child
+            if isinstance(c.displayObj, Displayable):
+                c.displayObj.releaseMesh()
             self.children.remove(c)
             del c
 
+    def prefetch(self):
+        """
+        Start generating the geometry of this component and all its children in background threads, so a following
+        initialize only needs to upload it
+
+        :return: futures of all started generations
+        :rtype: list
+        """
+        futures = []
+        if isinstance(self.displayObj, Displayable):
+            futures.append(self.displayObj.prefetch())
+        for c in self.children:
+            futures.extend(c.prefetch())
+        return futures
+
     def initialize(self):
         """
         Initialize this component and all its children
@@ -160,6 +221,11 @@ class Component:
         """
         if isinstance(self.displayObj, Displayable):
             self.displayObj.initialize()
+            # the Displayable may have a new shape, so its bounding sphere has to be recomputed
+            self.markDirty()
+            # and its baked vertices too
+            if self.staticBatch is not None:
+                self.staticBatch.rebake()
 
         for c in self.children:
             c.initialize()
@@ -167,49 +233,189 @@ class Component:
         # use init value to generate transformation matrix for all children
         self.update()
 
-    def draw(self, shaderProg):
-        if isinstance(self.displayObj, Displayable):
-            shaderProg.setMat4("modelMat", self.transformationMat)
-            shaderProg.setVec4("diffuse", self.material.diffuse)
-            shaderProg.setVec4("specular", self.material.specular)
-            shaderProg.setVec4("ambient", self.material.ambient)
-            shaderProg.setFloat("highlight", self.material.highLight)
-            shaderProg.setFragmentShaderRouting(self.renderingRouting)
-            if self.textureOn:
-                shaderProg.use()
-                self.texture.bind(shaderProg.getUniformLocation("textureImage"))
-            else:
-                shaderProg.use()
-                self.texture.unbind(shaderProg.getUniformLocation("textureImage"))
-            self.displayObj.draw()
+    def draw(self, shaderProg, frustum=None, stats=None):
+        """
+        Draw this component and all its children, sorted by state through a RenderQueue
+
+        :param shaderProg: the GLProgram to draw with
+        :type shaderProg: GLProgram
+        :param frustum: if given, Displayables and whole subtrees whose bounding spheres are outside it are skipped
+        :type frustum: Frustum
+        :param stats: if given, its "drawn" and "culled" counts are increased by the number of Displayables drawn and \
+        skipped, and the queue adds its state change counts
+        :type stats: dict
+        """
+        queue = RenderQueue()
+        self.enqueue(queue, frustum, stats)
+        queue.sort()
+        queue.flush(shaderProg, stats)
+
+    def enqueue(self, queue, frustum=None, stats=None):
+        """
+        Push a draw packet for this component and all its visible children into a render queue
+
+        :type queue: RenderQueue
+        :param frustum: if given, Displayables and whole subtrees whose bounding spheres are outside it are skipped
+        :type frustum: Frustum
+        :param stats: if given, its "drawn" and "culled" counts are increased by the number of Displayables queued and \
+        skipped
+        :type stats: dict
+        """
+        if frustum is not None and self.subtreeRadius is not None:
+            side = frustum.classifySphere(self.subtreeCenter, self.subtreeRadius)
+            if side == Frustum.OUTSIDE:
+                if stats is not None:
+                    stats["culled"] += self.drawableNum
+                return
+            if side == Frustum.INSIDE:
+                # everything below is inside too, no need to test any more
+                frustum = None
+
+        visible = frustum is None or self.boundingRadius is None or \
+            frustum.intersectsSphere(self.boundingCenter, self.boundingRadius)
+        # members of an instance group, a static batch or an indirect renderer are drawn by them
+        drawable = isinstance(self.displayObj, Displayable) and self.instanceGroup is None and \
+            self.staticBatch is None and self.indirectRenderer is None
+        if drawable and not visible:
+            if stats is not None:
+                stats["culled"] += 1
+        elif drawable:
+            if stats is not None:
+                stats["drawn"] += 1
+            queue.push(self)
 
         for c in self.children:
-            c.draw(shaderProg)
+            c.enqueue(queue, frustum, stats)
+
+    def markDirty(self):
+        """
+        Mark this component's own transformation as changed, the next update will recompute it and its subtree.
+        Every setter which changes position, angle, scaling or rotation axes calls this.
+
+        :return: None
+        """
+        if self.sceneGraph is not None:
+            self.sceneGraph.pullComponent(self.nodeIndex, self)
+            return
+        self.localDirty = True
+        self.worldDirty = True
+        # an ancestor with worldDirty set already has its whole path to the root marked
+        c = self.parent
+        while c is not None and not c.worldDirty:
+            c.worldDirty = True
+            c = c.parent
 
     def update(self, parentTransformationMat=None):
         """
         Apply translation, rotation and scaling to this component and all its children
         all matrix are stored in column-major order
-        Must be called after any changes made to the instance
+        Only subtrees with a changed component or a changed parent matrix are recomputed, so calling this every frame
+        on a static scene is cheap
 
         :return: None
         """
+        if self.sceneGraph is not None:
+            # the whole flattened tree is composed level by level in one go
+            self.sceneGraph.update(parentTransformationMat)
+            return
         if parentTransformationMat is None:
             parentTransformationMat = np.identity(4)
 
-        translationMat = self.glUtility.translate(*self.currentPos.getCoords())
-        rotationMatU = self.glUtility.rotate(self.uAngle, self.uAxis)
-        rotationMatV = self.glUtility.rotate(self.vAngle, self.vAxis)
-        rotationMatW = self.glUtility.rotate(self.wAngle, self.wAxis)
-        scalingMat = self.glUtility.scale(*(min(self.currentScaling) * np.ones(3)))
-
-        # remember that all above matrix are store in column-major, which is the transpose of row-major
-        # be careful about the applying order
-        self.transformationMat = scalingMat @ self.preRotationMat @ rotationMatW @ rotationMatV @ rotationMatU @ \
-                                 self.postRotationMat @ translationMat @ parentTransformationMat
+        # children get their parent's cached matrix object, so an unchanged parent is found with an identity check
+        parentChanged = parentTransformationMat is not self.parentMat and \
+            (self.parentMat is None or not np.array_equal(parentTransformationMat, self.parentMat))
+        if not parentChanged and not self.worldDirty:
+            return
+
+        if self.localDirty:
+            translationMat = self.glUtility.translate(*self.currentPos.getCoords())
+            rotationMatU = self.glUtility.rotate(self.uAngle, self.uAxis)
+            rotationMatV = self.glUtility.rotate(self.vAngle, self.vAxis)
+            rotationMatW = self.glUtility.rotate(self.wAngle, self.wAxis)
+            scalingMat = self.glUtility.scale(*(min(self.currentScaling) * np.ones(3)))
+
+            # remember that all above matrix are store in column-major, which is the transpose of row-major
+            # be careful about the applying order
+            self.localMat = scalingMat @ self.preRotationMat @ rotationMatW @ rotationMatV @ rotationMatU @ \
+                self.postRotationMat @ translationMat
+
+        if self.localDirty or parentChanged:
+            self.transformationMat = self.localMat @ parentTransformationMat
+            self.parentMat = parentTransformationMat
+            self.updateBounds()
+            if self.instanceGroup is not None:
+                self.instanceGroup.markChanged(self)
+            # initialize marks every node dirty, a member keeps its batch as long as its matrix stays the same
+            if self.staticBatch is not None and self.staticBatch.moved(self):
+                self.staticBatch.remove(self)
+            if self.indirectRenderer is not None:
+                self.indirectRenderer.markChanged(self)
+            if self.bvh is not None:
+                self.bvh.markChanged(self.bvhIndex)
+        self.localDirty = False
+        self.worldDirty = False
 
         for c in self.children:
             c.update(self.transformationMat)
+        self.updateSubtreeBounds()
+
+    def updateBounds(self):
+        """
+        Transform the Displayable's local bounding sphere with transformationMat
+        """
+        if not isinstance(self.displayObj, Displayable):
+            return
+        center, radius, _, _ = self.displayObj.localBounds()
+        # points are row vectors multiplied on the left, since matrices are stored in column-major order
+        self.boundingCenter = np.append(center, 1) @ self.transformationMat
+        self.boundingCenter = self.boundingCenter[0:3] / self.boundingCenter[3]
+        self.boundingRadius = radius * np.max(np.linalg.norm(self.transformationMat[0:3, 0:3], axis=1))
+
+    def updateSubtreeBounds(self):
+        """
+        Find a sphere enclosing this component's own sphere and all children's subtree spheres
+        """
+        centers = []
+        radii = []
+        self.drawableNum = 0
+        if self.boundingRadius is not None:
+            centers.append(self.boundingCenter)
+            radii.append(self.boundingRadius)
+            self.drawableNum = 1
+        for c in self.children:
+            if c.subtreeRadius is not None:
+                centers.append(c.subtreeCenter)
+                radii.append(c.subtreeRadius)
+            self.drawableNum += c.drawableNum
+        if not centers:
+            self.subtreeCenter = None
+            self.subtreeRadius = None
+            return
+        centers = np.array(centers)
+        radii = np.array(radii)
+        # center the enclosing sphere on the box around all spheres, then grow it to reach every sphere's far side
+        self.subtreeCenter = ((centers - radii[:, np.newaxis]).min(axis=0) +
+                              (centers + radii[:, np.newaxis]).max(axis=0)) / 2
+        self.subtreeRadius = float(np.max(np.linalg.norm(centers - self.subtreeCenter, axis=1) + radii))
+
+    @property
+    def transformationMat(self):
+        if self.sceneGraph is not None:
+            return self.sceneGraph.worldMats[self.nodeIndex]
+        return self._transformationMat
+
+    @transformationMat.setter
+    def transformationMat(self, mat):
+        self._transformationMat = mat
+        self._normalMat = None
+
+    @property
+    def normalMat(self):
+        if self.sceneGraph is not None:
+            return self.sceneGraph.normalMats[self.nodeIndex]
+        if self._normalMat is None:
+            self._normalMat = GLUtility.normalMatrix(self._transformationMat)
+        return self._normalMat
 
     def rotate(self, angle, axis):
         """
@@ -248,6 +454,7 @@ class Component:
             self.setU([1, 0, 0])
             self.setV([0, 1, 0])
             self.setW([0, 0, 1])
+        self.markDirty()
 
     def setRotateExtent(self, axis, minDeg=None, maxDeg=None):
         """
@@ -306,14 +513,42 @@ class Component:
         texture_image = np.array(texture_image, dtype=np.uint8)
         self.texture.setTextureImage(texture_image)
         self.textureOn = textureOn
+        if self.instanceGroup is not None:
+            self.instanceGroup.remove(self)
+        if self.staticBatch is not None:
+            self.staticBatch.remove(self)
+        if self.indirectRenderer is not None:
+            self.indirectRenderer.remove(self)
 
     def setMaterial(self, material: Material):
         if not isinstance(material, Material):
             raise TypeError("Error, material must has type Material")
         self.material = material
+        if self.instanceGroup is not None:
+            self.instanceGroup.markChanged(self)
+        if self.staticBatch is not None:
+            self.staticBatch.remove(self)
+        if self.indirectRenderer is not None:
+            self.indirectRenderer.markChanged(self)
 
     def setRenderingRouting(self, v):
         self.renderingRouting = v
+        if self.instanceGroup is not None:
+            self.instanceGroup.remove(self)
+        if self.staticBatch is not None:
+            self.staticBatch.remove(self)
+        if self.indirectRenderer is not None:
+            self.indirectRenderer.markChanged(self)
+
+    def setStatic(self, static=True):
+        """
+        Mark this component and its whole subtree as never moving, so a StaticBatcher bakes their Displayables into
+        merged world space meshes. Displayables are only merged with others of the same program, routing and texture,
+        and of the same material if their routing is lit, so a subtree where every lit shape has its own material
+        still draws those shapes one by one. It takes effect on the next build, Sketch builds when a scene is switched.
+        A baked component that changes anyway is taken out of its batch and drawn on its own.
+        """
+        self.static = static
 
     def setCurrentAngle(self, angle, axis):
         if axis not in self.axisBucket:
@@ -326,7 +561,7 @@ class Component:
             self.vAngle = self.clamp(angle, self.vRange[0], self.vRange[1])
         else:
             self.wAngle = self.clamp(angle, self.wRange[0], self.wRange[1])
-        self.update()
+        self.markDirty()
 
     def setDefaultAngle(self, angle, axis):
         """
@@ -347,6 +582,7 @@ class Component:
         else:
             self.default_wAngle = angle
             self.wAngle = angle
+        self.markDirty()
 
     def setDefaultPosition(self, pos):
         """
@@ -359,6 +595,7 @@ class Component:
             raise TypeError("pos should have type Point")
         self.defaultPos = pos.copy()
         self.currentPos = copy.deepcopy(self.defaultPos)
+        self.markDirty()
 
     def setDefaultScale(self, scale):
         """
@@ -374,7 +611,7 @@ class Component:
             raise ValueError("Component only accept uniform scaling")
         self.defaultScaling = copy.deepcopy(scale)
         self.currentScaling = copy.deepcopy(self.defaultScaling)
-        self.update()
+        self.markDirty()
 
     def setCurrentPosition(self, pos):
         """
@@ -386,7 +623,7 @@ class Component:
         if not isinstance(pos, Point):
             raise TypeError("pos should have type Point")
         self.currentPos = pos.copy()
-        self.update()
+        self.markDirty()
 
     def setCurrentScale(self, scale):
         """
@@ -401,7 +638,7 @@ class Component:
         if min(scale) != max(scale):
             raise ValueError("Component only accept uniform scaling")
         self.currentScaling = copy.deepcopy(scale)
-        self.update()
+        self.markDirty()
 
     def changeRotationAxis(self, u, v, w):
         """
@@ -444,6 +681,7 @@ class Component:
         """
         if isinstance(rotation_matrix, np.ndarray):
             self.preRotationMat = rotation_matrix
+            self.markDirty()
 
     def u(self):
         return self.uAxis.copy()
@@ -459,15 +697,18 @@ class Component:
             raise TypeError("axis should have the same size as the current one")
         for i in range(len(u)):
             self.uAxis[i] = u[i]
+        self.markDirty()
 
     def setV(self, v):
         if len(v) != len(self.vAxis):
             raise TypeError("axis should have the same size as the current one")
         for i in range(len(v)):
             self.vAxis[i] = v[i]
+        self.markDirty()
 
     def setW(self, w):
         if len(w) != len(self.wAxis):
             raise TypeError("axis should have the same size as the current one")
         for i in range(len(w)):
             self.wAxis[i] = w[i]
+        self.markDirty()
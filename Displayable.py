@@ -5,17 +5,209 @@ First version in 09/26/2018
 :author: micou(Zezhou Sun)
 :version: 2021.1.1
 """
+import concurrent.futures
+import inspect
+import threading
+
+import numpy as np
+
+import MeshOptimizer
+import ParametricSurface
+from GLBuffer import COMPACT_VERTEX_FORMAT
+from GeometryCache import geometryCache
+from MeshDiskCache import meshDiskCache
 
 
 class Displayable:
     """
     Interface for displayable object
     """
+    # vertices are always generated in 11 columns, vertexFormat decides how they are stored in VBO
+    # Column | 0:3                | 3:6           | 6:9          | 9:11
+    # Stores | Vertex coordinates | Vertex normal | Vertex Color | Vertex texture Coordinates
+    vertexFormat = COMPACT_VERTEX_FORMAT
+
+    # geometry is generated lazily, generate() only records which mesh this Displayable uses. vertices and indices are
+    # built on first access, and the shared GPUMesh with its VAO, VBO and EBO is acquired on first access to them
+    _meshKey = None
+    _codeVersion = None
+    _mesh = None  # GPUMesh shared with all Displayables of the same shape
+    _meshLock = None
+    _bounds = None  # local space bounding volumes, see localBounds
+
+    # reorder generated triangles and vertices for the GPU post-transform vertex cache. The geometry cache runs it once
+    # per shape and process. It is slow for big meshes, about 10 s at 1024x1024 on the first run, later runs load
+    # meshes of meshDiskCache.minVertices vertices or more from the on-disk mesh cache instead
+    optimizeVertexCache = False
+    optimizationReport = None  # ACMR/ATVR before and after, set when this Displayable ran the optimization
+
+    # merge duplicated vertices on seams and poles after generation. Vertices are only merged when their normal, color
+    # and texture coordinates also agree, so a textured seam keeps its split vertices
+    weldSeams = False
+    weldReport = None  # vertex count before and after, set when this Displayable ran the welding
+
+    # emit parametric surfaces as triangle strips with primitive restart instead of triangle lists, which needs about
+    # half of the indices. Tipsify works on triangle lists, so optimizeVertexCache is ignored for strips
+    triangleStrips = False
+
     def __init__(self):
-        pass
+        self._meshLock = threading.Lock()
 
     def draw(self):
         raise NotImplementedError
 
     def initialize(self):
         raise NotImplementedError
+
+    def buildGeometry(self):
+        """
+        Generate this shape's vertices and indices from its stored parameters
+
+        :return: vertices and indices
+        :rtype: tuple
+        """
+        raise NotImplementedError
+
+    def finalizeGeometry(self):
+        """
+        Build geometry, then apply the optional mesh optimization passes on it
+
+        :return: vertices and indices
+        :rtype: tuple
+        """
+        vertices, indices = self.buildGeometry()
+        if self.weldSeams:
+            vertices, indices, self.weldReport = MeshOptimizer.weldVertices(vertices, indices)
+        if self.optimizeVertexCache and not self.triangleStrips:
+            vertices, indices, self.optimizationReport = MeshOptimizer.optimizeMesh(vertices, indices)
+        return vertices, indices
+
+    def requestMesh(self, shapeParams, color):
+        """
+        Record the mesh for this shape's parameters. Nothing is generated here, the geometry is built on first access
+        to vertices or indices, or on first use of the GL buffers in initialize. Call prefetch to build it ahead of
+        time in the background.
+
+        :param shapeParams: parameters which decide the shape
+        :type shapeParams: tuple
+        :param color: vertex color of the shape
+        :type color: ColorType
+        """
+        key = (type(self).__name__, tuple(shapeParams), tuple(color), self.vertexFormat.name,
+               self.weldSeams, self.optimizeVertexCache, self.triangleStrips)
+        codeVersion = meshDiskCache.codeVersion(inspect.getsourcefile(type(self)), ParametricSurface.__file__,
+                                                MeshOptimizer.__file__)
+        with self._meshLock:
+            if key == self._meshKey:
+                return
+            self.releaseMesh()
+            self._meshKey = key
+            self._codeVersion = codeVersion
+            self._bounds = None
+
+    def ensureGeometry(self):
+        """
+        Get this shape's vertices and indices. On the first call, they come from the process-wide geometry cache, then
+        the on-disk mesh cache, and the geometry is only built if it isn't there either.
+        This is thread-safe and doesn't need a GL context.
+
+        :return: vertices and indices
+        :rtype: tuple
+        """
+        if self._meshKey is None:
+            raise Exception("Displayable geometry is used before generate is called")
+        mesh = self._mesh
+        if mesh is not None:
+            return mesh.vertices, mesh.indices
+        key, codeVersion = self._meshKey, self._codeVersion
+        return geometryCache.geometry(key, lambda: meshDiskCache.fetch(key, codeVersion, self.finalizeGeometry))
+
+    def ensureMesh(self):
+        """
+        Get this shape's GPUMesh from the process-wide geometry cache, generating the geometry if needed.
+        GL buffers are created here, so this must be called on the GL thread with shaderProg in use.
+
+        :rtype: GPUMesh
+        """
+        with self._meshLock:
+            if self._mesh is None:
+                if self._meshKey is None:
+                    raise Exception("Displayable geometry is used before generate is called")
+                key, codeVersion = self._meshKey, self._codeVersion
+                self._mesh = geometryCache.acquire(key, self.shaderProg,
+                                                   lambda: meshDiskCache.fetch(key, codeVersion,
+                                                                               self.finalizeGeometry))
+            return self._mesh
+
+    def prefetch(self):
+        """
+        Start building this shape's geometry in a background thread. It is safe to call this several times, and to
+        call initialize before the prefetch finishes, which then waits for it.
+
+        :return: future of (vertices, indices)
+        :rtype: concurrent.futures.Future
+        """
+        return prefetchExecutor.submit(self.ensureGeometry)
+
+    def localBounds(self):
+        """
+        Bounding volumes of this shape in its local space, computed from the vertices the first time they are needed.
+        The sphere is centered on the box center, which is tight enough for the convex shapes here.
+
+        :return: sphere center, sphere radius, box minimum corner, box maximum corner
+        :rtype: tuple
+        """
+        if self._bounds is None:
+            positions = np.asarray(self.vertices[:, 0:3], dtype=np.float64)
+            if positions.shape[0] == 0:
+                self._bounds = (np.zeros(3), 0.0, np.zeros(3), np.zeros(3))
+            else:
+                boxMin = positions.min(axis=0)
+                boxMax = positions.max(axis=0)
+                center = (boxMin + boxMax) / 2
+                radius = float(np.sqrt(np.max(np.sum((positions - center) ** 2, axis=1))))
+                self._bounds = (center, radius, boxMin, boxMax)
+        return self._bounds
+
+    @property
+    def meshKey(self):
+        """
+        Key of this shape's geometry, equal for Displayables which share vertices and indices
+        """
+        return self._meshKey
+
+    @property
+    def mesh(self):
+        return self.ensureMesh()
+
+    @property
+    def vao(self):
+        return self.ensureMesh().vao
+
+    @property
+    def vbo(self):
+        return self.ensureMesh().vbo
+
+    @property
+    def ebo(self):
+        return self.ensureMesh().ebo
+
+    @property
+    def vertices(self):
+        return self.ensureGeometry()[0]
+
+    @property
+    def indices(self):
+        return self.ensureGeometry()[1]
+
+    def releaseMesh(self):
+        """
+        Drop this Displayable's reference to its shared mesh
+        """
+        if self._mesh is not None:
+            geometryCache.release(self._mesh)
+            self._mesh = None
+
+
+# worker threads for Displayable.prefetch. Most of the generation time is spent in NumPy, which releases the GIL
+prefetchExecutor = concurrent.futures.ThreadPoolExecutor(thread_name_prefix="geometry")
@@ -8,7 +8,7 @@ Latest version in 12/07/2021
 """
 
 from Displayable import Displayable
-from GLBuffer import VAO, VBO, EBO
+from GLBuffer import COMPACT_NO_TEXTURE_VERTEX_FORMAT
 import numpy as np
 import ColorType
 
@@ -39,13 +39,9 @@ except ImportError:
 
 
 class DisplayableCube(Displayable):
-    vao = None
-    vbo = None
-    ebo = None
-    shaderProg = None
+    vertexFormat = COMPACT_NO_TEXTURE_VERTEX_FORMAT  # this shape has no texture coordinates
 
-    vertices = None  # array to store vertices information
-    indices = None  # stores triangle indices to vertices
+    shaderProg = None
 
     # stores current cube's information, read-only
     length = None
@@ -58,10 +54,6 @@ class DisplayableCube(Displayable):
         self.shaderProg = shaderProg
         self.shaderProg.use()
 
-        self.vao = VAO()
-        self.vbo = VBO()  # vbo can only be initiate with glProgram activated
-        self.ebo = EBO()
-
         self.generate(length, width, height, color)
 
     def generate(self, length=1, width=1, height=1, color=None):
@@ -69,8 +61,12 @@ class DisplayableCube(Displayable):
         self.width = width
         self.height = height
         self.color = color
+        self.requestMesh((length, width, height), color)
+
+    def buildGeometry(self):
+        length, width, height, color = self.length, self.width, self.height, self.color
 
-        self.vertices = np.zeros([24, 11])
+        vertices = np.zeros([24, 11])
         # vl = np.array([
         #     # back face
         #     -length/2, -width/2, -height/2, 0, 0, -1, *color,
@@ -149,10 +145,15 @@ class DisplayableCube(Displayable):
             length / 2, -width / 2, height / 2, 0, -1, 0, *color,
             -length / 2, -width / 2, height / 2, 0, -1, 0, *color,
         ]).reshape((24, 9))
-        self.vertices[0:24, 0:9] = vl
-        self.indices = np.array([
+        vertices[0:24, 0:9] = vl
+        indices = np.array([
             0, 1, 2, 0, 2, 3, 4, 5, 6, 4, 6, 7, 8, 9, 10, 8, 10, 11, 12, 13, 14, 12, 14, 15, 16, 17, 18, 16, 18, 19, 20, 21, 22, 20, 22, 23
         ])
+        if self.triangleStrips:
+            # one 4 vertices strip per face, giving the same two triangles as above
+            faces = np.arange(0, 24, 4)[:, np.newaxis]
+            indices = np.concatenate([faces + [1, 2, 0, 3], np.full([6, 1], -1)], axis=1).ravel()
+        return vertices, indices
 
     def draw(self):
         self.vao.bind()
@@ -165,17 +166,14 @@ class DisplayableCube(Displayable):
         Remember to bind VAO before this initialization. If VAO is not bind, program might throw an error
         in systems that don't enable a default VAO after GLProgram compilation
         """
+        # the mesh is shared with every Displayable of the same shape, only upload it once
+        if self.mesh.initialized:
+            return
         self.vao.bind()
-        self.vbo.setBuffer(self.vertices, 11)
-        self.ebo.setBuffer(self.indices)
-
-        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexPos"),
-                                  stride=11, offset=0, attribSize=3)
-        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexNormal"),
-                                  stride=11, offset=3, attribSize=3)
-        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexColor"),
-                                  stride=11, offset=6, attribSize=3)
-        # TODO/BONUS 6.1 is at here, you need to set attribPointer for texture coordinates
-        # you should check the corresponding variable name in GLProgram and set the pointer
+        self.vbo.setFormattedBuffer(self.vertices, self.vertexFormat)
+        self.ebo.setBuffer(self.indices, topology=gl.GL_TRIANGLE_STRIP if self.triangleStrips else gl.GL_TRIANGLES)
+        # attrib pointers come from the vertex format, which also decides stride and offsets
+        self.vertexFormat.setAttribPointers(self.shaderProg, self.vbo, self.vao, self.vertices)
         self.vao.unbind()
+        self.mesh.initialized = True
 
@@ -9,7 +9,7 @@ Latest version in 12/07/2021
 import math
 
 from Displayable import Displayable
-from GLBuffer import VAO, VBO, EBO
+import ParametricSurface
 import numpy as np
 import ColorType
 
@@ -40,14 +40,8 @@ except ImportError:
 
 
 class DisplayableCylinder(Displayable):
-    vao = None
-    vbo = None
-    ebo = None
     shaderProg = None
 
-    vertices = None  # array to store vertices information
-    indices = None  # stores triangle indices to vertices
-
     # stores current cube's information, read-only
     radius = None
     height = None
@@ -60,10 +54,6 @@ class DisplayableCylinder(Displayable):
         self.shaderProg = shaderProg
         self.shaderProg.use()
 
-        self.vao = VAO()
-        self.vbo = VBO()  # vbo can only be initiate with glProgram activated
-        self.ebo = EBO()
-
         self.generate(radius, height, stacks, slices, color)
 
     def generate(self, radius=1, height=1, stacks=18, slices=36, color=None):
@@ -72,45 +62,46 @@ class DisplayableCylinder(Displayable):
         self.stacks = stacks
         self.slices = slices
         self.color = color
-
-        self.vertices = np.zeros([4 * slices+2, 11])
-        self.vertices[0, 0:9] = [0, height/2, 0, 0, 1, 0, *color]
-        self.vertices[1, 0:9] = [0, -height/2, 0, 0, -1, 0, *color]
-        for i in range(slices):
-            theta = i / (slices) * 2 * math.pi
-            # First store the vertices of two circles & sides
-            self.vertices[i+2, 0:3] = self.vertices[i+2 + 2 * slices, 0:3] = [self.radius * math.cos(theta),
-                                                                            self.height / 2,
-                                                                            self.radius * math.sin(theta)]
-            self.vertices[i+2 + slices, 0:3] = self.vertices[i+2 + 3 * slices, 0:3] = [self.radius * math.cos(theta),
-                                                                                     -self.height / 2,
-                                                                                     self.radius * math.sin(theta)]
-
-            # The normal values on two circles are at opposite
-            self.vertices[i + 2, 3:6] = [0, 1, 0]
-            self.vertices[i + 2, 6:9] = [*color]
-            self.vertices[i+2 + slices, 3:6] = [0, -1, 0]
-            self.vertices[i + 2 + slices, 6:9] = [*color]
-            self.vertices[i + 2 + 2 * slices, 3:6] = self.vertices[i + 2 + 3 * slices, 3:6] = [math.cos(theta), 0, math.sin(theta)]
-            self.vertices[i + 2 + 2 * slices, 6:9] = self.vertices[i + 2 + 3 * slices, 6:9] = [*color]
-
-        np.set_printoptions(threshold=np.inf)
-
-        self.indices = np.zeros([12 * slices])
-        for i in range(slices):
-            if i == slices-1:
-                self.indices[i * 3:i * 3 + 3] = [0, i + 2, 2]
-                self.indices[(i+slices) * 3:(i+slices) * 3 + 3] = [1, i+ slices + 2, slices + 2]
-                self.indices[(i + 2 * slices) * 3:(i + 2 * slices) * 3 + 3] = [i + 2*slices + 2, 2*slices + 2, i + 3*slices + 2]
-                self.indices[(i + 3 * slices) * 3:(i + 3 * slices) * 3 + 3] = [i + 3*slices + 2, 3*slices + 2, 2*slices + 2]
-            else:
-                self.indices[i*3:i*3+3] = [0, i+2, i+3]
-                self.indices[(i+slices) * 3:(i+slices) * 3 + 3] = [1, i + slices + 2, i + slices + 3]
-                self.indices[(i + 2 * slices) * 3:(i + 2 * slices) * 3 + 3] = [i + 2*slices + 2, i + 2*slices + 3, i + 3*slices + 2]
-                self.indices[(i + 3 * slices) * 3:(i + 3 * slices) * 3 + 3] = [i + 3*slices + 2, i + 3*slices + 3, i + 2*slices + 3]
-
-
-
+        self.requestMesh((radius, height, stacks, slices), color)
+
+    def buildGeometry(self):
+        radius, height, stacks, slices, color = self.radius, self.height, self.stacks, self.slices, self.color
+
+        # vertices are stored as: top center, bottom center, top cap ring, bottom cap ring, then the side wall grid
+        # side wall has stacks bands, its rows go from top to bottom and its last column closes the texture seam
+        theta = np.arange(slices) / slices * 2 * math.pi
+        capRing = np.stack([radius * np.cos(theta), np.zeros(slices), radius * np.sin(theta)], axis=-1)
+        capVertices = np.zeros([2 * slices + 2, 11])
+        capVertices[0, 0:6] = [0, height / 2, 0, 0, 1, 0]
+        capVertices[1, 0:6] = [0, -height / 2, 0, 0, -1, 0]
+        capVertices[2:slices + 2, 0:3] = capRing + [0, height / 2, 0]
+        capVertices[2:slices + 2, 3:6] = [0, 1, 0]
+        capVertices[slices + 2:, 0:3] = capRing - [0, height / 2, 0]
+        capVertices[slices + 2:, 3:6] = [0, -1, 0]
+        capVertices[:, 6:9] = [*color]
+        capVertices[0:2, 9:11] = 0.5
+        capVertices[2:, 9] = np.tile(0.5 + 0.5 * np.cos(theta), 2)
+        capVertices[2:, 10] = np.tile(0.5 + 0.5 * np.sin(theta), 2)
+
+        def surface(y, theta):
+            position = (radius * np.cos(theta), y, radius * np.sin(theta))
+            normal = (np.cos(theta), np.zeros_like(y), np.sin(theta))
+            return position, normal
+
+        y = height / 2 - np.arange(stacks + 1) / stacks * height
+        sideTheta = np.arange(slices + 1) / slices * 2 * math.pi
+        texCoords = (np.arange(slices + 1)[np.newaxis, :] / slices, 1 - np.arange(stacks + 1)[:, np.newaxis] / stacks)
+        sideVertices = ParametricSurface.evaluateGrid(y, sideTheta, surface, color, texCoords)
+
+        vertices = np.concatenate([capVertices, sideVertices])
+        if self.triangleStrips:
+            fan, triangulate = ParametricSurface.fanStripIndices, ParametricSurface.gridStripIndices
+        else:
+            fan, triangulate = ParametricSurface.fanIndices, ParametricSurface.gridIndices
+        indices = np.concatenate([fan(0, 2, slices),
+                                  fan(1, slices + 2, slices),
+                                  triangulate(stacks + 1, slices + 1, offset=2 * slices + 2)])
+        return vertices, indices
 
     def draw(self):
         self.vao.bind()
@@ -123,16 +114,13 @@ class DisplayableCylinder(Displayable):
         Remember to bind VAO before this initialization. If VAO is not bind, program might throw an error
         in systems that don't enable a default VAO after GLProgram compilation
         """
+        # the mesh is shared with every Displayable of the same shape, only upload it once
+        if self.mesh.initialized:
+            return
         self.vao.bind()
-        self.vbo.setBuffer(self.vertices, 11)
-        self.ebo.setBuffer(self.indices)
-
-        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexPos"),
-                                  stride=11, offset=0, attribSize=3)
-        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexNormal"),
-                                  stride=11, offset=3, attribSize=3)
-        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexColor"),
-                                  stride=11, offset=6, attribSize=3)
-        # TODO/BONUS 6.1 is at here, you need to set attribPointer for texture coordinates
-        # you should check the corresponding variable name in GLProgram and set the pointer
+        self.vbo.setFormattedBuffer(self.vertices, self.vertexFormat)
+        self.ebo.setBuffer(self.indices, topology=gl.GL_TRIANGLE_STRIP if self.triangleStrips else gl.GL_TRIANGLES)
+        # attrib pointers come from the vertex format, which also decides stride and offsets
+        self.vertexFormat.setAttribPointers(self.shaderProg, self.vbo, self.vao, self.vertices)
         self.vao.unbind()
+        self.mesh.initialized = True
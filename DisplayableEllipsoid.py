@@ -9,7 +9,8 @@ Latest version in 12/07/2021
 import math
 
 from Displayable import Displayable
-from GLBuffer import VAO, VBO, EBO
+from GLBuffer import COMPACT_NO_TEXTURE_VERTEX_FORMAT
+import ParametricSurface
 import numpy as np
 import ColorType
 
@@ -40,13 +41,9 @@ except ImportError:
 
 
 class DisplayableEllipsoid(Displayable):
-    vao = None
-    vbo = None
-    ebo = None
-    shaderProg = None
+    vertexFormat = COMPACT_NO_TEXTURE_VERTEX_FORMAT  # this shape has no texture coordinates
 
-    vertices = None  # array to store vertices information
-    indices = None  # stores triangle indices to vertices
+    shaderProg = None
 
     # stores current cube's information, read-only
     radiusX = None
@@ -61,10 +58,6 @@ class DisplayableEllipsoid(Displayable):
         self.shaderProg = shaderProg
         self.shaderProg.use()
 
-        self.vao = VAO()
-        self.vbo = VBO()  # vbo can only be initiate with glProgram activated
-        self.ebo = EBO()
-
         self.generate(radiusX, radiusY, radiusZ, stacks, slices, color)
 
     def generate(self, radiusX=1, radiusY=0.5, radiusZ=0.5, stacks=18, slices=36, color=None):
@@ -74,37 +67,29 @@ class DisplayableEllipsoid(Displayable):
         self.stacks = stacks
         self.slices = slices
         self.color = color
-
-        # self.vertices = np.zeros([6 * (slices) * (stacks - 1), 11])
-        self.vertices = np.zeros([slices * stacks, 11])
-        for i in range(stacks):
-            phi = i / (stacks-1) * math.pi - math.pi / 2
-            for j in range(slices):
-                theta = j / slices * 2 * math.pi
-                vertexN = i * slices + j
-                self.vertices[vertexN, 0:3] = [self.radiusX * math.cos(phi) * math.cos(theta),
-                                               self.radiusY * math.cos(phi) * math.sin(theta),
-                                               self.radiusZ * math.sin(phi)]
-
-                x = -radiusZ * math.cos(phi) * radiusY * math.cos(phi) * math.cos(theta)
-                y = radiusZ * math.cos(phi) * (-radiusX) * math.cos(phi) * math.sin(theta)
-                z = (-radiusX) * math.sin(phi) * math.cos(theta) * radiusY * math.cos(phi) * math.cos(theta) + \
-                    radiusY * math.sin(phi) * math.sin(theta) * (-radiusX) * math.cos(phi) * math.sin(theta)
-                norm = math.sqrt(pow(x, 2) + pow(y, 2) + pow(z, 2))
-                self.vertices[vertexN, 3:6] = [-x / norm, -y / norm, -z / norm]
-                self.vertices[vertexN, 6:9] = [*color]
-
-        self.indices = np.zeros([6 * slices * (stacks - 1)])
-        for i in range(stacks - 1):
-            for j in range(slices):
-                gridN = i * slices + j
-                self.indices[6 * gridN + 0] = i * slices + j
-                self.indices[6 * gridN + 1] = i * slices + (j + 1) % slices
-                self.indices[6 * gridN + 2] = (i + 1) * slices + (j + 1) % slices
-
-                self.indices[6 * gridN + 3] = i * slices + j
-                self.indices[6 * gridN + 4] = (i + 1) * slices + (j + 1) % slices
-                self.indices[6 * gridN + 5] = (i + 1) * slices + j
+        self.requestMesh((radiusX, radiusY, radiusZ, stacks, slices), color)
+
+    def buildGeometry(self):
+        radiusX, radiusY, radiusZ, stacks, slices, color = self.radiusX, self.radiusY, self.radiusZ, self.stacks, self.slices, self.color
+
+        # rows of the parameter grid are stacks and columns are slices
+        phi = np.arange(stacks) / (stacks - 1) * math.pi - math.pi / 2
+        theta = np.arange(slices) / slices * 2 * math.pi
+
+        def surface(phi, theta):
+            position = (radiusX * np.cos(phi) * np.cos(theta),
+                        radiusY * np.cos(phi) * np.sin(theta),
+                        radiusZ * np.sin(phi))
+            # gradient of the implicit ellipsoid equation, scaled by radiusX * radiusY * radiusZ
+            normal = (radiusY * radiusZ * np.cos(phi) * np.cos(theta),
+                      radiusX * radiusZ * np.cos(phi) * np.sin(theta),
+                      radiusX * radiusY * np.sin(phi))
+            return position, normal
+
+        vertices = ParametricSurface.evaluateGrid(phi, theta, surface, color)
+        triangulate = ParametricSurface.gridStripIndices if self.triangleStrips else ParametricSurface.gridIndices
+        indices = triangulate(stacks, slices, wrapColumns=True)
+        return vertices, indices
 
     def draw(self):
         self.vao.bind()
@@ -117,16 +102,13 @@ class DisplayableEllipsoid(Displayable):
         Remember to bind VAO before this initialization. If VAO is not bind, program might throw an error
         in systems that don't enable a default VAO after GLProgram compilation
         """
+        # the mesh is shared with every Displayable of the same shape, only upload it once
+        if self.mesh.initialized:
+            return
         self.vao.bind()
-        self.vbo.setBuffer(self.vertices, 11)
-        self.ebo.setBuffer(self.indices)
-
-        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexPos"),
-                                  stride=11, offset=0, attribSize=3)
-        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexNormal"),
-                                  stride=11, offset=3, attribSize=3)
-        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexColor"),
-                                  stride=11, offset=6, attribSize=3)
-        # TODO/BONUS 6.1 is at here, you need to set attribPointer for texture coordinates
-        # you should check the corresponding variable name in GLProgram and set the pointer
+        self.vbo.setFormattedBuffer(self.vertices, self.vertexFormat)
+        self.ebo.setBuffer(self.indices, topology=gl.GL_TRIANGLE_STRIP if self.triangleStrips else gl.GL_TRIANGLES)
+        # attrib pointers come from the vertex format, which also decides stride and offsets
+        self.vertexFormat.setAttribPointers(self.shaderProg, self.vbo, self.vao, self.vertices)
         self.vao.unbind()
+        self.mesh.initialized = True
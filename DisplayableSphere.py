@@ -8,7 +8,7 @@ Latest version in 12/07/2021
 """
 import math
 from Displayable import Displayable
-from GLBuffer import VAO, VBO, EBO
+import ParametricSurface
 import numpy as np
 import ColorType
 
@@ -38,14 +38,8 @@ except ImportError:
     raise ImportError("Required dependency PyOpenGL not present")
 
 class DisplayableSphere(Displayable):
-    vao = None
-    vbo = None
-    ebo = None
     shaderProg = None
 
-    vertices = None  # array to store vertices information
-    indices = None  # stores triangle indices to vertices
-
     # stores current cube's information, read-only
     radius = None
     stacks = None
@@ -59,10 +53,6 @@ class DisplayableSphere(Displayable):
         self.shaderProg = shaderProg
         self.shaderProg.use()
 
-        self.vao = VAO()
-        self.vbo = VBO()  # vbo can only be initiate with glProgram activated
-        self.ebo = EBO()
-
         self.generate(radius, stacks, slices, color)
 
     def generate(self, radius=1, stacks=18, slices=36, color=None):
@@ -70,38 +60,34 @@ class DisplayableSphere(Displayable):
         self.stacks = stacks
         self.slices = slices
         self.color = color
-
-        # first store all vertices coordinates in vertices
-        self.vertices = np.zeros([stacks*slices, 11])
-        for i in range(stacks):
-            phi = i / (stacks - 1) * math.pi - math.pi / 2
-            for j in range(slices):
-                theta = (j % (slices-1)) / (slices-1) * 2 * math.pi
-                self.vertices[i*slices+j, 0:3] = [self.radius * math.cos(phi) * math.cos(theta),
-                                          self.radius * math.cos(phi) * math.sin(theta),
-                                          self.radius * math.sin(phi)]
-
-                x = -radius * math.cos(phi) * radius * math.cos(phi) * math.cos(theta)
-                y = radius * math.cos(phi) * (-radius) * math.cos(phi) * math.sin(theta)
-                z = (-radius) * math.sin(phi) * math.cos(theta) * radius * math.cos(phi) * math.cos(theta) + \
-                    radius * math.sin(phi) * math.sin(theta) * (-radius) * math.cos(phi) * math.sin(theta)
-                norm = math.sqrt(pow(x, 2) + pow(y, 2) + pow(z, 2))
-                self.vertices[i * slices + j, 3:6] = [-x / norm, -y / norm, -z / norm]
-                self.vertices[i * slices + j, 6:9] = [*color]
-                self.vertices[i * slices + j, 9:11] = [j/(slices-1), i/(stacks-1)]
+        self.requestMesh((radius, stacks, slices), color)
+
+    def buildGeometry(self):
+        radius, stacks, slices, color = self.radius, self.stacks, self.slices, self.color
+
+        # rows of the parameter grid are stacks and columns are slices
+        # the last slice wraps back to theta = 0, so that texture seam gets its own column of vertices
+        phi = np.arange(stacks) / (stacks - 1) * math.pi - math.pi / 2
+        theta = (np.arange(slices) % (slices - 1)) / (slices - 1) * 2 * math.pi
+
+        def surface(phi, theta):
+            position = (radius * np.cos(phi) * np.cos(theta),
+                        radius * np.cos(phi) * np.sin(theta),
+                        radius * np.sin(phi))
+            # normal comes from the cross product of the two partial derivatives, flipped to point outward
+            x = -radius * np.cos(phi) * radius * np.cos(phi) * np.cos(theta)
+            y = radius * np.cos(phi) * (-radius) * np.cos(phi) * np.sin(theta)
+            z = (-radius) * np.sin(phi) * np.cos(theta) * radius * np.cos(phi) * np.cos(theta) + \
+                radius * np.sin(phi) * np.sin(theta) * (-radius) * np.cos(phi) * np.sin(theta)
+            return position, (-x, -y, -z)
+
+        texCoords = (np.arange(slices)[np.newaxis, :] / (slices - 1), np.arange(stacks)[:, np.newaxis] / (stacks - 1))
+        vertices = ParametricSurface.evaluateGrid(phi, theta, surface, color, texCoords)
 
         # then for every triangle on sphere, we put its corresponding vertices in indices based on its order
-        self.indices = np.zeros([6 * (slices) * (stacks-1)])
-        for i in range(stacks - 1):
-            for j in range(slices):
-                gridN = i * slices + j
-                self.indices[6 * gridN + 0] = i*slices+j
-                self.indices[6 * gridN + 1] = i*slices+(j + 1) % slices
-                self.indices[6 * gridN + 2] = (i + 1)*slices + (j + 1) % slices
-
-                self.indices[6 * gridN + 3] = i*slices+j
-                self.indices[6 * gridN + 4] = (i + 1)*slices + (j + 1) % slices
-                self.indices[6 * gridN + 5] = (i + 1)*slices + j
+        triangulate = ParametricSurface.gridStripIndices if self.triangleStrips else ParametricSurface.gridIndices
+        indices = triangulate(stacks, slices, wrapColumns=True)
+        return vertices, indices
 
     def draw(self):
         self.vao.bind()
@@ -114,19 +100,14 @@ class DisplayableSphere(Displayable):
         Remember to bind VAO before this initialization. If VAO is not bind, program might throw an error
         in systems that don't enable a default VAO after GLProgram compilation
         """
+        # the mesh is shared with every Displayable of the same shape, only upload it once
+        if self.mesh.initialized:
+            return
         self.vao.bind()
-        self.vbo.setBuffer(self.vertices, 11)
-        self.ebo.setBuffer(self.indices)
-
-        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexPos"),
-                                  stride=11, offset=0, attribSize=3)
-        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexNormal"),
-                                  stride=11, offset=3, attribSize=3)
-        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexColor"),
-                                  stride=11, offset=6, attribSize=3)
-        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexTexture"),
-                                  stride=11, offset=9, attribSize=2)
-        # TODO/BONUS 6.1 is at here, you need to set attribPointer for texture coordinates
-        # you should check the corresponding variable name in GLProgram and set the pointer
+        self.vbo.setFormattedBuffer(self.vertices, self.vertexFormat)
+        self.ebo.setBuffer(self.indices, topology=gl.GL_TRIANGLE_STRIP if self.triangleStrips else gl.GL_TRIANGLES)
+        # attrib pointers come from the vertex format, which also decides stride and offsets
+        self.vertexFormat.setAttribPointers(self.shaderProg, self.vbo, self.vao, self.vertices)
         self.vao.unbind()
+        self.mesh.initialized = True
 
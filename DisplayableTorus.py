@@ -8,7 +8,7 @@ Latest version in 12/07/2021
 """
 
 from Displayable import Displayable
-from GLBuffer import VAO, VBO, EBO
+import ParametricSurface
 from Point import Point
 import numpy as np
 import ColorType
@@ -48,9 +48,6 @@ except ImportError:
 #   There should be no seams in the resulting texture-mapped model.
 
 class DisplayableTorus(Displayable):
-    vao = None
-    vbo = None
-    ebo = None
     shaderProg = None
 
     # stores current torus's information, read-only
@@ -60,18 +57,11 @@ class DisplayableTorus(Displayable):
     outerRadius = 0
     color = None
 
-    vertices = None
-    indices = None
-
     def __init__(self, shaderProg, innerRadius=0.25, outerRadius=0.5, nsides=36, rings=36, color=ColorType.SOFTBLUE):
         super(DisplayableTorus, self).__init__()
         self.shaderProg = shaderProg
         self.shaderProg.use()
 
-        self.vao = VAO()
-        self.vbo = VBO()  # vbo can only be initiate with glProgram activated
-        self.ebo = EBO()
-
         self.generate(innerRadius, outerRadius, nsides, rings, color)
 
     def generate(self, innerRadius=0.25, outerRadius=0.5, nsides=36, rings=36, color=ColorType.SOFTBLUE):
@@ -80,34 +70,29 @@ class DisplayableTorus(Displayable):
         self.nsides = nsides
         self.rings = rings
         self.color = color
+        self.requestMesh((innerRadius, outerRadius, nsides, rings), color)
+
+    def buildGeometry(self):
+        innerRadius, outerRadius, nsides, rings, color = self.innerRadius, self.outerRadius, self.nsides, self.rings, self.color
 
         # we need to pad one more row for both nsides and rings, to assign correct texture coord to them
-        self.vertices = np.zeros([(nsides) * (rings), 11])
-
-        for i in range(rings):
-            phi = i % (rings-1) / (rings-1) * 2 * math.pi
-            for j in range(nsides):
-                theta = j % (nsides-1) / (nsides-1) * 2 * math.pi
-                vertexN = i * nsides + j
-                self.vertices[vertexN, 0:3] = [(self.outerRadius + self.innerRadius * math.cos(phi)) * math.cos(theta),
-                                               (self.outerRadius + self.innerRadius * math.cos(phi)) * math.sin(theta),
-                                               self.innerRadius * math.sin(phi)]
-
-                self.vertices[vertexN, 3:6] = [(self.innerRadius * math.cos(phi)) * math.cos(theta), (self.innerRadius * math.cos(phi)) * math.sin(theta), self.innerRadius * math.sin(phi)]
-                self.vertices[vertexN, 6:9] = [*color]
-                self.vertices[vertexN, 9:11] = [i/(rings-1), j/(nsides-1)]
-
-        self.indices = np.zeros([6 * nsides * (rings - 1)])
-        for i in range(rings - 1):
-            for j in range(nsides):
-                gridN = i * nsides + j
-                self.indices[6 * gridN + 0] = i * nsides + j
-                self.indices[6 * gridN + 1] = i * nsides + (j + 1) % nsides
-                self.indices[6 * gridN + 2] = (i + 1) * nsides + (j + 1) % nsides
-
-                self.indices[6 * gridN + 3] = i * nsides + j
-                self.indices[6 * gridN + 4] = (i + 1) * nsides + (j + 1) % nsides
-                self.indices[6 * gridN + 5] = (i + 1) * nsides + j
+        # rows of the parameter grid are rings and columns are sides
+        phi = (np.arange(rings) % (rings - 1)) / (rings - 1) * 2 * math.pi
+        theta = (np.arange(nsides) % (nsides - 1)) / (nsides - 1) * 2 * math.pi
+
+        def surface(phi, theta):
+            position = ((outerRadius + innerRadius * np.cos(phi)) * np.cos(theta),
+                        (outerRadius + innerRadius * np.cos(phi)) * np.sin(theta),
+                        innerRadius * np.sin(phi))
+            # normal points from the tube's center circle to the surface point
+            normal = (np.cos(phi) * np.cos(theta), np.cos(phi) * np.sin(theta), np.sin(phi))
+            return position, normal
+
+        texCoords = (np.arange(rings)[:, np.newaxis] / (rings - 1), np.arange(nsides)[np.newaxis, :] / (nsides - 1))
+        vertices = ParametricSurface.evaluateGrid(phi, theta, surface, color, texCoords)
+        triangulate = ParametricSurface.gridStripIndices if self.triangleStrips else ParametricSurface.gridIndices
+        indices = triangulate(rings, nsides, wrapColumns=True)
+        return vertices, indices
 
     def draw(self):
         self.vao.bind()
@@ -119,17 +104,13 @@ class DisplayableTorus(Displayable):
         Remember to bind VAO before this initialization. If VAO is not bind, program might throw an error
         in systems which don't enable a default VAO after GLProgram compilation
         """
+        # the mesh is shared with every Displayable of the same shape, only upload it once
+        if self.mesh.initialized:
+            return
         self.vao.bind()
-        self.vbo.setBuffer(self.vertices, 11)
-        self.ebo.setBuffer(self.indices)
-
-        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexPos"),
-                                  stride=11, offset=0, attribSize=3)
-        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexNormal"),
-                                  stride=11, offset=3, attribSize=3)
-        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexColor"),
-                                  stride=11, offset=6, attribSize=3)
-        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexTexture"),
-                                  stride=11, offset=9, attribSize=2)
-
+        self.vbo.setFormattedBuffer(self.vertices, self.vertexFormat)
+        self.ebo.setBuffer(self.indices, topology=gl.GL_TRIANGLE_STRIP if self.triangleStrips else gl.GL_TRIANGLES)
+        # attrib pointers come from the vertex format, which also decides stride and offsets
+        self.vertexFormat.setAttribPointers(self.shaderProg, self.vbo, self.vao, self.vertices)
         self.vao.unbind()
+        self.mesh.initialized = True
@@ -0,0 +1,368 @@
+"""
+Define an array-backed scene graph for big hierarchies.
+Node transform parameters are stored as a structure of arrays, and world matrices are composed level by level, one
+np.matmul over all nodes of the same depth, instead of one recursive call per node like Component.update.
+Matrices follow the same convention as Component and GLUtility: column-major, a child's world matrix is
+localMat @ parentMat, and
+localMat = scaling @ preRotation @ rotationW @ rotationV @ rotationU @ postRotation @ translation.
+First version in 10/18/2026
+
+:author: Zack(Wanzhi Wang)
+:version: 2026.10.18
+"""
+
+import numpy as np
+
+from GLUtility import GLUtility
+
+
+def rotationMatrices(angles, axes):
+    """
+    Batched GLUtility.rotate, without the homogeneous row and column
+
+    :param angles: rotation angles in degrees, in shape (n,)
+    :type angles: numpy.ndarray
+    :param axes: rotation axes in shape (n, 3)
+    :type axes: numpy.ndarray
+    :return: column-major 3x3 rotation matrices in shape (n, 3, 3)
+    :rtype: numpy.ndarray
+    """
+    halfAngle = 0.5 * np.asarray(angles) / 180 * np.pi
+    s = np.cos(halfAngle)
+    sinHalfAngle = np.sin(halfAngle)
+    a, b, c = (sinHalfAngle * axes[:, 0], sinHalfAngle * axes[:, 1], sinHalfAngle * axes[:, 2])
+
+    # every entry is quadratic in the quaternion, so normalizing it is a single 1 / norm^2 factor.
+    # Degenerate quaternions give identity like GLUtility.rotate does
+    norm2 = s * s + a * a + b * b + c * c
+    degenerate = norm2 < 1e-12
+    k = 2 / np.where(degenerate, 1, norm2)
+    k[degenerate] = 0
+    a2, b2, c2 = a * k, b * k, c * k
+    aa, bb, cc = a * a2, b * b2, c * c2
+    ab, ac, bc = a * b2, a * c2, b * c2
+    sa, sb, sc = s * a2, s * b2, s * c2
+
+    # entries are written transposed, which gives the column-major matrix directly
+    result = np.empty((s.shape[0], 3, 3))
+    result[:, 0, 0] = 1 - bb - cc
+    result[:, 0, 1] = ab + sc
+    result[:, 0, 2] = ac - sb
+    result[:, 1, 0] = ab - sc
+    result[:, 1, 1] = 1 - aa - cc
+    result[:, 1, 2] = bc + sa
+    result[:, 2, 0] = ac + sb
+    result[:, 2, 1] = bc - sa
+    result[:, 2, 2] = 1 - aa - bb
+    return result
+
+
+class FlatSceneGraph:
+    """
+    Scene graph with all node transforms in arrays. Node i's parent is parents[i], -1 for a root.
+    Parameters can be written directly into the arrays, as long as the written nodes are marked with markDirty, or
+    through SceneNode views. Existing Component trees can be flattened with fromComponent.
+    """
+    nodeNum = 0
+    capacity = 0
+
+    parents = None  # int32 (n,)
+    depths = None  # int32 (n,)
+    positions = None  # float64 (n, 3), translation from the parent's origin
+    angles = None  # float64 (n, 3), rotation angles around the u, v, w axes in degrees
+    axes = None  # float64 (n, 3, 3), u, v, w rotation axes
+    scales = None  # float64 (n,), uniform scaling
+    preRotations = None  # float64 (n, 4, 4), rotation only like Component.preRotationMat
+    postRotations = None  # float64 (n, 4, 4), rotation only
+    # set if a node's pre or post rotation isn't identity, only those nodes pay for the extra matrix products.
+    # Set them too when writing preRotations or postRotations directly
+    hasPreRotation = None  # bool (n,)
+    hasPostRotation = None  # bool (n,)
+
+    localMats = None  # float32 (n, 4, 4)
+    worldMats = None  # float32 (n, 4, 4), what Component calls transformationMat
+    normalMats = None  # float32 (n, 4, 4), inverse transposes of worldMats, what Component calls normalMat
+    localDirty = None  # bool (n,)
+
+    _levels = None  # node indices of every depth, rebuilt when nodes are added
+    _rootMat = None  # parent matrix of the roots used by the last update
+    _worldDirty = True
+
+    def __init__(self, capacity=64):
+        self.nodeNum = 0
+        self.capacity = 0
+        self._levels = None
+        self._rootMat = None
+        self._worldDirty = True
+        self._grow(capacity)
+
+    def _grow(self, capacity):
+        """
+        Reallocate all arrays to hold capacity nodes, keeping the existing ones
+        """
+        def resized(array, shape, dtype, fill=0):
+            result = np.full((capacity,) + shape, fill, dtype=dtype)
+            if array is not None:
+                result[:self.nodeNum] = array[:self.nodeNum]
+            return result
+
+        self.parents = resized(self.parents, (), np.int32, -1)
+        self.depths = resized(self.depths, (), np.int32)
+        self.positions = resized(self.positions, (3,), np.float64)
+        self.angles = resized(self.angles, (3,), np.float64)
+        self.axes = resized(self.axes, (3, 3), np.float64)
+        self.scales = resized(self.scales, (), np.float64, 1)
+        self.preRotations = resized(self.preRotations, (4, 4), np.float64)
+        self.postRotations = resized(self.postRotations, (4, 4), np.float64)
+        self.hasPreRotation = resized(self.hasPreRotation, (), np.bool_)
+        self.hasPostRotation = resized(self.hasPostRotation, (), np.bool_)
+        self.localMats = resized(self.localMats, (4, 4), np.float32)
+        self.worldMats = resized(self.worldMats, (4, 4), np.float32)
+        self.normalMats = resized(self.normalMats, (4, 4), np.float32)
+        self.localDirty = resized(self.localDirty, (), np.bool_)
+        self.capacity = capacity
+
+    def addNodes(self, parents, positions=None, scales=None):
+        """
+        Append nodes. Parents must already exist or come earlier in the same call, so depth can be found in one pass.
+
+        :param parents: parent index of every new node, -1 for roots
+        :type parents: numpy.ndarray
+        :param positions: translations from the parents' origins in shape (n, 3), zero if not given
+        :type positions: numpy.ndarray
+        :param scales: uniform scaling of every new node, one if not given
+        :type scales: numpy.ndarray
+        :return: indices of the new nodes
+        :rtype: numpy.ndarray
+        """
+        parents = np.asarray(parents, dtype=np.int32).ravel()
+        count = parents.size
+        start = self.nodeNum
+        indices = np.arange(start, start + count)
+        if np.any(parents >= indices):
+            raise ValueError("Parent of a node must be added before the node")
+        if start + count > self.capacity:
+            self._grow(max(start + count, 2 * self.capacity))
+
+        self.nodeNum = start + count
+        self.parents[indices] = parents
+        self.axes[indices] = np.identity(3)
+        self.preRotations[indices] = np.identity(4)
+        self.postRotations[indices] = np.identity(4)
+        self.hasPreRotation[indices] = False
+        self.hasPostRotation[indices] = False
+        if positions is not None:
+            self.positions[indices] = positions
+        if scales is not None:
+            self.scales[indices] = scales
+        self.localDirty[indices] = True
+
+        # parents inside this batch have no depth yet, walk up until reaching a node added before or a root
+        depths = np.zeros(count, dtype=np.int32)
+        ancestors = parents.copy()
+        inBatch = ancestors >= start
+        while inBatch.any():
+            depths[inBatch] += 1
+            ancestors[inBatch] = parents[ancestors[inBatch] - start]
+            inBatch = ancestors >= start
+        hasParent = ancestors >= 0
+        depths[hasParent] += self.depths[ancestors[hasParent]] + 1
+        self.depths[indices] = depths
+
+        self._levels = None
+        self._worldDirty = True
+        return indices
+
+    def addNode(self, parent=-1, position=(0, 0, 0), scale=1):
+        """
+        Append one node
+
+        :return: index of the new node
+        :rtype: int
+        """
+        return int(self.addNodes([parent], [position], [scale])[0])
+
+    def markDirty(self, indices):
+        """
+        Mark nodes whose parameters were written directly into the arrays
+        """
+        self.localDirty[indices] = True
+        self._worldDirty = True
+
+    def levels(self):
+        """
+        :return: node indices grouped by depth, from the roots down
+        :rtype: list
+        """
+        if self._levels is None:
+            depths = self.depths[:self.nodeNum]
+            order = np.argsort(depths, kind="stable")
+            bounds = np.searchsorted(depths[order], np.arange(depths.max() + 2 if self.nodeNum else 1))
+            self._levels = [order[bounds[d]:bounds[d + 1]] for d in range(len(bounds) - 1)]
+        return self._levels
+
+    def updateLocal(self, indices):
+        """
+        Compose local matrices of the given nodes from their parameters.
+        Rotations around an axis with zero angle, and identity pre and post rotations are skipped, most nodes in an
+        animated hierarchy only use some of them.
+        """
+        n = indices.size
+        if n == 0:
+            return
+        result = np.zeros((n, 4, 4))
+        result[:, 3, 3] = 1
+        rotation = result[:, 0:3, 0:3]
+        rotation[:] = np.identity(3)
+        rotated = np.zeros(n, dtype=np.bool_)
+        angles = self.angles[indices]
+        for axis in range(3):
+            rows = np.flatnonzero(angles[:, axis] != 0)
+            if rows.size == 0:
+                continue
+            r = rotationMatrices(angles[rows, axis], self.axes[indices[rows], axis])
+            if rows.size == n and not rotated.any():
+                rotation[:] = r
+            else:
+                rotation[rows] = r @ rotation[rows]
+            rotated[rows] = True
+
+        for matrices, flags, before in ((self.preRotations, self.hasPreRotation, True),
+                                        (self.postRotations, self.hasPostRotation, False)):
+            rows = np.flatnonzero(flags[indices])
+            if rows.size:
+                m = matrices[indices[rows]]
+                result[rows] = m @ result[rows] if before else result[rows] @ m
+
+        # pre and post rotations are rotations, so the last column is still (0, 0, 0, 1) here and multiplying by the
+        # translation matrix only sets the last row
+        result[:, 3, 0:3] = self.positions[indices]
+        result[:, 0:3, :] *= self.scales[indices, np.newaxis, np.newaxis]
+        self.localMats[indices] = result
+
+    def update(self, rootMat=None):
+        """
+        Recompute local matrices of dirty nodes, then world matrices level by level. Only dirty nodes and their
+        descendants are recomputed, and nothing is done if no node changed and rootMat is the same as last time.
+
+        :param rootMat: parent matrix of all roots, identity if not given
+        :type rootMat: numpy.ndarray
+        """
+        if rootMat is None:
+            rootMat = np.identity(4)
+        rootChanged = self._rootMat is None or not np.array_equal(rootMat, self._rootMat)
+        if not self._worldDirty and not rootChanged:
+            return
+        self._rootMat = np.array(rootMat, dtype=np.float32)
+
+        n = self.nodeNum
+        changed = self.localDirty[:n].copy()
+        self.updateLocal(np.flatnonzero(changed))
+        self.localDirty[:n] = False
+
+        levels = self.levels()
+        if levels:
+            roots = levels[0]
+            if not rootChanged:
+                roots = roots[changed[roots]]
+            self.worldMats[roots] = self.localMats[roots] @ self._rootMat
+            changed[roots] = True
+            for level in levels[1:]:
+                # a node is recomputed if it changed itself or its parent was recomputed
+                changed[level] |= changed[self.parents[level]]
+                rows = level[changed[level]]
+                if rows.size:
+                    self.worldMats[rows] = np.matmul(self.localMats[rows], self.worldMats[self.parents[rows]])
+            rows = np.flatnonzero(changed)
+            self.normalMats[rows] = GLUtility.normalMatrix(self.worldMats[rows])
+        self._worldDirty = False
+
+    def node(self, index):
+        """
+        :return: a view on node index
+        :rtype: SceneNode
+        """
+        return SceneNode(self, index)
+
+    def pullComponent(self, index, component):
+        """
+        Copy a Component's transform parameters into node index
+        """
+        self.positions[index] = component.currentPos.getCoords()
+        self.angles[index] = (component.uAngle, component.vAngle, component.wAngle)
+        self.axes[index] = [component.uAxis.getCoords(), component.vAxis.getCoords(), component.wAxis.getCoords()]
+        self.scales[index] = min(component.currentScaling)
+        self.preRotations[index] = component.preRotationMat
+        self.postRotations[index] = component.postRotationMat
+        self.hasPreRotation[index] = not np.array_equal(component.preRotationMat, np.identity(4))
+        self.hasPostRotation[index] = not np.array_equal(component.postRotationMat, np.identity(4))
+        self.markDirty(index)
+
+    @classmethod
+    def fromComponent(cls, root):
+        """
+        Flatten a Component tree. Every Component is bound to its node: its setters push changed parameters into the
+        arrays, its update runs the batched graph update, and its transformationMat reads the node's world matrix.
+
+        :param root: top Component of the tree
+        :type root: Component
+        :rtype: FlatSceneGraph
+        """
+        components = [root]
+        parents = [-1]
+        i = 0
+        while i < len(components):
+            for c in components[i].children:
+                components.append(c)
+                parents.append(i)
+            i += 1
+
+        graph = cls(len(components))
+        graph.addNodes(parents)
+        for index, component in enumerate(components):
+            component.sceneGraph = graph
+            component.nodeIndex = index
+            graph.pullComponent(index, component)
+        return graph
+
+
+class SceneNode:
+    """
+    Thin view on one node of a FlatSceneGraph, with setters named after Component's. Nothing is stored here, every
+    read and write goes to the graph's arrays.
+    """
+    __slots__ = ("graph", "index")
+
+    def __init__(self, graph, index):
+        self.graph = graph
+        self.index = index
+
+    @property
+    def parent(self):
+        parent = self.graph.parents[self.index]
+        return None if parent < 0 else SceneNode(self.graph, int(parent))
+
+    @property
+    def transformationMat(self):
+        return self.graph.worldMats[self.index]
+
+    def setCurrentPosition(self, pos):
+        self.graph.positions[self.index] = pos
+        self.graph.markDirty(self.index)
+
+    def setCurrentAngle(self, angle, axisIndex):
+        """
+        :param angle: rotation angle in degrees
+        :param axisIndex: 0, 1, 2 for the u, v, w axis
+        """
+        self.graph.angles[self.index, axisIndex] = angle
+        self.graph.markDirty(self.index)
+
+    def setCurrentScale(self, scale):
+        self.graph.scales[self.index] = scale
+        self.graph.markDirty(self.index)
+
+    def setPreRotation(self, rotation_matrix):
+        self.graph.preRotations[self.index] = rotation_matrix
+        self.graph.hasPreRotation[self.index] = True
+        self.graph.markDirty(self.index)
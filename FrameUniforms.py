@@ -0,0 +1,72 @@
+"""
+Define the per frame uniform block shared by every GLProgram.
+Projection, view, their product and inverses, the camera position, the viewport size and the time are packed into one
+std140 uniform buffer bound at GLProgram.FRAME_BLOCK_BINDING. It is uploaded once per frame with one glBufferSubData,
+and every program declaring the block through GLProgram.genFrameBlockSource reads it without any uniform call.
+First version in 10/18/2026
+
+:author: Zack(Wanzhi Wang)
+:version: 2026.10.18
+"""
+
+import time
+
+import numpy as np
+
+from GLBuffer import UBO
+from GLProgram import GLProgram
+
+# std140 layout in 4 byte words: six mat4, then viewPosition sharing its 16 bytes with time, then viewportSize
+FRAME_WORDS = 104
+
+
+class FrameUniforms:
+    """
+    Camera and frame uniforms of the current frame. Create it on the GL thread and call update before drawing
+    """
+    buffer = None  # UBO
+    data = None  # CPU copy of the buffer, in 4 byte words
+    startTime = 0.0  # time is counted from the creation in seconds
+
+    def __init__(self):
+        self.data = np.zeros(FRAME_WORDS, dtype=np.float32)
+        self.buffer = UBO(GLProgram.FRAME_BLOCK_BINDING)
+        self.buffer.setBuffer(self.data)
+        self.startTime = time.perf_counter()
+
+    @staticmethod
+    def pack(projectionMat, viewMat, viewPosition, viewportSize, seconds):
+        """
+        Pack a frame into the std140 block, matrices are given and stored in column-major order like setMat4 takes
+        them
+
+        :rtype: numpy.ndarray
+        """
+        projectionMat = np.asarray(projectionMat, dtype=np.float64)
+        viewMat = np.asarray(viewMat, dtype=np.float64)
+        # column-major storage is the transpose, so the GL product projection * view is stored as view @ projection
+        viewProjectionMat = viewMat @ projectionMat
+        matrices = (projectionMat, viewMat, viewProjectionMat, np.linalg.inv(projectionMat), np.linalg.inv(viewMat),
+                    np.linalg.inv(viewProjectionMat))
+        data = np.zeros(FRAME_WORDS, dtype=np.float32)
+        data[0:96] = np.concatenate([m.flatten("C") for m in matrices])
+        data[96:99] = viewPosition
+        data[99] = seconds
+        data[100:102] = viewportSize
+        return data
+
+    def update(self, projectionMat, viewMat, viewPosition, viewportSize):
+        """
+        Set the uniforms of this frame. The time advances every frame, so the block is always written
+
+        :param viewPosition: camera position in world space
+        :param viewportSize: width and height in pixels
+        """
+        self.data = self.pack(projectionMat, viewMat, viewPosition, viewportSize,
+                              time.perf_counter() - self.startTime)
+        self.buffer.setSubBuffer(0, self.data)
+        # other code may have used the binding point since the last frame
+        self.buffer.bind()
+
+    def delete(self):
+        self.buffer.delete()
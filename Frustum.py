@@ -0,0 +1,89 @@
+"""
+Define a view frustum for culling, built from the view and projection matrices used by the shaders.
+Planes are extracted with the Gribb-Hartmann method, and bounding spheres are tested against all six planes at once.
+First version in 10/18/2026
+
+:author: Zack(Wanzhi Wang)
+:version: 2026.10.18
+"""
+
+import numpy as np
+
+
+class Frustum:
+    """
+    Six planes of a view frustum in world space. A point p is inside a plane if dot(plane[0:3], p) + plane[3] >= 0.
+    """
+    OUTSIDE = 0
+    INTERSECT = 1
+    INSIDE = 2
+
+    planes = None  # (6, 4): left, right, bottom, top, near, far
+
+    def __init__(self, viewMat, projectionMat):
+        """
+        :param viewMat: view matrix in column-major order, like GLUtility.view returns
+        :type viewMat: numpy.ndarray
+        :param projectionMat: projection matrix in column-major order, like GLUtility.perspective returns
+        :type projectionMat: numpy.ndarray
+        """
+        # matrices are stored transposed, so the clip space transform in the usual row-major form is this transpose
+        m = (np.asarray(viewMat) @ np.asarray(projectionMat)).T
+        planes = np.array([m[3] + m[0], m[3] - m[0], m[3] + m[1], m[3] - m[1], m[3] + m[2], m[3] - m[2]])
+        self.planes = planes / np.linalg.norm(planes[:, 0:3], axis=1)[:, np.newaxis]
+
+    def classifySphere(self, center, radius):
+        """
+        :param center: sphere center in world space
+        :type center: numpy.ndarray
+        :param radius: sphere radius
+        :type radius: float
+        :return: OUTSIDE, INTERSECT or INSIDE
+        :rtype: int
+        """
+        distances = self.planes[:, 0:3] @ center + self.planes[:, 3]
+        if np.any(distances < -radius):
+            return Frustum.OUTSIDE
+        if np.all(distances >= radius):
+            return Frustum.INSIDE
+        return Frustum.INTERSECT
+
+    def intersectsSphere(self, center, radius):
+        """
+        :return: True if any part of the sphere may be inside the frustum
+        :rtype: bool
+        """
+        return bool(np.all(self.planes[:, 0:3] @ center + self.planes[:, 3] >= -radius))
+
+    def spheresVisible(self, centers, radii):
+        """
+        Test many spheres at once
+
+        :param centers: sphere centers in shape (n, 3)
+        :type centers: numpy.ndarray
+        :param radii: sphere radii in shape (n,)
+        :type radii: numpy.ndarray
+        :return: mask of spheres which may be inside the frustum
+        :rtype: numpy.ndarray
+        """
+        distances = centers @ self.planes[:, 0:3].T + self.planes[:, 3]
+        return np.all(distances >= -np.asarray(radii)[:, np.newaxis], axis=1)
+
+    def boxesVisible(self, boxMin, boxMax):
+        """
+        Test many axis aligned boxes at once. For every plane only the box corner furthest along the plane normal
+        is checked, so a box is reported visible unless it is fully outside one plane.
+
+        :param boxMin: box minimum corners in shape (n, 3)
+        :type boxMin: numpy.ndarray
+        :param boxMax: box maximum corners in shape (n, 3)
+        :type boxMax: numpy.ndarray
+        :return: mask of boxes which may be inside the frustum
+        :rtype: numpy.ndarray
+        """
+        normals = self.planes[:, 0:3]
+        # distance of the furthest corner = center distance + half extent projected on |normal|
+        center = (boxMin + boxMax) / 2
+        extent = (boxMax - boxMin) / 2
+        distances = center @ normals.T + self.planes[:, 3] + extent @ np.abs(normals).T
+        return np.all(distances >= 0, axis=1)
@@ -33,6 +33,157 @@ except ImportError:
 import numpy as np
 import ctypes
 
+import ParametricSurface
+
+
+class VertexAttrib:
+    """
+    Describe how one vertex attribute is stored in a VBO.
+    Displayables always generate vertices in the 11 columns layout (0:3 position, 3:6 normal, 6:9 color,
+    9:11 texture coordinates), column and size tell which columns this attribute is read from.
+
+    Supported storages:
+        * "float32": 32-bit float
+        * "float16": half float
+        * "snorm16"/"snorm8": signed normalized integer, values in [-1, 1]
+        * "unorm16"/"unorm8": unsigned normalized integer, values in [0, 1]
+        * "snorm10_10_10_2": 3 signed normalized 10-bit values packed in 4 bytes, mainly for normals
+        * "constant": not stored in VBO, the value of the first vertex is used for the whole mesh
+    """
+    # storage -> (numpy dtype, GL type, normalized, scale applied before rounding to integers)
+    storages = {
+        "float32": (np.dtype("float32"), gl.GL_FLOAT, gl.GL_FALSE, None),
+        "float16": (np.dtype("float16"), gl.GL_HALF_FLOAT, gl.GL_FALSE, None),
+        "snorm16": (np.dtype("int16"), gl.GL_SHORT, gl.GL_TRUE, 32767),
+        "snorm8": (np.dtype("int8"), gl.GL_BYTE, gl.GL_TRUE, 127),
+        "unorm16": (np.dtype("uint16"), gl.GL_UNSIGNED_SHORT, gl.GL_TRUE, 65535),
+        "unorm8": (np.dtype("uint8"), gl.GL_UNSIGNED_BYTE, gl.GL_TRUE, 255),
+        "snorm10_10_10_2": (np.dtype("uint32"), gl.GL_INT_2_10_10_10_REV, gl.GL_TRUE, 511),
+    }
+
+    name = None  # attrib index name used in GLProgram, like "vertexPos"
+    column = 0
+    size = 0
+    storage = None
+    byteSize = 0  # bytes used by one vertex, padded to 4 bytes alignment
+
+    def __init__(self, name, column, size, storage="float32"):
+        if storage != "constant" and storage not in self.storages:
+            raise TypeError("Unknown vertex attrib storage " + str(storage))
+        if storage == "snorm10_10_10_2" and size != 3:
+            raise TypeError("snorm10_10_10_2 storage only accept 3 components")
+        self.name = name
+        self.column = column
+        self.size = size
+        self.storage = storage
+        if storage == "constant":
+            self.byteSize = 0
+        elif storage == "snorm10_10_10_2":
+            self.byteSize = 4
+        else:
+            self.byteSize = (self.storages[storage][0].itemsize * size + 3) // 4 * 4
+
+    def pack(self, vertices):
+        """
+        Convert this attribute's columns to its storage type
+
+        :return: array in shape (vertexNum, byteSize) and uint8 type
+        :rtype: numpy.ndarray
+        """
+        dtype, _, _, scale = self.storages[self.storage]
+        values = np.asarray(vertices[:, self.column:self.column + self.size], dtype=np.float64)
+        if self.storage == "snorm10_10_10_2":
+            q = np.rint(np.clip(values, -1, 1) * scale).astype(np.int32) & 0x3FF
+            packed = (q[:, 0] | (q[:, 1] << 10) | (q[:, 2] << 20)).astype(dtype)
+            return packed.view(np.uint8).reshape(-1, 4)
+        if scale is not None:
+            low = -1 if dtype.kind == "i" else 0
+            values = np.rint(np.clip(values, low, 1) * scale)
+        result = np.zeros([values.shape[0], self.byteSize], dtype=np.uint8)
+        result[:, 0:dtype.itemsize * self.size] = values.astype(dtype).view(np.uint8).reshape(values.shape[0], -1)
+        return result
+
+
+class VertexFormat:
+    """
+    A vertex format descriptor, which decides how Displayable vertices are packed into a VBO, and sets the attrib
+    pointers to match. Constant attributes are dropped from VBO and set on the VAO as a generic vertex value instead.
+    """
+    name = None
+    attribs = None  # list<VertexAttrib> stored in VBO, interleaved in this order
+    constants = None  # list<VertexAttrib> with "constant" storage
+    offsets = None  # byte offset of every stored attrib
+    stride = 0  # bytes per vertex
+
+    def __init__(self, name, attribs):
+        self.name = name
+        self.attribs = [a for a in attribs if a.storage != "constant"]
+        self.constants = [a for a in attribs if a.storage == "constant"]
+        self.offsets = []
+        self.stride = 0
+        for a in self.attribs:
+            self.offsets.append(self.stride)
+            self.stride += a.byteSize
+
+    def pack(self, vertices):
+        """
+        Interleave vertices into one buffer in this format
+
+        :param vertices: vertices in the 11 columns Displayable layout
+        :type vertices: numpy.ndarray
+        :return: array in shape (vertexNum, stride) and uint8 type
+        :rtype: numpy.ndarray
+        """
+        result = np.empty([vertices.shape[0], self.stride], dtype=np.uint8)
+        for a, offset in zip(self.attribs, self.offsets):
+            result[:, offset:offset + a.byteSize] = a.pack(vertices)
+        return result
+
+    def setAttribPointers(self, shaderProg, vbo, vao, vertices):
+        """
+        Set attrib pointers for all stored attributes, and constant values for constant ones.
+        VAO must be bound before calling this.
+        """
+        vbo.bind()
+        for a, offset in zip(self.attribs, self.offsets):
+            attribLoc = shaderProg.getAttribLocation(a.name)
+            if attribLoc < 0:
+                continue
+            _, glType, normalized, _ = VertexAttrib.storages[a.storage]
+            size = 4 if a.storage == "snorm10_10_10_2" else a.size
+            gl.glVertexAttribPointer(attribLoc, size, glType, normalized, self.stride, ctypes.c_void_p(offset))
+            gl.glEnableVertexAttribArray(attribLoc)
+        for a in self.constants:
+            attribLoc = shaderProg.getAttribLocation(a.name)
+            if attribLoc < 0 or vertices.shape[0] == 0:
+                continue
+            vao.setConstantAttrib(attribLoc, vertices[0, a.column:a.column + a.size])
+
+    def byteSize(self, vertexNum):
+        return self.stride * vertexNum
+
+
+# 11 float32 columns, the same as the original Displayable layout, 44 bytes per vertex
+FULL_VERTEX_FORMAT = VertexFormat("full", [VertexAttrib("vertexPos", 0, 3),
+                                           VertexAttrib("vertexNormal", 3, 3),
+                                           VertexAttrib("vertexColor", 6, 3),
+                                           VertexAttrib("vertexTexture", 9, 2)])
+# color is constant for a generated mesh, normals and texture coordinates tolerate low precision, 20 bytes per vertex
+COMPACT_VERTEX_FORMAT = VertexFormat("compact", [VertexAttrib("vertexPos", 0, 3),
+                                                 VertexAttrib("vertexNormal", 3, 3, "snorm10_10_10_2"),
+                                                 VertexAttrib("vertexColor", 6, 3, "constant"),
+                                                 VertexAttrib("vertexTexture", 9, 2, "unorm16")])
+# for buffers merging meshes of different colors, color is stored per vertex, 24 bytes per vertex
+COMPACT_COLOR_VERTEX_FORMAT = VertexFormat("compactColor", [VertexAttrib("vertexPos", 0, 3),
+                                                            VertexAttrib("vertexNormal", 3, 3, "snorm10_10_10_2"),
+                                                            VertexAttrib("vertexColor", 6, 3, "unorm8"),
+                                                            VertexAttrib("vertexTexture", 9, 2, "unorm16")])
+# for meshes without texture coordinates, 16 bytes per vertex
+COMPACT_NO_TEXTURE_VERTEX_FORMAT = VertexFormat("compactNoTexture",
+                                                [VertexAttrib("vertexPos", 0, 3),
+                                                 VertexAttrib("vertexNormal", 3, 3, "snorm10_10_10_2"),
+                                                 VertexAttrib("vertexColor", 6, 3, "constant")])
+
 
 class VBO:
     """
@@ -48,6 +199,9 @@ class VBO:
     # def __del__(self):
     #     gl.glDeleteBuffers(1, self.vbo)
 
+    def delete(self):
+        gl.glDeleteBuffers(1, [self.vbo])
+
     def bind(self):
         gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
 
@@ -61,7 +215,8 @@ class VBO:
         # type conversion
         if bufferDataArray.dtype != np.dtype("float32"):
             bufferDataArray = bufferDataArray.astype(np.dtype("float32"))
-        bufferData = bufferDataArray.flatten("C")  # flatten in row-major order
+        # flatten in row-major order, ravel doesn't copy contiguous arrays such as memory-mapped cache entries
+        bufferData = bufferDataArray.ravel("C")
         self.vertexAttribSize = vertexAttribSize
 
         bufferSize = bufferDataArray.size
@@ -71,6 +226,23 @@ class VBO:
         self.bind()
         gl.glBufferData(gl.GL_ARRAY_BUFFER, byteLength, bufferData, gl.GL_STATIC_DRAW)
 
+    def setFormattedBuffer(self, vertices: np.ndarray, vertexFormat: VertexFormat):
+        """
+        Pack vertices with a vertex format and upload them. Attrib pointers should be set by
+        vertexFormat.setAttribPointers afterwards.
+
+        :param vertices: vertices in the 11 columns Displayable layout
+        :type vertices: numpy.ndarray
+        :param vertexFormat: how the vertices are stored in this buffer
+        :type vertexFormat: VertexFormat
+        """
+        bufferData = vertexFormat.pack(vertices)
+        self.vertexAttribSize = 0
+        self.vertexNum = bufferData.shape[0]
+
+        self.bind()
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, bufferData.nbytes, bufferData, gl.GL_STATIC_DRAW)
+
     def setAttribPointer(self, attribLoc, stride=0, offset=0, attribSize=0):
         attribSize = self.vertexAttribSize if attribSize == 0 else attribSize
         if attribSize == 0:
@@ -94,11 +266,26 @@ class VBO:
 
 class EBO:
     """
-    A class to handle EBO in OpenGL, with some help functions
+    A class to handle EBO in OpenGL, with some help functions.
+    Indices are stored with the smallest unsigned type which can address every vertex, so small meshes use 16-bit
+    indices instead of 32-bit ones.
+    Besides triangle lists, EBO can draw triangle strips. In strip topology, -1 in the given indices marks a primitive
+    restart, it is stored as the largest value of the chosen index type.
     """
     ebo = None
     indexNum = 0
     triangleNum = 0
+    topology = gl.GL_TRIANGLES  # GL_TRIANGLES or GL_TRIANGLE_STRIP
+
+    indexType = gl.GL_UNSIGNED_INT  # GL type of the stored indices, passed to glDrawElements
+    indexSize = 4  # bytes per stored index
+    restartIndex = None  # stored value of the primitive restart marker, None if there is no restart
+    savedBytes = 0  # bytes saved compared with storing 32-bit indices
+
+    # 8-bit indices are supported, but many GPUs convert them on the fly, so they are off by default
+    allowByteIndices = False
+    # GL_PRIMITIVE_RESTART_FIXED_INDEX is core since GL 4.3, older contexts set the restart index explicitly
+    fixedIndexRestart = None
 
     def __init__(self):
         self.ebo = gl.glGenBuffers(1)
@@ -106,44 +293,173 @@ class EBO:
     # def __del__(self):
     #     gl.glDeleteBuffers(1, self.ebo)
 
+    def delete(self):
+        gl.glDeleteBuffers(1, [self.ebo])
+
     def bind(self):
         gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.ebo)
 
-    def setBuffer(self, bufferDataArray: np.ndarray):
-        if bufferDataArray.dtype != np.dtype("int32"):
-            bufferDataArray = bufferDataArray.astype(np.dtype("int32"))
-        bufferData = bufferDataArray.flatten("C")  # row-major order flatten
+    @classmethod
+    def chooseIndexType(cls, vertexNum, primitiveRestart=False):
+        """
+        Find the smallest index type able to address vertexNum vertices
+
+        :param vertexNum: number of addressable vertices, which is the largest index plus one
+        :type vertexNum: int
+        :param primitiveRestart: if set, the largest value of the type is kept for the restart marker
+        :type primitiveRestart: bool
+        :return: numpy dtype and the matching GL enum
+        :rtype: tuple
+        """
+        reserved = 1 if primitiveRestart else 0
+        if cls.allowByteIndices and vertexNum + reserved <= 0xFF + 1:
+            return np.dtype("uint8"), gl.GL_UNSIGNED_BYTE
+        if vertexNum + reserved <= 0xFFFF + 1:
+            return np.dtype("uint16"), gl.GL_UNSIGNED_SHORT
+        return np.dtype("uint32"), gl.GL_UNSIGNED_INT
+
+    def setBuffer(self, bufferDataArray: np.ndarray, vertexNum=None, topology=gl.GL_TRIANGLES):
+        """
+        :param bufferDataArray: the indices data. It will be flatten in row-major order if its dimension isn't one
+        :type bufferDataArray: numpy.ndarray
+        :param vertexNum: number of vertices the indices refer to. If not given, it is found from the largest index
+        :type vertexNum: int
+        :param topology: GL_TRIANGLES, or GL_TRIANGLE_STRIP with -1 as primitive restart marker
+        :type topology: int
+        """
+        self.topology = topology
+        primitiveRestart = topology == gl.GL_TRIANGLE_STRIP and bufferDataArray.size > 0 and \
+            bufferDataArray.min() < 0
+        if vertexNum is None:
+            vertexNum = int(bufferDataArray.max()) + 1 if bufferDataArray.size > 0 else 0
+        if topology == gl.GL_TRIANGLE_STRIP:
+            self.triangleNum = ParametricSurface.stripTriangleNum(bufferDataArray)
+        else:
+            self.triangleNum = bufferDataArray.size // 3  # floor division to get triangle number
+        indexDtype, self.indexType = self.chooseIndexType(vertexNum, primitiveRestart)
+        if primitiveRestart:
+            self.restartIndex = np.iinfo(indexDtype).max
+            bufferDataArray = np.where(bufferDataArray < 0, self.restartIndex, bufferDataArray)
+        else:
+            self.restartIndex = None
+        if bufferDataArray.dtype != indexDtype:
+            bufferDataArray = bufferDataArray.astype(indexDtype)
+        bufferData = bufferDataArray.ravel("C")  # row-major order flatten, no copy for contiguous arrays
 
         self.indexNum = bufferData.size
-        self.triangleNum = self.indexNum // 3  # floor division to get triangle number
-        byteLength = 4 * self.indexNum
+        self.indexSize = indexDtype.itemsize
+        self.savedBytes = (4 - self.indexSize) * self.indexNum
+        byteLength = self.indexSize * self.indexNum
 
         self.bind()
         gl.glBufferData(gl.GL_ELEMENT_ARRAY_BUFFER, byteLength, bufferData, gl.GL_STATIC_DRAW)
 
-    def draw(self):
-        gl.glDrawElements(gl.GL_TRIANGLES, self.indexNum, gl.GL_UNSIGNED_INT, None)
+    @classmethod
+    def supportsFixedIndexRestart(cls):
+        if cls.fixedIndexRestart is None:
+            version = gl.glGetIntegerv(gl.GL_MAJOR_VERSION) * 10 + gl.glGetIntegerv(gl.GL_MINOR_VERSION)
+            cls.fixedIndexRestart = version >= 43
+        return cls.fixedIndexRestart
+
+    def draw(self, instanceNum=None):
+        """
+        Draw the indexed primitives, or instanceNum instances of them with one glDrawElementsInstanced call
+
+        :param instanceNum: number of instances, None for a plain draw
+        :type instanceNum: int
+        """
+        if self.restartIndex is None:
+            self.drawElements(instanceNum)
+            return
+        # restart is only enabled around this draw, a triangle list may use the same value as a real vertex index
+        if self.supportsFixedIndexRestart():
+            gl.glEnable(gl.GL_PRIMITIVE_RESTART_FIXED_INDEX)
+            self.drawElements(instanceNum)
+            gl.glDisable(gl.GL_PRIMITIVE_RESTART_FIXED_INDEX)
+        else:
+            gl.glEnable(gl.GL_PRIMITIVE_RESTART)
+            gl.glPrimitiveRestartIndex(int(self.restartIndex))
+            self.drawElements(instanceNum)
+            gl.glDisable(gl.GL_PRIMITIVE_RESTART)
+
+    def drawElements(self, instanceNum=None):
+        if instanceNum is None:
+            gl.glDrawElements(self.topology, self.indexNum, self.indexType, None)
+        else:
+            gl.glDrawElementsInstanced(self.topology, self.indexNum, self.indexType, None, instanceNum)
 
 
 class VAO:
     """
-    Responsible for VAO
+    Responsible for VAO.
+    Constant vertex attributes are not part of the GL vertex array state, so VAO keeps them and applies them on bind.
     """
     vao = None
+    constantAttribs = None  # dict<int, numpy.ndarray> attrib location to its constant value
 
     def __init__(self):
         self.vao = gl.glGenVertexArrays(1)
+        self.constantAttribs = {}
 
     # def __del__(self):
     #     gl.glDeleteVertexArrays(1, self.vao)
 
+    def delete(self):
+        gl.glDeleteVertexArrays(1, [self.vao])
+
+    def setConstantAttrib(self, attribLoc, value):
+        """
+        Use a single value for an attribute which has no array enabled in this VAO
+        """
+        constant = np.array([0, 0, 0, 1], dtype=np.float32)
+        constant[0:len(value)] = value
+        self.constantAttribs[attribLoc] = constant
+
     def bind(self):
         gl.glBindVertexArray(self.vao)
+        for attribLoc, value in self.constantAttribs.items():
+            gl.glVertexAttrib4fv(attribLoc, value)
 
     def unbind(self):
         gl.glBindVertexArray(0)
 
 
+class UBO:
+    """
+    A uniform buffer, read by every uniform block bound to the same binding point.
+    setBuffer allocates its storage, setSubBuffer replaces part of it.
+    """
+    ubo = None
+    binding = 0
+    byteSize = 0
+
+    def __init__(self, binding):
+        self.ubo = gl.glGenBuffers(1)
+        self.binding = binding
+        self.byteSize = 0
+
+    def delete(self):
+        gl.glDeleteBuffers(1, [self.ubo])
+
+    def bind(self):
+        """
+        Attach this buffer to its binding point
+        """
+        gl.glBindBufferBase(gl.GL_UNIFORM_BUFFER, self.binding, self.ubo)
+
+    def setBuffer(self, bufferData: np.ndarray):
+        gl.glBindBuffer(gl.GL_UNIFORM_BUFFER, self.ubo)
+        gl.glBufferData(gl.GL_UNIFORM_BUFFER, bufferData.nbytes, bufferData, gl.GL_DYNAMIC_DRAW)
+        gl.glBindBuffer(gl.GL_UNIFORM_BUFFER, 0)
+        self.byteSize = bufferData.nbytes
+        self.bind()
+
+    def setSubBuffer(self, byteOffset, bufferData: np.ndarray):
+        gl.glBindBuffer(gl.GL_UNIFORM_BUFFER, self.ubo)
+        gl.glBufferSubData(gl.GL_UNIFORM_BUFFER, byteOffset, bufferData.nbytes, bufferData)
+        gl.glBindBuffer(gl.GL_UNIFORM_BUFFER, 0)
+
+
 # A global variable in this scope to store next texture id, there should be no duplicate textureUnitID
 NextTextureID = 1
 
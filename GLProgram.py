@@ -35,6 +35,14 @@ except ImportError:
 import numpy as np
 import math
 
+from GLBuffer import UBO
+from MaterialTable import MaterialTable
+
+# std140 layout of the light block in 4 byte words: lightNum padded to 16 bytes, then one row per Light,
+# each vec3 shares its 16 bytes with the scalar declared after it
+LIGHT_HEADER_WORDS = 4
+LIGHT_WORDS = 20
+
 
 def perspectiveMatrix(angleOfView, near, far):
     result = np.identity(4)
@@ -49,6 +57,28 @@ def perspectiveMatrix(angleOfView, near, far):
     result[3, 3] = 0
 
 
+def packLights(lights):
+    """
+    Pack Lights into rows of the std140 light block
+
+    :type lights: list<Light>
+    :rtype: numpy.ndarray
+    """
+    rows = np.zeros((len(lights), LIGHT_WORDS), dtype=np.float32)
+    rows[:, 0:4] = [l.color for l in lights]
+    rows[:, 4:7] = [l.position for l in lights]
+    rows[:, 8:11] = [l.infiniteDirection for l in lights]
+    rows[:, 12:15] = [l.spotDirection for l in lights]
+    rows[:, 15] = [l.spotAngularFactor for l in lights]
+    rows[:, 16:19] = [l.spotRadialFactor for l in lights]
+    rows[:, 19] = [l.spotAngleLimit for l in lights]
+    # bools are 4 byte integers in std140
+    flags = rows.view(np.int32)
+    flags[:, 7] = [bool(l.infiniteOn) for l in lights]
+    flags[:, 11] = [bool(l.spotOn) for l in lights]
+    return rows
+
+
 class GLProgram:
     program = None
 
@@ -62,6 +92,33 @@ class GLProgram:
     ready = False  # a control flag which reflect if this GLprogram is ready
     debug = 0
 
+    uniformLocations = None  # uniform name in the program -> location, resolved after every link
+    # values the setters last gave GL, by location, so setting the same value again makes no GL call.
+    # uniformCalls and uniformCallsSkipped count the setter calls made and skipped since resetUniformCounters
+    uniformShadow = None
+    uniformCalls = 0
+    uniformCallsSkipped = 0
+    usedProgram = None  # program GL is using, shared by all GLPrograms so use() can skip glUseProgram
+
+    # shader storage buffers and indirect multi draws need GL 4.3, checked once on the first compiled program
+    indirectDraw = None
+    DRAW_DATA_BINDING = 0
+
+    # lights are read from a uniform buffer, uniform buffer binding points are apart from shader storage ones.
+    # setLight only records the light, changed rows are packed and uploaded together on the next use()
+    LIGHT_BLOCK_BINDING = 0
+    # camera and frame uniforms are shared by every program through one block, filled by FrameUniforms
+    FRAME_BLOCK_BINDING = 1
+    # draws pass an index into the material table, materials which don't fit use the material uniforms
+    MATERIAL_BLOCK_BINDING = 2
+    materialTable = None  # MaterialTable, None if the program has no material block
+    lights = None  # Light of each slot, None for unused slots
+    lightNum = 0  # active lights, the shader loops over slots below it
+    lightData = None  # CPU copy of the light buffer, in 4 byte words
+    lightBuffer = None  # UBO, None if the program has no light block
+    changedLights = None  # slots set since the last upload
+    lightsDirty = False
+
     def __init__(self) -> None:
         self.program = gl.glCreateProgram()
 
@@ -79,33 +136,62 @@ class GLProgram:
             "projectionMat": "projection",
             "viewMat": "view",
             "modelMat": "model",
-
+            # inverse transpose of modelMat, single draws set it with modelMat
+            "normalMat": "modelNormal",
+
+            # members of the frame block, with projectionMat and viewMat
+            "frameBlock": "FrameBlock",
+            "viewProjectionMat": "viewProjection",
+            "inverseProjectionMat": "inverseProjection",
+            "inverseViewMat": "inverseView",
+            "inverseViewProjectionMat": "inverseViewProjection",
             "viewPosition": "viewPosition",
+            "time": "time",
+            "viewportSize": "viewportSize",
             "material": "material",
             "light": "light",
+            "lightBlock": "LightBlock",
+            "lightNum": "lightNum",
+
+            # materials are read from the table by index, -1 selects the material uniform
+            "materialBlock": "MaterialBlock",
+            "materials": "materials",
+            "materialIndex": "materialIndex",
+
+            # instanced draws read the model matrix and material index from per instance attributes
+            "instancing": "instancing",
+            "instanceModelMat": "aInstanceModel",
+            "instanceMaterialIndex": "aInstanceMaterialIndex",
+
+            # indirect draws read the model matrix, material index and routing of draw aDrawId from a shader storage
+            # buffer
+            "indirect": "indirect",
+            "drawId": "aDrawId",
+            "drawData": "drawData",
 
             "maxLightsNum": "20",
-            "maxMaterialNum": "20"
+            # 256 materials of 64 bytes fill the smallest uniform block size GL guarantees
+            "maxMaterialNum": "256"
         }
         self.attribs["diffuse"] = self.attribs["material"] + ".diffuse"
         self.attribs["specular"] = self.attribs["material"] + ".specular"
         self.attribs["ambient"] = self.attribs["material"] + ".ambient"
         self.attribs["highlight"] = self.attribs["material"] + ".highlight"
-        for i in range(int(self.attribs["maxLightsNum"])):
-            self.attribs[f"light[{i}].position"] = f"{self.attribs['light']}[{i}].position"
-            self.attribs[f"light[{i}].color"] = f"{self.attribs['light']}[{i}].color"
-            self.attribs[f"light[{i}].infiniteOn"] = f"{self.attribs['light']}[{i}].infiniteOn"
-            self.attribs[f"light[{i}].infiniteDirection"] = f"{self.attribs['light']}[{i}].infiniteDirection"
-            self.attribs[f"light[{i}].radialOn"] = f"{self.attribs['light']}[{i}].radialOn"
-            self.attribs[f"light[{i}].radialFactor"] = f"{self.attribs['light']}[{i}].radialFactor"
-            self.attribs[f"light[{i}].spotOn"] = f"{self.attribs['light']}[{i}].spotOn"
-            self.attribs[f"light[{i}].spotDirection"] = f"{self.attribs['light']}[{i}].spotDirection"
-            self.attribs[f"light[{i}].spotAngleLimit"] = f"{self.attribs['light']}[{i}].spotAngleLimit"
 
+        maxLightsNum = int(self.attribs["maxLightsNum"])
+        self.lights = [None] * maxLightsNum
+        self.lightNum = 0
+        self.lightData = np.zeros(LIGHT_HEADER_WORDS + maxLightsNum * LIGHT_WORDS, dtype=np.float32)
+        self.changedLights = set()
+        self.lightsDirty = False
+
+        self.supportsIndirectDraw()
         self.vertexShaderSource = self.genVertexShaderSource()
         self.fragmentShaderSource = self.genFragShaderSource()
 
     def __del__(self) -> None:
+        if GLProgram.usedProgram == self.program:
+            GLProgram.usedProgram = None
         try:
             gl.glDeleteProgram(self.program)
         except Exception as e:
@@ -123,30 +209,97 @@ class GLProgram:
             raise Exception(info)
         return shader
 
+    @classmethod
+    def supportsIndirectDraw(cls):
+        if cls.indirectDraw is None:
+            version = gl.glGetIntegerv(gl.GL_MAJOR_VERSION) * 10 + gl.glGetIntegerv(gl.GL_MINOR_VERSION)
+            cls.indirectDraw = version >= 43
+        return cls.indirectDraw
+
+    def genFrameBlockSource(self):
+        """
+        Declaration of the frame block, for every shader stage which reads camera or frame uniforms. Its std140
+        layout is the one FrameUniforms packs
+        """
+        return f'''
+layout(std140) uniform {self.attribs["frameBlock"]}{{
+    mat4 {self.attribs["projectionMat"]};
+    mat4 {self.attribs["viewMat"]};
+    mat4 {self.attribs["viewProjectionMat"]};
+    mat4 {self.attribs["inverseProjectionMat"]};
+    mat4 {self.attribs["inverseViewMat"]};
+    mat4 {self.attribs["inverseViewProjectionMat"]};
+    vec3 {self.attribs["viewPosition"]};
+    float {self.attribs["time"]};
+    vec2 {self.attribs["viewportSize"]};
+}};
+'''
+
     def genVertexShaderSource(self):
+        if self.indirectDraw:
+            # gl_DrawID needs GL 4.6, so the draw index comes from an instanced attribute offset by each command's
+            # baseInstance instead
+            indirectDeclarations = f'''
+in uint {self.attribs["drawId"]};
+
+struct DrawData{{
+    mat4 model;
+    int materialIndex;
+    int renderingFlag;
+}};
+layout(std430, binding = {self.DRAW_DATA_BINDING}) readonly buffer DrawDataBuffer{{
+    DrawData {self.attribs["drawData"]}[];
+}};
+'''
+            indirectMain = f'''
+    if ({self.attribs["indirect"]}){{
+        DrawData draw = {self.attribs["drawData"]}[{self.attribs["drawId"]}];
+        modelMatrix = draw.model;
+        vMaterialIndex = draw.materialIndex;
+        vRenderingFlag = draw.renderingFlag;
+    }}'''
+        else:
+            indirectDeclarations = ""
+            indirectMain = ""
+
         vss = f'''
-#version 330 core
+#version {430 if self.indirectDraw else 330} core
 in vec3 {self.attribs["vertexPos"]};
 in vec3 {self.attribs["vertexNormal"]};
 in vec3 {self.attribs["vertexColor"]};
 in vec2 {self.attribs["vertexTexture"]};
 
+// instanced variant, per instance attributes are only read when instancing is true
+in mat4 {self.attribs["instanceModelMat"]};
+in int {self.attribs["instanceMaterialIndex"]};
+{indirectDeclarations}
 out vec3 vPos;
 out vec3 vColor;
 smooth out vec3 vNormal;
 out vec2 vTexture;
-out int materialIndex;
+flat out int vMaterialIndex;
+flat out int vRenderingFlag;
 
-uniform mat4 {self.attribs["projectionMat"]};
-uniform mat4 {self.attribs["viewMat"]};
+{self.genFrameBlockSource()}
 uniform mat4 {self.attribs["modelMat"]};
+uniform mat4 {self.attribs["normalMat"]};
+uniform bool {self.attribs["instancing"]};
+uniform bool {self.attribs["indirect"]};
 
 void main()
 {{
-    gl_Position = {self.attribs["projectionMat"]} * {self.attribs["viewMat"]} * {self.attribs["modelMat"]} * vec4({self.attribs["vertexPos"]}, 1.0);
-    vPos = vec3(model * vec4({self.attribs["vertexPos"]}, 1.0));
+    mat4 modelMatrix = {self.attribs["instancing"]} ? {self.attribs["instanceModelMat"]} : {self.attribs["modelMat"]};
+    vMaterialIndex = {self.attribs["instanceMaterialIndex"]};
+    vRenderingFlag = 0;{indirectMain}
+    vec4 worldPos = modelMatrix * vec4({self.attribs["vertexPos"]}, 1.0);
+    gl_Position = {self.attribs["viewProjectionMat"]} * worldPos;
+    vPos = vec3(worldPos);
     vColor = {self.attribs["vertexColor"]};
-    vNormal = normalize(transpose(inverse({self.attribs["modelMat"]})) * vec4({self.attribs["vertexNormal"]}, 0.0) ).xyz;
+    // single draws take the normal matrix computed on the CPU when the model matrix changed, instanced and indirect
+    // draws still invert theirs per vertex
+    mat4 normalMatrix = {self.attribs["instancing"]} || {self.attribs["indirect"]} ?
+        transpose(inverse(modelMatrix)) : {self.attribs["normalMat"]};
+    vNormal = normalize(normalMatrix * vec4({self.attribs["vertexNormal"]}, 0.0) ).xyz;
     vTexture = {self.attribs["vertexTexture"]};
 }}
         '''
@@ -154,7 +307,7 @@ void main()
 
     def genFragShaderSource(self):
         fss = f"""
-#version 330 core
+#version {430 if self.indirectDraw else 330} core
 #define MAX_LIGHT_NUM {self.attribs["maxLightsNum"]}
 #define MAX_MATERIAL_NUM {self.attribs["maxMaterialNum"]}
 struct Material{{
@@ -164,36 +317,53 @@ struct Material{{
     float highlight;
 }};
 
+// members are ordered so std140 packs them without padding, see LIGHT_WORDS
 struct Light{{
-    vec3 position;
     vec4 color;
-    
+    vec3 position;
     bool infiniteOn;
     vec3 infiniteDirection;
-    
     bool spotOn;
     vec3 spotDirection;
-    vec3 spotRadialFactor;
     float spotAngularFactor;
+    vec3 spotRadialFactor;
     float spotAngleLimit;
-    //float a_l;
 }};
 
 in vec3 vPos;
 in vec3 vColor;
 smooth in vec3 vNormal;
 in vec2 vTexture;
+flat in int vMaterialIndex;
+flat in int vRenderingFlag;
 
 uniform int renderingFlag;
+uniform bool {self.attribs["instancing"]};
+uniform bool {self.attribs["indirect"]};
 uniform sampler2D {self.attribs["textureImage"]};
 
-uniform vec3 {self.attribs["viewPosition"]};
+{self.genFrameBlockSource()}
 uniform Material {self.attribs["material"]};
-uniform Light {self.attribs["light"]}[MAX_LIGHT_NUM];
+uniform int {self.attribs["materialIndex"]};
+layout(std140) uniform {self.attribs["materialBlock"]}{{
+    Material {self.attribs["materials"]}[MAX_MATERIAL_NUM];
+}};
+layout(std140) uniform {self.attribs["lightBlock"]}{{
+    int {self.attribs["lightNum"]};
+    Light {self.attribs["light"]}[MAX_LIGHT_NUM];
+}};
 
 out vec4 FragColor;
 void main()
 {{
+    // instanced and indirect draws take the material index from the vertex shader, the material it selects hides
+    // the uniform in the code below, and so does the routing of indirect draws
+    int {self.attribs["materialIndex"]} = {self.attribs["instancing"]} || {self.attribs["indirect"]} ?
+        vMaterialIndex : {self.attribs["materialIndex"]};
+    Material {self.attribs["material"]} = {self.attribs["materialIndex"]} >= 0 ?
+        {self.attribs["materials"]}[{self.attribs["materialIndex"]}] : {self.attribs["material"]};
+    int renderingFlag = {self.attribs["indirect"]} ? vRenderingFlag : renderingFlag;
+
     // These three lines are meaningless, they only works as attributes placeholder! 
     // Otherwise glsl will optimize out our attributes
     vec4 placeHolder = vec4(vPos+vColor+vNormal+vec3(vTexture, 1), 0);
@@ -228,7 +398,7 @@ void main()
         float ang_atten = 1.0;
         float nl = 0.0;
         float vr = 0.0;
-        for(int i=0; i<MAX_LIGHT_NUM; i++){{
+        for(int i=0; i<{self.attribs["lightNum"]}; i++){{
             // Define ambient light
             i_amb = {self.attribs["light"]}[i].color * {self.attribs["ambient"]};
             // Define diffusion light based on whether the light is infinite
@@ -373,15 +543,49 @@ void main()
         return attribLoc
 
     def getUniformLocation(self, name, lookThroughAttribs=True):
+        """
+        Location of a uniform, looked up in the cache filled after link.
+        A location returned by an earlier call is a valid name too and is passed through, so hot loops can resolve
+        their uniforms once. Such handles are only valid until the program is compiled again.
+        """
+        if isinstance(name, (int, np.integer)):
+            return name
         if lookThroughAttribs:
             variableName = self.getAttribName(name)
         else:
             variableName = name
-        uniformLoc = gl.glGetUniformLocation(self.program, variableName)
-        if uniformLoc == -1 and self.debug > 1:
-            print(f"Warning: Uniform {name} cannot found. Might have been optimized off")
+        uniformLoc = self.uniformLocations.get(variableName) if self.uniformLocations is not None else None
+        if uniformLoc is None:
+            uniformLoc = gl.glGetUniformLocation(self.program, variableName)
+            if self.uniformLocations is not None:
+                # misses are cached as well, so an optimized off uniform is only asked for once
+                self.uniformLocations[variableName] = uniformLoc
+            if uniformLoc == -1 and self.debug > 1:
+                print(f"Warning: Uniform {name} cannot found. Might have been optimized off")
         return uniformLoc
 
+    def cacheUniformLocations(self):
+        """
+        Resolve the location of every active uniform of the linked program.
+        GL lists an array of basic type once, as its first element, so all of its elements and its bare name are
+        resolved here too. Members of uniform blocks have no location and are left out.
+        """
+        self.uniformLocations = {}
+        uniformNum = gl.glGetProgramiv(self.program, gl.GL_ACTIVE_UNIFORMS)
+        for i in range(uniformNum):
+            name, size, _ = gl.glGetActiveUniform(self.program, i)
+            if isinstance(name, bytes):
+                name = name.decode()
+            names = [name]
+            if name.endswith("[0]"):
+                baseName = name[:-3]
+                names.append(baseName)
+                names.extend(f"{baseName}[{k}]" for k in range(1, size))
+            for n in names:
+                uniformLoc = gl.glGetUniformLocation(self.program, n)
+                if uniformLoc != -1:
+                    self.uniformLocations[n] = uniformLoc
+
     def getAttribName(self, attribIndexName):
         return self.attribs[attribIndexName]
 
@@ -399,6 +603,10 @@ void main()
         if not (vs_src and fs_src):
             raise Exception("shader source code missing")
 
+        # locations may move when the program is linked again, and linking resets all uniform values
+        self.uniformLocations = None
+        self.uniformShadow = {}
+
         vs = self.load_shader(vs_src, gl.GL_VERTEX_SHADER)
         if not vs:
             return
@@ -413,6 +621,12 @@ void main()
             info = gl.glGetShaderInfoLog(self.program)
             raise Exception(info)
 
+        self.cacheUniformLocations()
+        self.setUpLightBlock()
+        self.bindUniformBlock(self.attribs["frameBlock"], self.FRAME_BLOCK_BINDING)
+        if self.bindUniformBlock(self.attribs["materialBlock"], self.MATERIAL_BLOCK_BINDING) and \
+                self.materialTable is None:
+            self.materialTable = MaterialTable(int(self.attribs["maxMaterialNum"]), self.MATERIAL_BLOCK_BINDING)
         self.ready = True
 
     def setFragmentShaderRouting(self, routing="lighting"):
@@ -427,6 +641,14 @@ void main()
         "custom": some customized rendering
         "texture": this must use previous routing, if set to true, then mix color with texture
         """
+        self.use()
+        self.setInt("renderingFlag", self.routingFlag(routing), lookThroughAttribs=False)
+
+    @staticmethod
+    def routingFlag(routing):
+        """
+        The renderingFlag bits of a routing, see setFragmentShaderRouting
+        """
         renderingFlag = 0
         if isinstance(routing, str):
             routing = routing.lower()
@@ -446,9 +668,7 @@ void main()
                 renderingFlag = renderingFlag | (0x1 << 6)
             if "texture" in routing:
                 renderingFlag = renderingFlag | (0x1 << 8)
-
-        self.use()
-        self.setInt("renderingFlag", renderingFlag, lookThroughAttribs=False)
+        return renderingFlag
 
     def use(self):
         """
@@ -456,78 +676,204 @@ void main()
         """
         if not self.ready:
             raise Exception("GLProgram must compile before use it")
-        gl.glUseProgram(self.program)
+        if GLProgram.usedProgram != self.program:
+            gl.glUseProgram(self.program)
+            GLProgram.usedProgram = self.program
+            if self.lightBuffer is not None:
+                self.lightBuffer.bind()
+        if self.lightsDirty:
+            self.uploadLights()
+
+    def uniformChanged(self, location, value):
+        """
+        Compare value with the shadow of the uniform at location and remember it.
+        Return False when GL already holds it, then the setter skips its GL call. Arrays are compared by their float32
+        bytes, since materials and lights are changed in place and the same array can hold a new value.
+        Uniforms set without the setters, like texture samplers in Texture.bind, are not shadowed.
+        """
+        if location == -1:
+            return False
+        if self.uniformShadow.get(location) == value:
+            self.uniformCallsSkipped += 1
+            return False
+        self.uniformShadow[location] = value
+        self.uniformCalls += 1
+        return True
+
+    def resetUniformCounters(self):
+        self.uniformCalls = 0
+        self.uniformCallsSkipped = 0
 
     def setLight(self, lightIndex: int, light: Light):
         if not isinstance(light, Light):
             raise TypeError("light type must be Light")
+        self.lights[lightIndex] = light
+        self.lightNum = max(self.lightNum, lightIndex + 1)
+        self.changedLights.add(lightIndex)
+        self.lightsDirty = True
 
-        self.setVec3(f"""{self.attribs["light"]}[{lightIndex}].position""", light.position, False)
-        self.setVec4(f"""{self.attribs["light"]}[{lightIndex}].color""", light.color, False)
+    def clearAllLights(self):
+        # slots from lightNum on are never read, so they are left as they are
+        self.lights = [None] * len(self.lights)
+        self.lightNum = 0
+        self.changedLights = set()
+        self.lightsDirty = True
 
-        self.setBool(f"""{self.attribs["light"]}[{lightIndex}].infiniteOn""", light.infiniteOn, False)
-        self.setVec3(f"""{self.attribs["light"]}[{lightIndex}].infiniteDirection""", light.infiniteDirection, False)
-        self.setBool(f"""{self.attribs["light"]}[{lightIndex}].spotOn""", light.spotOn, False)
-        self.setFloat(f"""{self.attribs["light"]}[{lightIndex}].spotAngleLimit""", light.spotAngleLimit, False)
-        self.setVec3(f"""{self.attribs["light"]}[{lightIndex}].spotRadialFactor""", light.spotRadialFactor, False)
-        self.setFloat(f"""{self.attribs["light"]}[{lightIndex}].spotAngularFactor""", light.spotAngularFactor, False)
-        self.setVec3(f"""{self.attribs["light"]}[{lightIndex}].spotDirection""", light.spotDirection, False)
+    def bindUniformBlock(self, blockName, binding):
+        """
+        Make a uniform block of the linked program read the buffer at a binding point
 
-    def clearAllLights(self):
-        maxLightsNum = int(self.attribs["maxLightsNum"])
-        light = Light()
-        for i in range(maxLightsNum):
-            self.setLight(i, light)
+        :return: False if the program has no such block
+        :rtype: bool
+        """
+        blockIndex = gl.glGetUniformBlockIndex(self.program, blockName)
+        if blockIndex == gl.GL_INVALID_INDEX:
+            return False
+        gl.glUniformBlockBinding(self.program, blockIndex, binding)
+        return True
+
+    def materialIndex(self, material):
+        """
+        Slot of a material in this program's table, -1 if it has to be drawn through the material uniforms
+        """
+        if self.materialTable is None:
+            return -1
+        return self.materialTable.index(material)
+
+    def setMaterial(self, material):
+        """
+        Make the following draws use a material. Only its index is set when it has a slot in the material table
+        """
+        index = self.materialIndex(material)
+        self.setInt("materialIndex", index)
+        if index < 0:
+            self.setVec4("diffuse", material.diffuse)
+            self.setVec4("specular", material.specular)
+            self.setVec4("ambient", material.ambient)
+            self.setFloat("highlight", material.highLight)
+
+    def setUpLightBlock(self):
+        """
+        Bind the light block of the linked program to LIGHT_BLOCK_BINDING, the light buffer is created on the first
+        link and keeps its content over later ones
+        """
+        if not self.bindUniformBlock(self.attribs["lightBlock"], self.LIGHT_BLOCK_BINDING):
+            return
+        if self.lightBuffer is None:
+            self.lightBuffer = UBO(self.LIGHT_BLOCK_BINDING)
+            self.lightBuffer.setBuffer(self.lightData)
+        self.lightsDirty = True
+        # the block binding changed, make the next use() attach the buffer again
+        GLProgram.usedProgram = None
+
+    def uploadLights(self):
+        """
+        Pack the lights set since the last upload. Rows which differ from the light buffer are put into it with the
+        active light count in one glBufferSubData
+        """
+        self.lightsDirty = False
+        if self.lightBuffer is None:
+            return
+        slots = sorted(i for i in self.changedLights if self.lights[i] is not None)
+        self.changedLights = set()
+        rows = self.lightData[LIGHT_HEADER_WORDS:].reshape(-1, LIGHT_WORDS)
+        changedSlots = []
+        if slots:
+            packed = packLights([self.lights[i] for i in slots])
+            # compare the bytes, bool words are integers
+            differs = np.any(packed.view(np.int32) != rows[slots].view(np.int32), axis=1)
+            changedSlots = [i for i, d in zip(slots, differs) if d]
+            rows[slots] = packed
+        header = self.lightData[0:LIGHT_HEADER_WORDS].view(np.int32)
+        headerChanged = header[0] != self.lightNum
+        header[0] = self.lightNum
+        if not changedSlots and not headerChanged:
+            return
+        first = 0 if headerChanged else LIGHT_HEADER_WORDS + changedSlots[0] * LIGHT_WORDS
+        last = LIGHT_HEADER_WORDS + (changedSlots[-1] + 1) * LIGHT_WORDS if changedSlots else LIGHT_HEADER_WORDS
+        self.lightBuffer.setSubBuffer(first * 4, self.lightData[first:last])
 
     # some help methods to set uniform in program
     def setMat4(self, name, mat, lookThroughAttribs=True):
         self.use()
         if mat.shape != (4, 4):
             raise Exception("Projection Matrix must have 4x4 shape")
-        gl.glUniformMatrix4fv(self.getUniformLocation(name, lookThroughAttribs), 1, gl.GL_FALSE, mat.flatten("C"))
+        uniformLoc = self.getUniformLocation(name, lookThroughAttribs)
+        data = np.asarray(mat, dtype=np.float32).flatten("C")
+        if self.uniformChanged(uniformLoc, data.tobytes()):
+            gl.glUniformMatrix4fv(uniformLoc, 1, gl.GL_FALSE, data)
 
     def setMat3(self, name, mat, lookThroughAttribs=True):
         self.use()
         if mat.shape != (3, 3):
             raise Exception("Projection Matrix must have 3x3 shape")
-        gl.glUniformMatrix3fv(self.getUniformLocation(name, lookThroughAttribs), 1, gl.GL_FALSE, mat.flatten("C"))
+        uniformLoc = self.getUniformLocation(name, lookThroughAttribs)
+        data = np.asarray(mat, dtype=np.float32).flatten("C")
+        if self.uniformChanged(uniformLoc, data.tobytes()):
+            gl.glUniformMatrix3fv(uniformLoc, 1, gl.GL_FALSE, data)
 
     def setMat2(self, name, mat, lookThroughAttribs=True):
         self.use()
         if mat.shape != (2, 2):
             raise Exception("Projection Matrix must have 2x2 shape")
-        gl.glUniformMatrix2fv(self.getUniformLocation(name, lookThroughAttribs), 1, gl.GL_FALSE, mat.flatten("C"))
+        uniformLoc = self.getUniformLocation(name, lookThroughAttribs)
+        data = np.asarray(mat, dtype=np.float32).flatten("C")
+        if self.uniformChanged(uniformLoc, data.tobytes()):
+            gl.glUniformMatrix2fv(uniformLoc, 1, gl.GL_FALSE, data)
 
     def setVec4(self, name, vec, lookThroughAttribs=True):
         self.use()
         if vec.size != 4:
             raise Exception("Vector must have size 4")
-        gl.glUniform4fv(self.getUniformLocation(name, lookThroughAttribs), 1, vec)
+        uniformLoc = self.getUniformLocation(name, lookThroughAttribs)
+        data = np.asarray(vec, dtype=np.float32).reshape(-1)
+        if self.uniformChanged(uniformLoc, data.tobytes()):
+            gl.glUniform4fv(uniformLoc, 1, data)
 
     def setVec3(self, name, vec, lookThroughAttribs=True):
         self.use()
         if vec.size != 3:
             raise Exception("Vector must have size 3")
-        gl.glUniform3fv(self.getUniformLocation(name, lookThroughAttribs), 1, vec)
+        uniformLoc = self.getUniformLocation(name, lookThroughAttribs)
+        data = np.asarray(vec, dtype=np.float32).reshape(-1)
+        if self.uniformChanged(uniformLoc, data.tobytes()):
+            gl.glUniform3fv(uniformLoc, 1, data)
 
     def setVec2(self, name, vec, lookThroughAttribs=True):
         self.use()
         if vec.size != 2:
             raise Exception("Vector must have size 2")
-        gl.glUniform2fv(self.getUniformLocation(name, lookThroughAttribs), 1, vec)
+        uniformLoc = self.getUniformLocation(name, lookThroughAttribs)
+        data = np.asarray(vec, dtype=np.float32).reshape(-1)
+        if self.uniformChanged(uniformLoc, data.tobytes()):
+            gl.glUniform2fv(uniformLoc, 1, data)
 
     def setBool(self, name, value, lookThroughAttribs=True):
         self.use()
         if value not in (0, 1):
             raise Exception("bool only accept True/False/0/1")
-        gl.glUniform1i(self.getUniformLocation(name, lookThroughAttribs), int(value))
+        uniformLoc = self.getUniformLocation(name, lookThroughAttribs)
+        if self.uniformChanged(uniformLoc, int(value)):
+            gl.glUniform1i(uniformLoc, int(value))
 
     def setInt(self, name, value, lookThroughAttribs=True):
         self.use()
         if value != int(value):
             raise Exception("set int only accept  integer")
-        gl.glUniform1i(self.getUniformLocation(name, lookThroughAttribs), int(value))
+        uniformLoc = self.getUniformLocation(name, lookThroughAttribs)
+        if self.uniformChanged(uniformLoc, int(value)):
+            gl.glUniform1i(uniformLoc, int(value))
+
+    def setUInt(self, name, value, lookThroughAttribs=True):
+        self.use()
+        if value != int(value) or value < 0:
+            raise Exception("set uint only accept non-negative integer")
+        uniformLoc = self.getUniformLocation(name, lookThroughAttribs)
+        if self.uniformChanged(uniformLoc, int(value)):
+            gl.glUniform1ui(uniformLoc, int(value))
 
     def setFloat(self, name, value, lookThroughAttribs=True):
         self.use()
-        gl.glUniform1f(self.getUniformLocation(name, lookThroughAttribs), float(value))
+        uniformLoc = self.getUniformLocation(name, lookThroughAttribs)
+        if self.uniformChanged(uniformLoc, float(value)):
+            gl.glUniform1f(uniformLoc, float(value))
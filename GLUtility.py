@@ -107,6 +107,23 @@ class GLUtility:
         result[3, 2] = -1
         return result.transpose() if columnMajor else result
 
+    @staticmethod
+    def normalMatrix(mat):
+        """
+        Inverse transpose of a column-major transformation matrix, or of a stack of them, in column-major order.
+        Shading transforms normals with it, a singular matrix gets its pseudo-inverse.
+
+        :param mat: matrix in shape (4, 4) or (n, 4, 4)
+        :type mat: numpy.ndarray
+        """
+        mat = np.asarray(mat, dtype=np.float64)
+        try:
+            inverse = np.linalg.inv(mat)
+        except np.linalg.LinAlgError:
+            inverse = np.linalg.pinv(mat)
+        # the storage is already transposed, so the transposed inverse is stored as the inverse's transpose
+        return np.swapaxes(inverse, -1, -2)
+
     @staticmethod
     def translate(x, y, z, columnMajor=True):
         """
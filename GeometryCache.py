@@ -0,0 +1,170 @@
+"""
+Define a process-wide cache for Displayable geometry.
+Displayables built with the same class, shape parameters, color and vertex layout share one generated mesh and one set
+of VAO, VBO and EBO, so identical shapes are only generated and uploaded once.
+Generated arrays are kept apart from GL buffers, so they can be built from any thread, while GPUMesh is only created
+on the GL thread.
+First version in 10/18/2026
+
+:author: Zack(Wanzhi Wang)
+:version: 2026.10.18
+"""
+
+import threading
+
+from GLBuffer import VAO, VBO, EBO
+
+
+class GPUMesh:
+    """
+    Generated vertices and indices of a shape, together with the GL buffers holding them.
+    Shared by all Displayables with the same cache key, refCount counts how many of them are alive.
+    """
+    key = None
+    vertices = None
+    indices = None
+
+    vao = None
+    vbo = None
+    ebo = None
+
+    refCount = 0
+    initialized = False  # set once vertices and indices are uploaded and attrib pointers are set
+
+    def __init__(self, key, vertices, indices):
+        self.key = key
+        self.vertices = vertices
+        self.indices = indices
+        self.vao = VAO()
+        self.vbo = VBO()
+        self.ebo = EBO()
+        self.refCount = 0
+        self.initialized = False
+
+    def byteSize(self):
+        return self.vertices.nbytes + self.indices.nbytes
+
+
+class GeometryCache:
+    """
+    Map from geometry key to GPUMesh. A key is (class name, shape parameters, color, vertex layout), meshes are also
+    separated by GLProgram because attrib pointers saved in VAO depend on the program's attrib locations.
+    Meshes whose refCount dropped to zero are kept for reuse until purge or clear is called.
+    """
+    meshes = None
+    geometries = None  # key -> (vertices, indices), shared by the meshes of all GLPrograms
+    hits = 0
+    misses = 0
+
+    _lock = None
+    _keyLocks = None  # key -> lock held by the thread generating that key
+
+    def __init__(self):
+        self.meshes = {}
+        self.geometries = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._keyLocks = {}
+
+    def geometry(self, key, generator):
+        """
+        Get the generated vertices and indices for key, call generator if they are not generated yet.
+        This is thread-safe and doesn't touch GL. If several threads ask for the same key, only one of them calls
+        generator and the others wait for its result.
+
+        :param key: hashable description of the geometry
+        :type key: tuple
+        :param generator: callable() -> (vertices, indices)
+        :type generator: function
+        :return: vertices and indices
+        :rtype: tuple
+        """
+        with self._lock:
+            result = self.geometries.get(key)
+            if result is not None:
+                return result
+            keyLock = self._keyLocks.setdefault(key, threading.Lock())
+        with keyLock:
+            result = self.geometries.get(key)
+            if result is None:
+                result = generator()
+                with self._lock:
+                    self.geometries[key] = result
+                    self._keyLocks.pop(key, None)
+        return result
+
+    def acquire(self, key, shaderProg, generator):
+        """
+        Get the mesh for key, generate and store it if it is not cached yet
+
+        :param key: hashable description of the geometry
+        :type key: tuple
+        :param shaderProg: the GLProgram this mesh will be drawn with, it must be in use
+        :type shaderProg: GLProgram
+        :param generator: callable() -> (vertices, indices), only called if the geometry is not generated yet
+        :type generator: function
+        :rtype: GPUMesh
+        """
+        mesh = self.meshes.get((key, shaderProg))
+        if mesh is None:
+            self.misses += 1
+            mesh = GPUMesh(key, *self.geometry(key, generator))
+            self.meshes[(key, shaderProg)] = mesh
+        else:
+            self.hits += 1
+        mesh.refCount += 1
+        return mesh
+
+    def release(self, mesh):
+        """
+        Drop one reference to mesh. The mesh stays cached, call purge to free unused meshes
+        """
+        mesh.refCount = max(0, mesh.refCount - 1)
+
+    def purge(self):
+        """
+        Delete all meshes no Displayable refers to any more, and free their GL buffers
+
+        :return: number of purged meshes
+        :rtype: int
+        """
+        unused = [k for k, m in self.meshes.items() if m.refCount == 0]
+        for k in unused:
+            mesh = self.meshes.pop(k)
+            mesh.vbo.delete()
+            mesh.ebo.delete()
+            mesh.vao.delete()
+        # drop generated arrays no mesh is built from any more. Arrays generated ahead of time have no mesh yet, keep them
+        usedKeys = {m.key for m in self.meshes.values()}
+        with self._lock:
+            for key in {k[0] for k in unused} - usedKeys:
+                self.geometries.pop(key, None)
+        return len(unused)
+
+    def clear(self):
+        """
+        Forget all cached meshes without touching GL. Used when the GL context is recreated, since buffers from the old
+        context are no longer valid. Generated arrays don't depend on the context and are kept.
+        """
+        self.meshes = {}
+
+    def stats(self):
+        """
+        :return: cache hit/miss statistics and current cache content size
+        :rtype: dict
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hits / lookups if lookups else 0.0,
+            "meshes": len(self.meshes),
+            "geometries": len(self.geometries),
+            "references": sum(m.refCount for m in self.meshes.values()),
+            "bytes": sum(v.nbytes + i.nbytes for v, i in self.geometries.values()),
+        }
+
+
+# process-wide geometry cache, shared by all Displayables
+geometryCache = GeometryCache()
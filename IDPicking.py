@@ -0,0 +1,316 @@
+"""
+Define GPU picking with an ID buffer.
+Components are drawn into a small offscreen framebuffer whose color attachment is an unsigned integer texture, with the
+Component id and the triangle id in every pixel. A pick matrix stretches the few pixels around the cursor over the whole
+framebuffer, and its frustum culls everything else, so a pick draws almost nothing. The pixels are read back into a
+pixel buffer object guarded by a fence, so the CPU never waits for the GPU, and the result is read one frame later, or
+later still if the GPU isn't done yet.
+First version in 10/18/2026
+
+:author: Zack(Wanzhi Wang)
+:version: 2026.10.18
+"""
+try:
+    import OpenGL
+
+    try:
+        import OpenGL.GL as gl
+        import OpenGL.GLU as glu
+    except ImportError:
+        from ctypes import util
+
+        orig_util_find_library = util.find_library
+
+
+        def new_util_find_library(name):
+            res = orig_util_find_library(name)
+            if res:
+                return res
+            return '/System/Library/Frameworks/' + name + '.framework/' + name
+
+
+        util.find_library = new_util_find_library
+        import OpenGL.GL as gl
+        import OpenGL.GLU as glu
+except ImportError:
+    raise ImportError("Required dependency PyOpenGL not present")
+
+import ctypes
+
+import numpy as np
+
+from Displayable import Displayable
+from Frustum import Frustum
+from GLProgram import GLProgram
+from Picking import PickResult
+
+
+class PickRequest:
+    """
+    A pick on its way through the GPU
+    """
+    x = 0
+    y = 0
+    callback = None
+    region = None  # (x, y, width, height) drawn and read back, in window coordinates
+    components = None  # Components drawn in the pass, the one with id i is components[i - 1]
+    pbo = None
+    fence = None
+
+    def __init__(self, x, y, callback):
+        self.x = x
+        self.y = y
+        self.callback = callback
+
+
+class IDPicker:
+    """
+    Pick Components by drawing their ids. Create it on the GL thread, call requestPick from input handlers, and in
+    every frame call poll before drawing and render after drawing the scene.
+    """
+    radius = 3  # pixels around the cursor drawn and read back on each side, to make thin objects easier to hit
+
+    shaderProg = None  # GLProgram writing ids
+    fbo = None
+    idTexture = None  # GL_RG32UI: Component id, 0 for background, and triangle id
+    depthBuffer = None
+
+    pending = None  # requests waiting for the next render
+    inFlight = None  # requests drawn, waiting for their readback
+    freePBOs = None
+
+    def __init__(self, sceneProg):
+        """
+        :param sceneProg: the GLProgram which the scene's VAOs are set up for. The id program reads vertex positions \
+        from the same attribute location
+        :type sceneProg: GLProgram
+        """
+        self.pending = []
+        self.inFlight = []
+        self.freePBOs = []
+
+        self.shaderProg = GLProgram()
+        self.shaderProg.compile(self.genVertexShaderSource(sceneProg.getAttribLocation("vertexPos")),
+                                self.genFragShaderSource())
+        self.fbo = gl.glGenFramebuffers(1)
+        self.idTexture = gl.glGenTextures(1)
+        self.depthBuffer = gl.glGenRenderbuffers(1)
+        self.setUpFramebuffer()
+
+    def genVertexShaderSource(self, positionLoc):
+        attribs = self.shaderProg.attribs
+        vss = f'''
+#version 330 core
+layout (location = {positionLoc}) in vec3 {attribs["vertexPos"]};
+
+uniform mat4 {attribs["projectionMat"]};
+uniform mat4 {attribs["viewMat"]};
+uniform mat4 {attribs["modelMat"]};
+
+void main()
+{{
+    gl_Position = {attribs["projectionMat"]} * {attribs["viewMat"]} * {attribs["modelMat"]} * vec4({attribs["vertexPos"]}, 1.0);
+}}
+        '''
+        return vss
+
+    def genFragShaderSource(self):
+        fss = '''
+#version 330 core
+uniform uint objectId;
+
+layout (location = 0) out uvec2 fragId;
+
+void main()
+{
+    fragId = uvec2(objectId, uint(gl_PrimitiveID));
+}
+        '''
+        return fss
+
+    def delete(self):
+        gl.glDeleteFramebuffers(1, [self.fbo])
+        gl.glDeleteTextures([self.idTexture])
+        gl.glDeleteRenderbuffers(1, [self.depthBuffer])
+        for request in self.inFlight:
+            gl.glDeleteSync(request.fence)
+            self.freePBOs.append(request.pbo)
+        if self.freePBOs:
+            gl.glDeleteBuffers(len(self.freePBOs), self.freePBOs)
+        self.pending, self.inFlight, self.freePBOs = [], [], []
+
+    def setUpFramebuffer(self):
+        side = 2 * self.radius + 1
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.idTexture)
+        gl.glTexImage2D(gl.GL_TEXTURE_2D, 0, gl.GL_RG32UI, side, side, 0, gl.GL_RG_INTEGER, gl.GL_UNSIGNED_INT, None)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_NEAREST)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_NEAREST)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, 0)
+        gl.glBindRenderbuffer(gl.GL_RENDERBUFFER, self.depthBuffer)
+        gl.glRenderbufferStorage(gl.GL_RENDERBUFFER, gl.GL_DEPTH_COMPONENT24, side, side)
+        gl.glBindRenderbuffer(gl.GL_RENDERBUFFER, 0)
+
+        previous = gl.glGetIntegerv(gl.GL_FRAMEBUFFER_BINDING)
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.fbo)
+        gl.glFramebufferTexture2D(gl.GL_FRAMEBUFFER, gl.GL_COLOR_ATTACHMENT0, gl.GL_TEXTURE_2D, self.idTexture, 0)
+        gl.glFramebufferRenderbuffer(gl.GL_FRAMEBUFFER, gl.GL_DEPTH_ATTACHMENT, gl.GL_RENDERBUFFER, self.depthBuffer)
+        status = gl.glCheckFramebufferStatus(gl.GL_FRAMEBUFFER)
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, previous)
+        if status != gl.GL_FRAMEBUFFER_COMPLETE:
+            raise Exception("ID picking framebuffer is incomplete: " + hex(status))
+
+    @staticmethod
+    def pickMatrix(region, viewport):
+        """
+        Like gluPickMatrix, the matrix which maps a region of the viewport to the whole clip space. It is in
+        column-major order and goes after the projection matrix: projectionMat @ pickMatrix(region, viewport).
+
+        :param region: (x, y, width, height) in window coordinates
+        :param viewport: (x, y, width, height) of the viewport
+        :rtype: numpy.ndarray
+        """
+        x, y, width, height = region
+        scaleX = viewport[2] / width
+        scaleY = viewport[3] / height
+        # normalized device coordinates of the region center
+        centerX = 2 * (x + width / 2 - viewport[0]) / viewport[2] - 1
+        centerY = 2 * (y + height / 2 - viewport[1]) / viewport[3] - 1
+        return np.array([[scaleX, 0, 0, 0],
+                         [0, scaleY, 0, 0],
+                         [0, 0, 1, 0],
+                         [-centerX * scaleX, -centerY * scaleY, 0, 1]])
+
+    def requestPick(self, x, y, callback):
+        """
+        Ask for a pick at a canvas point. This doesn't touch GL, so it can be called from any input handler.
+
+        :param x: canvas x coordinate
+        :type x: int
+        :param y: canvas y coordinate, from the bottom
+        :type y: int
+        :param callback: called with a PickResult, or None if nothing is there, once the readback arrives. \
+        Only component and triangle are set in the PickResult
+        :type callback: callable
+        """
+        self.pending.append(PickRequest(int(x), int(y), callback))
+
+    def render(self, root, viewMat, projectionMat):
+        """
+        Draw the ids for all pending requests and start their readback. Call it on the GL thread after the scene is
+        updated, the GL state it changes is restored.
+
+        :param root: Component tree to pick from
+        :type root: Component
+        :param viewMat: view matrix in column-major order
+        :type viewMat: numpy.ndarray
+        :param projectionMat: projection matrix in column-major order
+        :type projectionMat: numpy.ndarray
+        """
+        if not self.pending:
+            return
+        viewport = gl.glGetIntegerv(gl.GL_VIEWPORT)
+        previousFBO = gl.glGetIntegerv(gl.GL_FRAMEBUFFER_BINDING)
+        depthOn = gl.glIsEnabled(gl.GL_DEPTH_TEST)
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.fbo)
+        gl.glEnable(gl.GL_DEPTH_TEST)
+        self.shaderProg.setMat4("viewMat", viewMat)
+
+        for request in self.pending:
+            x0 = max(request.x - self.radius, viewport[0])
+            y0 = max(request.y - self.radius, viewport[1])
+            x1 = min(request.x + self.radius + 1, viewport[0] + viewport[2])
+            y1 = min(request.y + self.radius + 1, viewport[1] + viewport[3])
+            if x1 <= x0 or y1 <= y0:
+                # outside the canvas, nothing to draw
+                request.callback(None)
+                continue
+            request.region = (int(x0), int(y0), int(x1 - x0), int(y1 - y0))
+            pickProjection = projectionMat @ self.pickMatrix(request.region, viewport)
+            request.components = self.collect(root, Frustum(viewMat, pickProjection))
+
+            gl.glViewport(0, 0, request.region[2], request.region[3])
+            gl.glClearBufferuiv(gl.GL_COLOR, 0, np.zeros(4, dtype=np.uint32))
+            gl.glClearBufferfv(gl.GL_DEPTH, 0, np.ones(1, dtype=np.float32))
+            self.shaderProg.setMat4("projectionMat", pickProjection)
+            for i, c in enumerate(request.components):
+                self.shaderProg.setMat4("modelMat", c.transformationMat)
+                self.shaderProg.setUInt("objectId", i + 1, lookThroughAttribs=False)
+                c.displayObj.draw()
+
+            request.pbo = self.freePBOs.pop() if self.freePBOs else gl.glGenBuffers(1)
+            gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, request.pbo)
+            gl.glBufferData(gl.GL_PIXEL_PACK_BUFFER, (2 * self.radius + 1) ** 2 * 8, None, gl.GL_STREAM_READ)
+            gl.glReadBuffer(gl.GL_COLOR_ATTACHMENT0)
+            gl.glReadPixels(0, 0, request.region[2], request.region[3], gl.GL_RG_INTEGER, gl.GL_UNSIGNED_INT,
+                            ctypes.c_void_p(0))
+            gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+            request.fence = gl.glFenceSync(gl.GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+            self.inFlight.append(request)
+        self.pending = []
+
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, previousFBO)
+        gl.glViewport(*viewport)
+        if not depthOn:
+            gl.glDisable(gl.GL_DEPTH_TEST)
+        # commands must reach the GPU for the fences to be signaled by the next frame
+        gl.glFlush()
+
+    @staticmethod
+    def collect(root, frustum):
+        """
+        Components with a Displayable which may be inside the frustum, skipping whole subtrees outside it
+        """
+        components = []
+        stack = [root]
+        while stack:
+            c = stack.pop()
+            if c.subtreeRadius is not None and not frustum.intersectsSphere(c.subtreeCenter, c.subtreeRadius):
+                continue
+            if isinstance(c.displayObj, Displayable) and (
+                    c.boundingRadius is None or frustum.intersectsSphere(c.boundingCenter, c.boundingRadius)):
+                components.append(c)
+            stack.extend(c.children)
+        return components
+
+    def poll(self):
+        """
+        Deliver the readbacks the GPU has finished, without waiting for any. Call it on the GL thread once a frame.
+
+        :return: number of picks delivered
+        :rtype: int
+        """
+        delivered = 0
+        waiting = []
+        for request in self.inFlight:
+            status = gl.glClientWaitSync(request.fence, 0, 0)
+            if status not in (gl.GL_ALREADY_SIGNALED, gl.GL_CONDITION_SATISFIED):
+                waiting.append(request)
+                continue
+            gl.glDeleteSync(request.fence)
+            width, height = request.region[2:4]
+            gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, request.pbo)
+            data = gl.glGetBufferSubData(gl.GL_PIXEL_PACK_BUFFER, 0, width * height * 8)
+            gl.glBindBuffer(gl.GL_PIXEL_PACK_BUFFER, 0)
+            self.freePBOs.append(request.pbo)
+            ids = np.frombuffer(data, dtype=np.uint32, count=width * height * 2).reshape(height, width, 2)
+            request.callback(self.resolve(request, ids))
+            delivered += 1
+        self.inFlight = waiting
+        return delivered
+
+    def resolve(self, request, ids):
+        """
+        Turn the ids read back around the cursor into a PickResult. The pixel under the cursor wins, otherwise the
+        nearest pixel with something drawn in it.
+
+        :param ids: (height, width, 2) Component ids and triangle ids, bottom row first
+        :type ids: numpy.ndarray
+        :rtype: PickResult
+        """
+        rows, columns = np.nonzero(ids[:, :, 0])
+        if rows.size == 0:
+            return None
+        x0, y0 = request.region[0:2]
+        nearest = np.argmin((columns + x0 - request.x) ** 2 + (rows + y0 - request.y) ** 2)
+        objectId, triangle = ids[rows[nearest], columns[nearest]]
+        return PickResult(request.components[objectId - 1], int(triangle), None, None, None, None)
@@ -0,0 +1,335 @@
+"""
+Define GPU driven drawing for GL 4.3 contexts.
+The meshes of all indirectly drawn Components live in one shared VBO/EBO arena. Their model matrices, material indices
+and routings live in a shader storage buffer, their materials in the GLProgram's material table, and the whole set is
+drawn with one glMultiDrawElementsIndirect call. Per frame work is a fixed number of vectorized numpy steps and GL calls, whatever
+the number of objects.
+First version in 10/18/2026
+
+:author: Zack(Wanzhi Wang)
+:version: 2026.10.18
+"""
+try:
+    import OpenGL
+
+    try:
+        import OpenGL.GL as gl
+        import OpenGL.GLU as glu
+    except ImportError:
+        from ctypes import util
+
+        orig_util_find_library = util.find_library
+
+
+        def new_util_find_library(name):
+            res = orig_util_find_library(name)
+            if res:
+                return res
+            return '/System/Library/Frameworks/' + name + '.framework/' + name
+
+
+        util.find_library = new_util_find_library
+        import OpenGL.GL as gl
+        import OpenGL.GLU as glu
+except ImportError:
+    raise ImportError("Required dependency PyOpenGL not present")
+
+import ctypes
+
+import numpy as np
+
+import ParametricSurface
+from Displayable import Displayable
+from GLBuffer import VAO, VBO, EBO, COMPACT_COLOR_VERTEX_FORMAT
+from GLProgram import GLProgram
+
+# std430 layout in 4 bytes words. DrawData: mat4 model, int materialIndex, int renderingFlag, padded to 16 bytes
+DRAW_DATA_WORDS = 20
+
+
+class MeshArena:
+    """
+    Triangle lists of many meshes in one VBO and one EBO. A mesh's indices are kept local to it, and draw commands
+    add its baseVertex, so the index type only needs to address the largest mesh.
+    """
+    slots = None  # meshKey -> (firstIndex, indexNum, baseVertex, local bounding center, local bounding radius)
+    vertexParts = None
+    indexParts = None
+    vertexNum = 0
+    indexNum = 0
+    maxMeshVertexNum = 0
+    dirty = False  # meshes were added since the last upload
+
+    vao = None
+    vbo = None
+    ebo = None
+    drawIdVBO = None
+    drawIdNum = 0  # draw ids the drawIdVBO holds
+
+    def __init__(self):
+        self.slots = {}
+        self.vertexParts = []
+        self.indexParts = []
+        self.vertexNum = 0
+        self.indexNum = 0
+        self.maxMeshVertexNum = 0
+        self.dirty = False
+        self.drawIdNum = 0
+
+    def slot(self, displayable):
+        """
+        Find or add a Displayable's mesh
+
+        :type displayable: Displayable
+        :return: firstIndex, indexNum, baseVertex, local bounding center and radius
+        :rtype: tuple
+        """
+        result = self.slots.get(displayable.meshKey)
+        if result is not None:
+            return result
+        vertices = displayable.vertices
+        if displayable.triangleStrips:
+            indices = ParametricSurface.stripsToTriangles(displayable.indices).reshape(-1)
+        else:
+            indices = np.asarray(displayable.indices).reshape(-1)
+        center, radius, _, _ = displayable.localBounds()
+        result = (self.indexNum, indices.size, self.vertexNum, center, radius)
+        self.slots[displayable.meshKey] = result
+        self.vertexParts.append(vertices)
+        self.indexParts.append(indices)
+        self.vertexNum += vertices.shape[0]
+        self.indexNum += indices.size
+        self.maxMeshVertexNum = max(self.maxMeshVertexNum, vertices.shape[0])
+        self.dirty = True
+        return result
+
+    def upload(self, shaderProg, drawIdNum):
+        """
+        Upload the meshes if new ones were added, and make sure there are drawIdNum draw ids.
+        Must be called on the GL thread.
+        """
+        if self.vao is None:
+            self.vao = VAO()
+            self.vbo = VBO()
+            self.ebo = EBO()
+            self.drawIdVBO = gl.glGenBuffers(1)
+        if not self.dirty and drawIdNum <= self.drawIdNum:
+            return
+        vertices = np.concatenate(self.vertexParts)
+        self.vao.bind()
+        # meshes of different colors share the buffer, so color is stored per vertex
+        self.vbo.setFormattedBuffer(vertices, COMPACT_COLOR_VERTEX_FORMAT)
+        self.ebo.setBuffer(np.concatenate(self.indexParts), self.maxMeshVertexNum)
+        COMPACT_COLOR_VERTEX_FORMAT.setAttribPointers(shaderProg, self.vbo, self.vao, vertices)
+        # one instance per draw command, offset by the command's baseInstance, so instance attributes give the
+        # draw index
+        drawIds = np.arange(max(drawIdNum, self.drawIdNum), dtype=np.uint32)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.drawIdVBO)
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, drawIds.nbytes, drawIds, gl.GL_STATIC_DRAW)
+        drawIdLoc = shaderProg.getAttribLocation("drawId")
+        if drawIdLoc >= 0:
+            gl.glVertexAttribIPointer(drawIdLoc, 1, gl.GL_UNSIGNED_INT, 4, ctypes.c_void_p(0))
+            gl.glVertexAttribDivisor(drawIdLoc, 1)
+            gl.glEnableVertexAttribArray(drawIdLoc)
+        self.vao.unbind()
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+        self.drawIdNum = drawIds.size
+        self.dirty = False
+
+    def delete(self):
+        if self.vao is not None:
+            self.vao.delete()
+            self.vbo.delete()
+            self.ebo.delete()
+            gl.glDeleteBuffers(1, [self.drawIdVBO])
+            self.vao = self.vbo = self.ebo = self.drawIdVBO = None
+        self.drawIdNum = 0
+
+
+class IndirectRenderer:
+    """
+    Draw the untextured Components of a tree with one multi draw indirect call.
+    Components report transformation, material and routing changes through markChanged, and only the range of
+    changed rows is uploaded. Members bound to a FlatSceneGraph are read from its world matrices in one gather.
+    Frustum culling is a vectorized sphere test over all objects, which selects the draw commands to submit.
+    """
+    components = None  # list<Component>, row i of every array below belongs to components[i]
+    active = None  # bool (n,), False for components which left, they are drawn on their own
+    drawData = None  # float32 (n, DRAW_DATA_WORDS), the shader storage layout
+    commands = None  # uint32 (n, 5): indexNum, instanceNum, firstIndex, baseVertex, baseInstance
+    localCenters = None  # (n, 3) mesh bounding sphere centers
+    localRadii = None  # (n,)
+    graphRows = None  # FlatSceneGraph -> (rows, node indices) of the components bound to it
+    changedMin = None  # range of drawData rows to upload, None when nothing changed
+    changedMax = None
+
+    arena = None
+    drawDataBuffer = None
+    commandBuffer = None
+    drawDataNum = 0  # rows the drawDataBuffer has room for
+
+    def __init__(self):
+        self.components = []
+        self.graphRows = {}
+        self.arena = MeshArena()
+        self.drawDataNum = 0
+
+    @staticmethod
+    def supported():
+        return GLProgram.supportsIndirectDraw()
+
+    def build(self, root):
+        """
+        Take every untextured Displayable of a tree which is not instanced or baked, and whose material has a slot in
+        the material table. Call it after root is initialized and updated.
+
+        :type root: Component
+        :return: number of indirectly drawn components
+        :rtype: int
+        """
+        self.clear()
+        stack = [root]
+        while stack:
+            c = stack.pop()
+            stack.extend(reversed(c.children))
+            if isinstance(c.displayObj, Displayable) and c.instanceGroup is None and c.staticBatch is None and \
+                    not c.textureOn and c.displayObj.shaderProg.materialIndex(c.material) >= 0:
+                self.components.append(c)
+
+        n = len(self.components)
+        self.active = np.ones(n, dtype=bool)
+        self.drawData = np.zeros((n, DRAW_DATA_WORDS), dtype=np.float32)
+        self.commands = np.zeros((n, 5), dtype=np.uint32)
+        self.localCenters = np.zeros((n, 3))
+        self.localRadii = np.zeros(n)
+        graphRows = {}
+        for i, c in enumerate(self.components):
+            c.indirectRenderer = self
+            c.drawIndex = i
+            firstIndex, indexNum, baseVertex, center, radius = self.arena.slot(c.displayObj)
+            self.commands[i] = (indexNum, 1, firstIndex, baseVertex, i)
+            self.localCenters[i] = center
+            self.localRadii[i] = radius
+            self.fillRow(i)
+            if c.sceneGraph is not None:
+                graphRows.setdefault(c.sceneGraph, ([], []))
+                graphRows[c.sceneGraph][0].append(i)
+                graphRows[c.sceneGraph][1].append(c.nodeIndex)
+        self.graphRows = {g: (np.array(rows), np.array(nodes)) for g, (rows, nodes) in graphRows.items()}
+        self.changedMin, self.changedMax = (0, n - 1) if n else (None, None)
+        return n
+
+    def clear(self):
+        for c in self.components:
+            c.indirectRenderer = None
+            c.drawIndex = None
+        self.components = []
+        self.graphRows = {}
+        self.changedMin = self.changedMax = None
+        self.arena.delete()
+        self.arena = MeshArena()
+
+    def fillRow(self, i):
+        c = self.components[i]
+        # matrices are stored in column-major order, so rows of transformationMat are the columns GL expects
+        self.drawData[i, 0:16] = np.asarray(c.transformationMat).ravel()
+        ints = self.drawData[i].view(np.int32)
+        ints[16] = c.displayObj.shaderProg.materialIndex(c.material)
+        ints[17] = GLProgram.routingFlag(c.renderingRouting)
+
+    def markChanged(self, component):
+        """
+        Take the new transformation, material and routing of a component, they are uploaded before the next draw.
+        A component whose new material has no slot in the material table is drawn on its own from now on
+        """
+        i = component.drawIndex
+        self.fillRow(i)
+        if self.drawData[i].view(np.int32)[16] < 0:
+            self.remove(component)
+            return
+        self.changedMin = i if self.changedMin is None else min(self.changedMin, i)
+        self.changedMax = i if self.changedMax is None else max(self.changedMax, i)
+
+    def remove(self, component):
+        """
+        Stop drawing a component here, it is drawn on its own from now on
+        """
+        self.active[component.drawIndex] = False
+        component.indirectRenderer = None
+        component.drawIndex = None
+
+    def sync(self):
+        """
+        Gather the world matrices of components bound to a FlatSceneGraph, which change without Component.update
+        """
+        for graph, (rows, nodes) in self.graphRows.items():
+            mats = graph.worldMats[nodes].reshape(-1, 16)
+            changed = np.flatnonzero(np.any(self.drawData[rows, 0:16] != mats, axis=1))
+            if changed.size:
+                self.drawData[rows[changed], 0:16] = mats[changed]
+                low, high = int(rows[changed].min()), int(rows[changed].max())
+                self.changedMin = low if self.changedMin is None else min(self.changedMin, low)
+                self.changedMax = high if self.changedMax is None else max(self.changedMax, high)
+
+    def upload(self, shaderProg):
+        self.arena.upload(shaderProg, len(self.components))
+        if self.drawDataBuffer is None:
+            self.drawDataBuffer, self.commandBuffer = gl.glGenBuffers(2)
+
+        if self.changedMin is not None:
+            gl.glBindBuffer(gl.GL_SHADER_STORAGE_BUFFER, self.drawDataBuffer)
+            if self.drawDataNum < len(self.components):
+                gl.glBufferData(gl.GL_SHADER_STORAGE_BUFFER, self.drawData.nbytes, self.drawData, gl.GL_DYNAMIC_DRAW)
+                self.drawDataNum = len(self.components)
+            else:
+                rows = self.drawData[self.changedMin:self.changedMax + 1]
+                gl.glBufferSubData(gl.GL_SHADER_STORAGE_BUFFER, self.changedMin * DRAW_DATA_WORDS * 4, rows.nbytes,
+                                   rows)
+            self.changedMin = self.changedMax = None
+            gl.glBindBuffer(gl.GL_SHADER_STORAGE_BUFFER, 0)
+
+    def visible(self, frustum):
+        """
+        :return: rows of the active components whose world bounding spheres may be inside the frustum
+        :rtype: numpy.ndarray
+        """
+        if frustum is None:
+            return np.flatnonzero(self.active)
+        mats = self.drawData[:, 0:16].reshape(-1, 4, 4)
+        centers = np.einsum("ni,nij->nj", self.localCenters, mats[:, 0:3, 0:3]) + mats[:, 3, 0:3]
+        scales = np.sqrt(np.max(np.sum(mats[:, 0:3, 0:3] ** 2, axis=2), axis=1))
+        return np.flatnonzero(self.active & frustum.spheresVisible(centers, self.localRadii * scales))
+
+    def draw(self, shaderProg, frustum=None, stats=None):
+        """
+        Draw all visible components with one call. Component traversal skips them, so call this after it.
+        """
+        if not self.components:
+            return
+        self.sync()
+        self.upload(shaderProg)
+        rows = self.visible(frustum)
+        if stats is not None:
+            stats["drawn"] += rows.size
+            stats["culled"] += int(np.count_nonzero(self.active)) - rows.size
+        if rows.size == 0:
+            return
+
+        commands = self.commands[rows]
+        gl.glBindBuffer(gl.GL_DRAW_INDIRECT_BUFFER, self.commandBuffer)
+        gl.glBufferData(gl.GL_DRAW_INDIRECT_BUFFER, commands.nbytes, commands, gl.GL_STREAM_DRAW)
+        gl.glBindBufferBase(gl.GL_SHADER_STORAGE_BUFFER, GLProgram.DRAW_DATA_BINDING, self.drawDataBuffer)
+        self.components[0].texture.unbind(shaderProg.getUniformLocation("textureImage"))
+        shaderProg.setBool("indirect", True)
+        self.arena.vao.bind()
+        gl.glMultiDrawElementsIndirect(gl.GL_TRIANGLES, self.arena.ebo.indexType, ctypes.c_void_p(0), rows.size, 0)
+        self.arena.vao.unbind()
+        shaderProg.setBool("indirect", False)
+        gl.glBindBuffer(gl.GL_DRAW_INDIRECT_BUFFER, 0)
+
+    def delete(self):
+        self.clear()
+        if self.drawDataBuffer is not None:
+            gl.glDeleteBuffers(2, [self.drawDataBuffer, self.commandBuffer])
+            self.drawDataBuffer = self.commandBuffer = None
+        self.drawDataNum = 0
@@ -0,0 +1,277 @@
+"""
+Define instanced rendering for Components which share a Displayable's mesh.
+Components with the same mesh, GLProgram and rendering routing are grouped, and each group is drawn with one
+glDrawElementsInstanced call. Model matrices and material table indices live in a per instance attribute buffer, which
+is only uploaded again for the members that changed.
+First version in 10/18/2026
+
+:author: Zack(Wanzhi Wang)
+:version: 2026.10.18
+"""
+try:
+    import OpenGL
+
+    try:
+        import OpenGL.GL as gl
+        import OpenGL.GLU as glu
+    except ImportError:
+        from ctypes import util
+
+        orig_util_find_library = util.find_library
+
+
+        def new_util_find_library(name):
+            res = orig_util_find_library(name)
+            if res:
+                return res
+            return '/System/Library/Frameworks/' + name + '.framework/' + name
+
+
+        util.find_library = new_util_find_library
+        import OpenGL.GL as gl
+        import OpenGL.GLU as glu
+except ImportError:
+    raise ImportError("Required dependency PyOpenGL not present")
+
+import ctypes
+
+import numpy as np
+
+from Displayable import Displayable
+from GLBuffer import VAO
+
+# per instance attribute layout in 4 byte words: model matrix in floats, material index as an integer
+INSTANCE_ATTRIBS = (("instanceModelMat", 0, 16), ("instanceMaterialIndex", 16, 1))
+INSTANCE_FLOATS = 17
+
+
+class InstanceGroup:
+    """
+    Components drawn together with one instanced draw call. Members tell the group about their changes through
+    markChanged, and only the rows between the first and the last changed member are uploaded.
+    """
+    members = None  # list<Component>
+    displayObj = None  # Displayable of the first member, all members share its mesh
+    renderingRouting = None
+
+    data = None  # (memberNum, INSTANCE_FLOATS) float32
+    vao = None
+    instanceVBO = None
+    bufferSize = 0  # instances the GL buffer has room for
+    changedMin = None  # range of member rows to upload, None when nothing changed
+    changedMax = None
+    graphRows = None  # FlatSceneGraph -> (member rows, node indices) of the members bound to it
+
+    def __init__(self, members):
+        self.members = list(members)
+        self.displayObj = self.members[0].displayObj
+        self.renderingRouting = self.members[0].renderingRouting
+        self.data = np.zeros((len(self.members), INSTANCE_FLOATS), dtype=np.float32)
+        self.bufferSize = 0
+        for i, c in enumerate(self.members):
+            c.instanceGroup = self
+            c.instanceIndex = i
+            self.fillRow(i)
+        self.findGraphRows()
+        self.changedMin, self.changedMax = 0, len(self.members) - 1
+
+    @staticmethod
+    def instanceRow(component):
+        row = np.empty(INSTANCE_FLOATS, dtype=np.float32)
+        # matrices are stored in column-major order, so rows of transformationMat are the columns GL expects
+        row[0:16] = np.asarray(component.transformationMat).ravel()
+        row[16:17].view(np.int32)[0] = component.displayObj.shaderProg.materialIndex(component.material)
+        return row
+
+    def fillRow(self, i):
+        self.data[i] = self.instanceRow(self.members[i])
+
+    def findGraphRows(self):
+        graphRows = {}
+        for i, c in enumerate(self.members):
+            if c.sceneGraph is not None:
+                graphRows.setdefault(c.sceneGraph, ([], []))
+                graphRows[c.sceneGraph][0].append(i)
+                graphRows[c.sceneGraph][1].append(c.nodeIndex)
+        self.graphRows = {g: (np.array(rows), np.array(nodes)) for g, (rows, nodes) in graphRows.items()}
+
+    def markChanged(self, component):
+        """
+        Take the new transformation and material of a member, they are uploaded before the next draw. A member whose
+        new material has no slot in the material table leaves the group
+        """
+        i = component.instanceIndex
+        self.fillRow(i)
+        if self.data[i, 16:17].view(np.int32)[0] < 0:
+            self.remove(component)
+            return
+        self.changedMin = i if self.changedMin is None else min(self.changedMin, i)
+        self.changedMax = i if self.changedMax is None else max(self.changedMax, i)
+
+    def remove(self, component):
+        """
+        Take a member out of this group, it is drawn on its own from now on
+        """
+        i = component.instanceIndex
+        self.members.pop(i)
+        self.data = np.delete(self.data, i, axis=0)
+        component.instanceGroup = None
+        component.instanceIndex = None
+        for k in range(i, len(self.members)):
+            self.members[k].instanceIndex = k
+        if self.graphRows:
+            self.findGraphRows()
+        if i < len(self.members):
+            self.changedMin = i if self.changedMin is None else min(self.changedMin, i)
+            self.changedMax = len(self.members) - 1
+
+    def dissolve(self):
+        for c in self.members:
+            c.instanceGroup = None
+            c.instanceIndex = None
+        self.members = []
+        self.graphRows = {}
+        self.delete()
+
+    def setUp(self, shaderProg):
+        """
+        Create a VAO reading vertices from the shared mesh and instance data from this group's buffer.
+        Must be called on the GL thread after the mesh is initialized.
+        """
+        mesh = self.displayObj.mesh
+        self.vao = VAO()
+        self.instanceVBO = gl.glGenBuffers(1)
+        self.vao.bind()
+        self.displayObj.vertexFormat.setAttribPointers(shaderProg, mesh.vbo, self.vao, mesh.vertices)
+        mesh.ebo.bind()
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.instanceVBO)
+        stride = INSTANCE_FLOATS * 4
+        for name, offset, size in INSTANCE_ATTRIBS:
+            attribLoc = shaderProg.getAttribLocation(name)
+            if attribLoc < 0:
+                continue
+            if name == "instanceMaterialIndex":
+                gl.glVertexAttribIPointer(attribLoc, 1, gl.GL_INT, stride, ctypes.c_void_p(offset * 4))
+                gl.glVertexAttribDivisor(attribLoc, 1)
+                gl.glEnableVertexAttribArray(attribLoc)
+                continue
+            # a mat4 attribute takes four consecutive locations, one per column
+            for column in range((size + 3) // 4):
+                loc = attribLoc + column
+                gl.glVertexAttribPointer(loc, min(size, 4), gl.GL_FLOAT, gl.GL_FALSE, stride,
+                                         ctypes.c_void_p((offset + 4 * column) * 4))
+                gl.glVertexAttribDivisor(loc, 1)
+                gl.glEnableVertexAttribArray(loc)
+        self.vao.unbind()
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+
+    def upload(self):
+        if self.changedMin is None:
+            return
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.instanceVBO)
+        if self.bufferSize < len(self.members):
+            gl.glBufferData(gl.GL_ARRAY_BUFFER, self.data.nbytes, self.data, gl.GL_DYNAMIC_DRAW)
+            self.bufferSize = len(self.members)
+        else:
+            rows = self.data[self.changedMin:self.changedMax + 1]
+            gl.glBufferSubData(gl.GL_ARRAY_BUFFER, self.changedMin * INSTANCE_FLOATS * 4, rows.nbytes, rows)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+        self.changedMin, self.changedMax = None, None
+
+    def sync(self):
+        """
+        Gather the world matrices of members bound to a FlatSceneGraph, which change without Component.update. Every
+        other change is reported through markChanged, and material colors changed in place are picked up by the
+        material table
+        """
+        for graph, (rows, nodes) in self.graphRows.items():
+            mats = graph.worldMats[nodes].reshape(-1, 16)
+            changed = np.flatnonzero(np.any(self.data[rows, 0:16] != mats, axis=1))
+            if changed.size:
+                self.data[rows[changed], 0:16] = mats[changed]
+                low, high = int(rows[changed].min()), int(rows[changed].max())
+                self.changedMin = low if self.changedMin is None else min(self.changedMin, low)
+                self.changedMax = high if self.changedMax is None else max(self.changedMax, high)
+
+    def draw(self, shaderProg, stats=None):
+        if not self.members:
+            return
+        if self.vao is None:
+            self.setUp(shaderProg)
+        self.sync()
+        self.upload()
+        shaderProg.setFragmentShaderRouting(self.renderingRouting)
+        first = self.members[0]
+        if first.textureOn:
+            first.texture.bind(shaderProg.getUniformLocation("textureImage"))
+        else:
+            first.texture.unbind(shaderProg.getUniformLocation("textureImage"))
+        shaderProg.setBool("instancing", True)
+        self.vao.bind()
+        self.displayObj.mesh.ebo.draw(len(self.members))
+        self.vao.unbind()
+        shaderProg.setBool("instancing", False)
+        if stats is not None:
+            stats["drawn"] += len(self.members)
+
+    def delete(self):
+        if self.vao is not None:
+            self.vao.delete()
+            gl.glDeleteBuffers(1, [self.instanceVBO])
+            self.vao = None
+            self.instanceVBO = None
+
+
+class InstanceRenderer:
+    """
+    Find instance groups in a Component tree and draw them.
+    Components with instanceKey None are grouped automatically when at least minInstances of them share a mesh,
+    Components with the same other instanceKey are always grouped, and instanceKey False opts a Component out.
+    Textured Components are only grouped when declared, with the texture of the first member. Components baked into a
+    static batch are left to it.
+    """
+    minInstances = 4
+    groups = None
+
+    def __init__(self):
+        self.groups = []
+
+    def build(self, root):
+        """
+        Regroup after the tree has changed. Call it after root is initialized and updated.
+
+        :type root: Component
+        :return: number of groups
+        :rtype: int
+        """
+        self.clear()
+        candidates = {}
+        stack = [root]
+        while stack:
+            c = stack.pop()
+            stack.extend(reversed(c.children))
+            if not isinstance(c.displayObj, Displayable) or c.instanceKey is False or c.staticBatch is not None:
+                continue
+            if c.instanceKey is None and c.textureOn:
+                continue
+            if c.displayObj.shaderProg.materialIndex(c.material) < 0:
+                # no room in the material table, the material has to be set with uniforms
+                continue
+            key = (c.instanceKey, c.displayObj.meshKey, c.displayObj.shaderProg, c.renderingRouting)
+            candidates.setdefault(key, []).append(c)
+        for key, members in candidates.items():
+            if key[0] is not None or len(members) >= self.minInstances:
+                self.groups.append(InstanceGroup(members))
+        return len(self.groups)
+
+    def clear(self):
+        for g in self.groups:
+            g.dissolve()
+        self.groups = []
+
+    def draw(self, shaderProg, stats=None):
+        """
+        Draw every group with one draw call each. Component.draw skips the members, so call this after it.
+        """
+        for g in self.groups:
+            g.draw(shaderProg, stats)
@@ -0,0 +1,99 @@
+"""
+Define the material table shared by all draws of a GLProgram.
+Every Material instance drawn gets a slot in a std140 uniform buffer, draws pass only the slot index: a uniform for
+single draws, an instance attribute for instanced draws and the draw data for indirect draws. Scenes change material
+colors in place, sync compares the table once per frame and uploads the rows which changed with one call.
+First version in 10/18/2026
+
+:author: Zack(Wanzhi Wang)
+:version: 2026.10.18
+"""
+
+import numpy as np
+
+from GLBuffer import UBO
+
+# std140 layout of one Material in 4 byte words: ambient, diffuse, specular, highlight padded to 16 bytes
+MATERIAL_WORDS = 16
+
+
+class MaterialTable:
+    """
+    Registry of Material instances and their slots in the material buffer. Materials are told apart by identity, two
+    equal Materials get two slots, because a scene may change one of them later.
+    A Material which comes when all slots are taken gets index -1, it is drawn through the material uniforms.
+    """
+    capacity = 0
+    materials = None  # list<Material>, indexed by slot
+    indices = None  # id(Material) -> slot
+    data = None  # float32 (capacity, MATERIAL_WORDS), CPU copy of the buffer
+    buffer = None  # UBO
+
+    def __init__(self, capacity, binding):
+        self.capacity = capacity
+        self.materials = []
+        self.indices = {}
+        self.data = np.zeros((capacity, MATERIAL_WORDS), dtype=np.float32)
+        self.buffer = UBO(binding)
+        self.buffer.setBuffer(self.data)
+
+    @staticmethod
+    def materialRow(material):
+        row = np.zeros(MATERIAL_WORDS, dtype=np.float32)
+        row[0:4] = material.ambient
+        row[4:8] = material.diffuse
+        row[8:12] = material.specular
+        row[12] = material.highLight
+        return row
+
+    def index(self, material):
+        """
+        Slot of a material, a new material is put into the table and uploaded right away
+
+        :type material: Material
+        :return: slot, or -1 if the table is full
+        :rtype: int
+        """
+        slot = self.indices.get(id(material))
+        if slot is not None:
+            return slot
+        if len(self.materials) >= self.capacity:
+            return -1
+        slot = len(self.materials)
+        # keep the Material, so its id is not reused while it has a slot
+        self.materials.append(material)
+        self.indices[id(material)] = slot
+        self.data[slot] = self.materialRow(material)
+        self.buffer.setSubBuffer(slot * MATERIAL_WORDS * 4, self.data[slot])
+        return slot
+
+    def sync(self):
+        """
+        Find materials changed in place since the last call and upload the range of their rows.
+        Call it once per frame before drawing.
+
+        :return: number of materials which changed
+        :rtype: int
+        """
+        n = len(self.materials)
+        if not n:
+            return 0
+        rows = np.array([self.materialRow(m) for m in self.materials])
+        changed = np.flatnonzero(np.any(rows != self.data[0:n], axis=1))
+        if changed.size:
+            first, last = int(changed[0]), int(changed[-1]) + 1
+            self.data[first:last] = rows[first:last]
+            self.buffer.setSubBuffer(first * MATERIAL_WORDS * 4, self.data[first:last])
+        # other code may have used the binding point
+        self.buffer.bind()
+        return int(changed.size)
+
+    def clear(self):
+        """
+        Free all slots, indices handed out before are invalid afterwards
+        """
+        self.materials = []
+        self.indices = {}
+
+    def delete(self):
+        self.buffer.delete()
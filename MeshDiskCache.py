@@ -0,0 +1,201 @@
+"""
+Define a persistent on-disk cache for generated mesh arrays.
+Vertices are stored as float32 and indices as int32 in .npy files, so they can be memory-mapped back with np.load and
+handed to VBO.setBuffer/EBO.setBuffer without any conversion copy. Entries are keyed by a hash of the generator
+parameters and the generator code version, and the cache directory is kept under a size limit by LRU eviction.
+First version in 10/18/2026
+
+:author: Zack(Wanzhi Wang)
+:version: 2026.10.18
+"""
+
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+
+class MeshDiskCache:
+    """
+    Store and load (vertices, indices) pairs in a cache directory.
+    Every entry is two files: <hash>.vertices.npy and <hash>.indices.npy. The file modification time is refreshed when
+    an entry is loaded, and it is used as the last access time for LRU eviction.
+    """
+    directory = None
+    maxBytes = 0
+    minVertices = 0  # meshes with fewer vertices are cheaper to generate than to load, don't store them
+    enabled = True
+
+    hits = 0
+    misses = 0
+    _versions = None  # code version of every hashed source file tuple
+
+    formatVersion = 1  # bump this when the file layout changes
+
+    def __init__(self, directory=None, maxBytes=512 * 1024 * 1024, minVertices=16384):
+        if directory is None:
+            directory = os.environ.get("MESH_CACHE_DIR",
+                                       os.path.join(os.path.expanduser("~"), ".cache", "BUCS", "meshes"))
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.minVertices = minVertices
+        self.enabled = os.environ.get("MESH_CACHE_DISABLE", "") == ""
+        self.hits = 0
+        self.misses = 0
+        self._versions = {}
+
+    def codeVersion(self, *sourceFiles):
+        """
+        Hash the source files which generate a mesh. Any edit to them gives a new version and invalidates old entries.
+        Hashes are remembered per process, since source files don't change while running.
+
+        :param sourceFiles: paths of the python files the generator depends on
+        :rtype: str
+        """
+        if sourceFiles not in self._versions:
+            h = hashlib.sha1(str(self.formatVersion).encode())
+            for path in sourceFiles:
+                with open(path, "rb") as f:
+                    h.update(f.read())
+            self._versions[sourceFiles] = h.hexdigest()
+        return self._versions[sourceFiles]
+
+    def entryName(self, key, codeVersion):
+        """
+        :param key: hashable description of the generator parameters, its repr must be stable across runs
+        :param codeVersion: generator code version, see codeVersion
+        :return: file name prefix of this entry
+        :rtype: str
+        """
+        return hashlib.sha1(repr((key, codeVersion)).encode()).hexdigest()
+
+    def _paths(self, name):
+        return (os.path.join(self.directory, name + ".vertices.npy"),
+                os.path.join(self.directory, name + ".indices.npy"))
+
+    def load(self, key, codeVersion):
+        """
+        Memory-map a cached entry. The returned arrays are read-only.
+
+        :return: (vertices, indices) or None if the entry doesn't exist
+        :rtype: tuple
+        """
+        verticesPath, indicesPath = self._paths(self.entryName(key, codeVersion))
+        try:
+            vertices = np.load(verticesPath, mmap_mode="r")
+            indices = np.load(indicesPath, mmap_mode="r")
+            os.utime(verticesPath)
+            os.utime(indicesPath)
+        except (OSError, ValueError):
+            return None
+        return vertices, indices
+
+    def store(self, key, codeVersion, vertices, indices):
+        """
+        Save an entry, then evict least recently used entries if the cache grows over maxBytes.
+        Files are written under a temporary name and renamed, so concurrent processes never read half-written files.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        name = self.entryName(key, codeVersion)
+        for path, array in zip(self._paths(name),
+                               (np.ascontiguousarray(vertices, dtype=np.float32),
+                                np.ascontiguousarray(indices, dtype=np.int32))):
+            fd, tmpPath = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    np.save(f, array)
+                os.replace(tmpPath, path)
+            except OSError:
+                if os.path.exists(tmpPath):
+                    os.remove(tmpPath)
+                raise
+        self.evict(keep=name)
+
+    def fetch(self, key, codeVersion, generator):
+        """
+        Load an entry from disk, or call generator and store its result.
+        A stored entry is returned as it is loaded on a hit, read-only float32 vertices and int32 indices, so callers
+        get the same arrays whether this run generated the mesh or an earlier one did.
+
+        :param generator: callable() -> (vertices, indices)
+        :return: vertices and indices
+        :rtype: tuple
+        """
+        if not self.enabled:
+            return generator()
+        result = self.load(key, codeVersion)
+        if result is not None:
+            self.hits += 1
+            return result
+        self.misses += 1
+        vertices, indices = generator()
+        if vertices.shape[0] < self.minVertices:
+            return vertices, indices
+        try:
+            self.store(key, codeVersion, vertices, indices)
+            result = self.load(key, codeVersion)
+        except OSError as e:
+            print("Warning: Cannot write mesh cache entry. ", e)
+        if result is None:
+            # not stored, convert like store does
+            result = (np.ascontiguousarray(vertices, dtype=np.float32), np.ascontiguousarray(indices, dtype=np.int32))
+            for array in result:
+                array.flags.writeable = False
+        return result
+
+    def entries(self):
+        """
+        :return: list of (last access time, total bytes, entry name) for every complete entry
+        :rtype: list
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        result = []
+        for fileName in os.listdir(self.directory):
+            if not fileName.endswith(".vertices.npy"):
+                continue
+            name = fileName[:-len(".vertices.npy")]
+            try:
+                stats = [os.stat(p) for p in self._paths(name)]
+            except OSError:
+                continue
+            result.append((min(s.st_mtime for s in stats), sum(s.st_size for s in stats), name))
+        return result
+
+    def evict(self, keep=None):
+        """
+        Remove least recently used entries until the cache is within maxBytes
+
+        :param keep: entry name which should never be evicted, normally the one just stored
+        :return: number of removed entries
+        :rtype: int
+        """
+        entries = sorted(self.entries())
+        total = sum(e[1] for e in entries)
+        removed = 0
+        for _, size, name in entries:
+            if total <= self.maxBytes:
+                break
+            if name == keep:
+                continue
+            for path in self._paths(name):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        for _, _, name in self.entries():
+            for path in self._paths(name):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+# process-wide disk cache, used by Displayable when a generated mesh misses the in-memory geometry cache
+meshDiskCache = MeshDiskCache()
@@ -0,0 +1,177 @@
+"""
+Define vectorized help functions to build meshes for parametric surfaces.
+A parametric surface is sampled on a regular (u, v) grid, rows follow u and columns follow v. All positions, normals,
+and texture coordinates are evaluated in a single NumPy pass, and the triangle indices are emitted in bulk.
+First version in 10/18/2026
+
+:author: Zack(Wanzhi Wang)
+:version: 2026.10.18
+"""
+
+import numpy as np
+
+
+def evaluateGrid(u, v, surface, color, texCoords=None):
+    """
+    Sample a parametric surface over the grid spanned by u and v, and pack the result into the Displayable vertex
+    layout. The returned vertices are stored row by row, so vertex (i, j) is at index i * len(v) + j.
+
+    Column | 0:3                | 3:6           | 6:9          | 9:11
+    Stores | Vertex coordinates | Vertex normal | Vertex Color | Vertex texture Coordinates
+
+    :param u: parameter values along the grid rows
+    :type u: numpy.ndarray
+    :param v: parameter values along the grid columns
+    :type v: numpy.ndarray
+    :param surface: callable(U, V) -> (position, normal). U has shape (rows, 1) and V has shape (1, cols), \
+    position and normal are sequences of 3 arrays broadcastable to (rows, cols). Normals don't need to be normalized
+    :type surface: function
+    :param color: vertex color shared by the whole surface
+    :type color: ColorType
+    :param texCoords: (s, t) arrays broadcastable to (rows, cols). If not given, texture coordinates are left zero
+    :type texCoords: tuple
+    :return: vertices in shape (rows * cols, 11)
+    :rtype: numpy.ndarray
+    """
+    U = np.asarray(u, dtype=np.float64)[:, np.newaxis]
+    V = np.asarray(v, dtype=np.float64)[np.newaxis, :]
+    shape = (U.shape[0], V.shape[1])
+
+    position, normal = surface(U, V)
+    x, y, z = normal
+    norm = np.sqrt(x ** 2 + y ** 2 + z ** 2)
+    norm = np.where(norm == 0, 1, norm)
+
+    vertices = np.zeros([shape[0] * shape[1], 11])
+    for c in range(3):
+        vertices[:, c] = np.broadcast_to(position[c], shape).ravel()
+        vertices[:, 3 + c] = np.broadcast_to(normal[c] / norm, shape).ravel()
+    vertices[:, 6:9] = [*color]
+    if texCoords is not None:
+        vertices[:, 9] = np.broadcast_to(texCoords[0], shape).ravel()
+        vertices[:, 10] = np.broadcast_to(texCoords[1], shape).ravel()
+    return vertices
+
+
+def gridIndices(rows, cols, wrapColumns=False, offset=0):
+    """
+    Triangulate a rows x cols vertex grid stored in row-major order. Each quad is split into two triangles
+    (v00, v01, v11) and (v00, v11, v10).
+
+    :param rows: number of vertex rows in the grid
+    :type rows: int
+    :param cols: number of vertex columns in the grid
+    :type cols: int
+    :param wrapColumns: if set, the last column is also connected back to the first one
+    :type wrapColumns: bool
+    :param offset: index of the grid's first vertex in the vertices array
+    :type offset: int
+    :return: triangle indices, flattened
+    :rtype: numpy.ndarray
+    """
+    quadCols = cols if wrapColumns else cols - 1
+    i = np.arange(rows - 1)[:, np.newaxis]
+    j = np.arange(quadCols)[np.newaxis, :]
+    jNext = (j + 1) % cols
+    v00 = i * cols + j
+    v01 = i * cols + jNext
+    v11 = (i + 1) * cols + jNext
+    v10 = (i + 1) * cols + j
+    return np.stack([v00, v01, v11, v00, v11, v10], axis=-1).ravel() + offset
+
+
+def fanIndices(center, ringStart, ringSize, offset=0):
+    """
+    Triangulate a closed ring of vertices around a center vertex, like a cap on a cylinder.
+
+    :param center: index of the center vertex
+    :type center: int
+    :param ringStart: index of the first ring vertex, ring vertices must be stored continuously
+    :type ringStart: int
+    :param ringSize: number of ring vertices
+    :type ringSize: int
+    :param offset: added to all generated indices
+    :type offset: int
+    :return: triangle indices, flattened
+    :rtype: numpy.ndarray
+    """
+    j = np.arange(ringSize)
+    fan = np.stack([np.full(ringSize, center), ringStart + j, ringStart + (j + 1) % ringSize], axis=-1)
+    return fan.ravel() + offset
+
+
+def gridStripIndices(rows, cols, wrapColumns=False, offset=0):
+    """
+    Triangulate a rows x cols vertex grid as triangle strips, one strip per row band, separated by -1 as the
+    primitive restart marker. Triangles keep the same winding as gridIndices.
+
+    :param rows: number of vertex rows in the grid
+    :type rows: int
+    :param cols: number of vertex columns in the grid
+    :type cols: int
+    :param wrapColumns: if set, the last column is also connected back to the first one
+    :type wrapColumns: bool
+    :param offset: index of the grid's first vertex in the vertices array
+    :type offset: int
+    :return: strip indices with restart markers, flattened
+    :rtype: numpy.ndarray
+    """
+    j = np.arange(cols + 1) % cols if wrapColumns else np.arange(cols)
+    i = np.arange(rows - 1)[:, np.newaxis]
+    strips = np.empty([rows - 1, 2 * j.size + 1], dtype=np.int64)
+    strips[:, 0:-1:2] = (i + 1) * cols + j + offset
+    strips[:, 1:-1:2] = i * cols + j + offset
+    strips[:, -1] = -1
+    return strips.ravel()
+
+
+def fanStripIndices(center, ringStart, ringSize, offset=0):
+    """
+    The same triangles as fanIndices, but every triangle is a 3 vertices strip ended with a restart marker, so a fan
+    can be drawn together with gridStripIndices
+
+    :return: strip indices with restart markers, flattened
+    :rtype: numpy.ndarray
+    """
+    fan = fanIndices(center, ringStart, ringSize, offset).reshape(-1, 3)
+    return np.concatenate([fan, np.full([fan.shape[0], 1], -1)], axis=1).ravel()
+
+
+def stripTriangleNum(indices):
+    """
+    Count the triangles of strips with -1 restart markers, without building them. A strip of n indices has n - 2
+    triangles, and strips are the runs between restart markers.
+
+    :param indices: strip indices with restart markers
+    :type indices: numpy.ndarray
+    :return: the number of rows stripsToTriangles returns
+    :rtype: int
+    """
+    indices = np.asarray(indices).ravel()
+    markers = np.flatnonzero(indices < 0)
+    lengths = np.diff(np.concatenate([[-1], markers, [indices.size]])) - 1
+    return int(np.maximum(lengths - 2, 0).sum())
+
+
+def stripsToTriangles(indices):
+    """
+    Convert triangle strips with -1 restart markers to a triangle list, for code working on CPU side triangles.
+    Odd triangles in a strip are flipped in the same way as OpenGL does, so winding is kept.
+
+    :param indices: strip indices with restart markers
+    :type indices: numpy.ndarray
+    :return: triangle indices in shape (triangleNum, 3)
+    :rtype: numpy.ndarray
+    """
+    indices = np.asarray(indices).ravel()
+    if indices.size < 3:
+        return np.zeros([0, 3], dtype=indices.dtype)
+    a, b, c = indices[:-2], indices[1:-1], indices[2:]
+    k = np.arange(indices.size - 2)
+    # position of the first vertex of the strip each window belongs to
+    stripStart = np.maximum.accumulate(np.where(indices < 0, np.arange(indices.size) + 1, 0))[:-2]
+    odd = (k - stripStart) % 2 == 1
+    valid = (a >= 0) & (b >= 0) & (c >= 0)
+    first = np.where(odd, b, a)
+    second = np.where(odd, a, b)
+    return np.stack([first, second, c], axis=-1)[valid]
@@ -0,0 +1,243 @@
+"""
+Define ray-cast picking of Components.
+A pick ray is first tested against the world space boxes of a BVH over the scene, then for every candidate in order of
+distance, the ray is moved into the candidate's local space and tested against chunks of its triangles, and only the
+triangles in hit chunks go through a vectorized Moller-Trumbore intersection.
+First version in 10/18/2026
+
+:author: Zack(Wanzhi Wang)
+:version: 2026.10.18
+"""
+
+import numpy as np
+
+import ParametricSurface
+from BoundingVolumeHierarchy import BVH, mortonCodes
+
+
+def rayTriangles(origin, direction, v0, v1, v2, epsilon=1e-12):
+    """
+    Moller-Trumbore intersection of one ray with many triangles, both sides of a triangle can be hit
+
+    :param origin: ray origin
+    :type origin: numpy.ndarray
+    :param direction: ray direction
+    :type direction: numpy.ndarray
+    :param v0: first vertices of the triangles in shape (n, 3)
+    :param v1: second vertices of the triangles in shape (n, 3)
+    :param v2: third vertices of the triangles in shape (n, 3)
+    :return: hit mask, distance along the ray in units of direction length, and barycentric u, v of v1 and v2
+    :rtype: tuple
+    """
+    # work on coordinate rows, which is faster than numpy.cross and einsum on (n, 3) arrays
+    e1 = (v1 - v0).T
+    e2 = (v2 - v0).T
+    s = (origin - v0).T
+    p = np.array([direction[1] * e2[2] - direction[2] * e2[1], direction[2] * e2[0] - direction[0] * e2[2],
+                  direction[0] * e2[1] - direction[1] * e2[0]])
+    q = np.array([s[1] * e1[2] - s[2] * e1[1], s[2] * e1[0] - s[0] * e1[2], s[0] * e1[1] - s[1] * e1[0]])
+    det = (e1 * p).sum(axis=0)
+    valid = np.abs(det) > epsilon
+    inverse = 1 / np.where(valid, det, 1)
+    u = (s * p).sum(axis=0) * inverse
+    v = (direction @ q) * inverse
+    t = (e2 * q).sum(axis=0) * inverse
+    hit = valid & (u >= 0) & (v >= 0) & (u + v <= 1) & (t >= 0)
+    return hit, t, u, v
+
+
+class MeshPickData:
+    """
+    Triangles of a mesh in two levels of local space boxes: chunks of triangles, and groups of consecutive chunks.
+    Triangles are sorted along the Morton curve of their centroids first, so chunks and groups are compact and their
+    boxes are tight. A flat two level layout costs a fixed number of vectorized steps per ray, where a deeper tree
+    would pay numpy call overhead on every level.
+    """
+    chunkSize = 64  # triangles in a chunk
+    groupSize = 64  # chunks in a group
+    batchSize = 8  # chunks intersected together at first
+
+    positions = None  # (vertexNum, 3)
+    triangles = None  # (triangleNum, 3) vertex indices, in the order of the mesh
+    order = None  # triangle indices along the Morton curve, chunk k holds order[k * chunkSize:(k + 1) * chunkSize]
+    chunkMin = None  # (chunkNum, 3)
+    chunkMax = None
+    groupMin = None  # (groupNum, 3)
+    groupMax = None
+
+    def __init__(self, vertices, indices, triangleStrips=False):
+        """
+        :param vertices: vertices in the Displayable layout, positions in the first three columns
+        :type vertices: numpy.ndarray
+        :param indices: triangle list indices, or triangle strips separated by -1
+        :type indices: numpy.ndarray
+        :param triangleStrips: True if indices are triangle strips
+        :type triangleStrips: bool
+        """
+        self.positions = np.asarray(vertices[:, 0:3], dtype=np.float64)
+        if triangleStrips:
+            self.triangles = ParametricSurface.stripsToTriangles(indices)
+        else:
+            self.triangles = np.asarray(indices).reshape(-1, 3)
+
+        triangleNum = self.triangles.shape[0]
+        chunkNum = -(-triangleNum // self.chunkSize)
+        groupNum = -(-chunkNum // self.groupSize)
+        corners = self.positions[self.triangles]
+        if triangleNum:
+            centroids = corners.mean(axis=1)
+            self.order = np.argsort(mortonCodes(centroids, centroids.min(axis=0), centroids.max(axis=0)),
+                                    kind="stable")
+        else:
+            self.order = np.zeros(0, dtype=np.intp)
+        # pad the last chunk with its last triangle and the last group with its last chunk, so all have the same size
+        padded = self.order[np.minimum(np.arange(chunkNum * self.chunkSize), triangleNum - 1)]
+        corners = corners[padded].reshape(chunkNum, self.chunkSize * 3, 3)
+        self.chunkMin = corners.min(axis=1)
+        self.chunkMax = corners.max(axis=1)
+        padded = np.minimum(np.arange(groupNum * self.groupSize), chunkNum - 1)
+        self.groupMin = self.chunkMin[padded].reshape(groupNum, self.groupSize, 3).min(axis=1)
+        self.groupMax = self.chunkMax[padded].reshape(groupNum, self.groupSize, 3).max(axis=1)
+
+    def intersect(self, origin, direction, maxDistance=np.inf):
+        """
+        Find the closest triangle hit by a ray in this mesh's local space
+
+        :return: (triangle index, distance, u, v) or None
+        :rtype: tuple
+        """
+        if self.triangles.shape[0] == 0:
+            return None
+        hit, _ = BVH.rayBoxes(origin, direction, self.groupMin, self.groupMax, maxDistance)
+        if not hit.any():
+            return None
+        chunks = (np.flatnonzero(hit)[:, np.newaxis] * self.groupSize + np.arange(self.groupSize)).ravel()
+        chunks = chunks[chunks < self.chunkMin.shape[0]]
+        hit, entries = BVH.rayBoxes(origin, direction, self.chunkMin[chunks], self.chunkMax[chunks], maxDistance)
+        order = np.argsort(entries[hit], kind="stable")
+        chunks, entries = chunks[hit][order], entries[hit][order]
+
+        best = None
+        # test the chunks in order of entry distance, until no later chunk can hold a closer hit. Batches start
+        # small for the common case of a hit in the first chunks, and grow for rays grazing along the surface
+        start, batchSize = 0, self.batchSize
+        while start < chunks.size and entries[start] <= maxDistance:
+            candidates = (chunks[start:start + batchSize, np.newaxis] * self.chunkSize +
+                          np.arange(self.chunkSize)).ravel()
+            candidates = self.order[candidates[candidates < self.triangles.shape[0]]]
+            corners = self.positions[self.triangles[candidates]]
+            hit, t, u, v = rayTriangles(origin, direction, corners[:, 0], corners[:, 1], corners[:, 2])
+            hit &= t <= maxDistance
+            if hit.any():
+                i = np.flatnonzero(hit)[np.argmin(t[hit])]
+                best = int(candidates[i]), float(t[i]), float(u[i]), float(v[i])
+                maxDistance = best[1]
+            start += batchSize
+            batchSize *= 2
+        return best
+
+
+class PickResult:
+    """
+    What a pick hit. Picks which don't know some of these leave them as None
+    """
+    component = None  # the hit Component
+    triangle = None  # index of the hit triangle in the Displayable's triangle list, strips are counted as triangles
+    vertexIndices = None  # the triangle's three vertex indices
+    barycentric = None  # weights of the three vertices at the hit point
+    distance = None  # distance along the ray, in units of the ray direction length
+    point = None  # hit point in world space
+
+    def __init__(self, component, triangle, vertexIndices, barycentric, distance, point):
+        self.component = component
+        self.triangle = triangle
+        self.vertexIndices = vertexIndices
+        self.barycentric = barycentric
+        self.distance = distance
+        self.point = point
+
+    def __repr__(self):
+        if self.distance is None:
+            return "PickResult(triangle=%d)" % self.triangle
+        return "PickResult(triangle=%d, barycentric=%s, distance=%.4f, point=%s)" % (
+            self.triangle, np.round(self.barycentric, 4), self.distance, np.round(self.point, 4))
+
+
+class Picker:
+    """
+    Pick Components of a scene with rays. Triangle chunks are built once per mesh and shared by all Components with
+    the same shape.
+    """
+    bvh = None
+    meshData = None  # Displayable mesh key -> MeshPickData
+
+    def __init__(self):
+        self.bvh = None
+        self.meshData = {}
+
+    def build(self, root):
+        """
+        Build the spatial index over a Component tree, call it after the tree structure changed
+        """
+        if self.bvh is not None:
+            self.bvh.release()
+        self.bvh = BVH.fromComponent(root)
+
+    def refit(self):
+        """
+        Refit the spatial index to the Components which moved since the last refit
+
+        :return: number of refit Components
+        :rtype: int
+        """
+        if self.bvh is None:
+            return 0
+        return self.bvh.refitComponents()
+
+    def pickData(self, displayable):
+        data = self.meshData.get(displayable.meshKey)
+        if data is None:
+            data = MeshPickData(displayable.vertices, displayable.indices, displayable.triangleStrips)
+            self.meshData[displayable.meshKey] = data
+        return data
+
+    def pick(self, origin, direction):
+        """
+        Cast a ray through the scene
+
+        :param origin: ray origin in world space
+        :type origin: numpy.ndarray
+        :param direction: ray direction in world space
+        :type direction: numpy.ndarray
+        :return: the closest hit, or None
+        :rtype: PickResult
+        """
+        if self.bvh is None:
+            return None
+        origin = np.asarray(origin, dtype=np.float64)
+        direction = np.asarray(direction, dtype=np.float64)
+        candidates, entries = self.bvh.rayQuery(origin, direction)
+
+        best = None
+        bestDistance = np.inf
+        for objectIndex, entry in zip(candidates, entries):
+            if entry > bestDistance:
+                break  # candidates are sorted by box entry distance, nothing further can be closer
+            component = self.bvh.objects[objectIndex]
+            # move the ray into local space, points are row vectors multiplied on the left of the matrices
+            inverse = np.linalg.inv(component.transformationMat)
+            localOrigin = np.append(origin, 1) @ inverse
+            localOrigin = localOrigin[0:3] / localOrigin[3]
+            localDirection = (np.append(direction, 0) @ inverse)[0:3]
+            # an affine transformation keeps the ray parameter, so local distances compare with world ones
+            data = self.pickData(component.displayObj)
+            hit = data.intersect(localOrigin, localDirection, bestDistance)
+            if hit is not None and hit[1] < bestDistance:
+                best = (component, data, hit)
+                bestDistance = hit[1]
+
+        if best is None:
+            return None
+        component, data, (triangle, distance, u, v) = best
+        return PickResult(component, triangle, data.triangles[triangle], np.array([1 - u - v, u, v]), distance,
+                          origin + distance * direction)
@@ -0,0 +1,158 @@
+"""
+Define a render queue which draws Components sorted by GL state.
+Draw traversal pushes one DrawPacket per visible Displayable, the queue sorts the packets by rendering routing, texture,
+distance bucket, material and mesh, so each state is only set when it differs from the previous packet. Buckets are
+drawn front to back, so nearer objects fill the depth buffer first and hidden fragments are rejected early, at the cost
+of setting material and mesh again in every bucket.
+First version in 10/18/2026
+
+:author: Zack(Wanzhi Wang)
+:version: 2026.10.18
+"""
+
+import numpy as np
+
+
+class DrawPacket:
+    """
+    Everything needed to draw one Displayable, taken from its Component at traversal time
+    """
+    component = None
+    mesh = None  # GPUMesh of the Displayable
+    material = None
+    routing = None
+    texture = None
+    textureOn = False
+    modelMat = None  # world transformation in column-major order
+    normalMat = None  # its inverse transpose, cached on the Component
+    center = None  # world space center, for the distance to the eye
+    depth = 0.0  # squared distance to the eye
+    bucket = 0  # distance bucket, see RenderQueue.depthBucketRatio
+    key = None
+
+    def __init__(self, component):
+        self.component = component
+        self.mesh = component.displayObj.mesh
+        self.material = component.material
+        self.routing = component.renderingRouting
+        self.texture = component.texture
+        self.textureOn = component.textureOn
+        self.modelMat = component.transformationMat
+        self.normalMat = component.normalMat
+        if component.boundingCenter is not None:
+            self.center = component.boundingCenter
+        else:
+            self.center = np.asarray(component.transformationMat)[3, 0:3]
+        self.depth = 0.0
+        self.bucket = 0
+        # most expensive state first: program routing, then texture, material and mesh
+        self.key = (str(self.routing), self.texture.textureName if self.textureOn else 0, id(self.material),
+                    id(self.mesh))
+
+
+class RenderQueue:
+    """
+    Collect draw packets for a frame, sort them and draw them with as few state changes as possible.
+    A state change is counted for each routing, texture, material or mesh which differs from the previous packet.
+    Drawing every packet in tree order, like the recursive Component.draw did, sets all four for every packet,
+    stateChangesSaved is how many of those the sorted queue skipped in the last flush.
+    """
+    STATE_NUM = 4  # routing, texture, material and mesh
+    # distances within this factor of each other share a bucket. Larger ratios keep fewer material and mesh changes,
+    # smaller ones keep more of the front to back order. Routing and texture changes cost more than overdraw, so they
+    # stay ahead of the buckets
+    depthBucketRatio = 2.0
+
+    packets = None
+    stateChanges = 0
+    stateChangesSaved = 0
+
+    def __init__(self):
+        self.packets = []
+        self.stateChanges = 0
+        self.stateChangesSaved = 0
+
+    def clear(self):
+        self.packets = []
+
+    def push(self, component):
+        """
+        Queue a Component's Displayable with its current transformation, material and texture
+
+        :type component: Component
+        """
+        self.packets.append(DrawPacket(component))
+
+    def sort(self, eyePosition=None):
+        """
+        Sort the packets by routing and texture, then front to back by distance bucket, then by material and mesh,
+        and by distance within the same state
+
+        :param eyePosition: camera position in world space, if None packets of the same state keep traversal order
+        :type eyePosition: numpy.ndarray
+        """
+        if eyePosition is not None and self.packets:
+            centers = np.array([p.center for p in self.packets])
+            depths = np.sum((centers - np.asarray(eyePosition)) ** 2, axis=1)
+            # depths are squared, so halve the log to bucket distances
+            buckets = np.floor(np.log(np.maximum(depths, 1e-12)) / (2 * np.log(self.depthBucketRatio)))
+            for p, d, b in zip(self.packets, depths, buckets.astype(int).tolist()):
+                p.depth = d
+                p.bucket = b
+        # all Displayables are opaque, so front to back order is right for every packet
+        self.packets.sort(key=lambda p: (p.key[0], p.key[1], p.bucket, p.key[2], p.key[3], p.depth))
+
+    def flush(self, shaderProg, stats=None):
+        """
+        Draw all queued packets in their current order, then empty the queue
+
+        :param shaderProg: the GLProgram to draw with
+        :type shaderProg: GLProgram
+        :param stats: if given, its "stateChanges" and "stateChangesSaved" counts are increased
+        :type stats: dict
+        """
+        if not self.packets:
+            self.stateChanges = 0
+            self.stateChangesSaved = 0
+            return
+        shaderProg.use()
+        # resolve the per packet uniforms once, setters take the locations in place of names
+        textureLoc = shaderProg.getUniformLocation("textureImage")
+        modelMatLoc = shaderProg.getUniformLocation("modelMat")
+        normalMatLoc = shaderProg.getUniformLocation("normalMat")
+        changes = 0
+        routing = texture = material = mesh = None
+        first = True
+        for p in self.packets:
+            shaderProg.setMat4(modelMatLoc, p.modelMat)
+            shaderProg.setMat4(normalMatLoc, p.normalMat)
+            if first or p.routing != routing:
+                shaderProg.setFragmentShaderRouting(p.routing)
+                routing = p.routing
+                changes += 1
+            textureKey = p.key[1]
+            if first or textureKey != texture:
+                if p.textureOn:
+                    p.texture.bind(textureLoc)
+                else:
+                    p.texture.unbind(textureLoc)
+                texture = textureKey
+                changes += 1
+            if p.material is not material:
+                shaderProg.setMaterial(p.material)
+                material = p.material
+                changes += 1
+            if p.mesh is not mesh:
+                p.mesh.vao.bind()
+                mesh = p.mesh
+                changes += 1
+            p.mesh.ebo.draw()
+            first = False
+        mesh.vao.unbind()
+
+        self.stateChanges = changes
+        self.stateChangesSaved = self.STATE_NUM * len(self.packets) - changes
+        if stats is not None:
+            stats["stateChanges"] = stats.get("stateChanges", 0) + self.stateChanges
+            stats["stateChangesSaved"] = stats.get("stateChangesSaved", 0) + self.stateChangesSaved
+        self.packets = []
@@ -108,6 +108,7 @@ class SceneFour(Component):
         self.specularMask = [np.array((0.2, 0.9, 0.2, 1)), np.array((0.4, 0.4, 0.4, 0.1)),
                              np.array((0, 0, 0.1, 0.1))]
         self.lightCubes = [lightCube0, lightCube1, lightCube2, lightCube3]
+        self.setStatic()
 
     def initialize(self):
         self.shaderProg.clearAllLights()
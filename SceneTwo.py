@@ -130,6 +130,7 @@ class SceneTwo(Component):
         self.specularMask = [np.array((0.4, 0.4, 0.4, 0.1)), np.array((0.8, 0.8, 0.8, 1.0)), np.array((0.6, 0.6, 0.6, 0.1))]
         self.lightMask = [l0, l1]
         self.lightCubes = [lightCube0, lightCube1]
+        self.setStatic()
 
     def initialize(self):
         self.shaderProg.clearAllLights()
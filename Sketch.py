@@ -16,6 +16,15 @@ from ModelAxes import ModelAxes
 from Point import Point
 from CanvasBase import CanvasBase
 from GLProgram import GLProgram
+from FrameUniforms import FrameUniforms
+from GeometryCache import geometryCache
+from Frustum import Frustum
+from Picking import Picker
+from IDPicking import IDPicker
+from Instancing import InstanceRenderer
+from RenderQueue import RenderQueue
+from StaticBatching import StaticBatcher
+from IndirectDrawing import IndirectRenderer
 import GLUtility
 from SceneOne import SceneOne
 from SceneTwo import SceneTwo
@@ -107,6 +116,31 @@ class Sketch(CanvasBase):
 
     viewMat = None
     perspMat = None
+    # projection, view and camera position reach every GLProgram through one uniform block uploaded per frame
+    frameUniforms = None
+
+    # skip Displayables outside the view frustum. drawStats counts Displayables drawn and culled in the last frame,
+    # the state changes made and saved by sorting renderQueue, and the uniform calls made and skipped by shaderProg
+    frustumCulling = True
+    drawStats = None
+    renderQueue = None
+
+    # picking on left click, by casting a ray on the CPU, or by drawing ids on the GPU if gpuPicking is set.
+    # pickResult is the last hit or None, GPU picks arrive in OnPick a frame after the click
+    picker = None
+    idPicker = None
+    gpuPicking = False
+    pickResult = None
+
+    # draw Components sharing a mesh with one instanced draw call per group
+    instancing = True
+    instancer = None
+    # merge the Displayables of static subtrees into one draw call per routing, texture and material
+    staticBatching = True
+    staticBatcher = None
+    # on GL 4.3 contexts, draw the remaining untextured Displayables with one multi draw indirect call
+    indirectDrawing = True
+    indirectRenderer = None
 
     pauseScene = False
 
@@ -116,6 +150,7 @@ class Sketch(CanvasBase):
 
     # scene counter
     counter = 1
+    sceneClasses = None
 
     def __init__(self, parent):
         """
@@ -131,6 +166,9 @@ class Sketch(CanvasBase):
         self.last_mouse_middlePosition = [0, 0]
         self.components = []
         self.backgroundColor = ColorType.BLUEGREEN
+        self.sceneClasses = [SceneOne, SceneTwo, SceneThree, SceneFour]
+        self.picker = Picker()
+        self.renderQueue = RenderQueue()
 
         # add components to top level
         self.resetView()
@@ -146,13 +184,47 @@ class Sketch(CanvasBase):
 
     def switchScene(self, scene):
         self.scene = scene
+        # materials of the previous scene give their table slots to the new one before anything is grouped
+        if self.shaderProg.materialTable is not None:
+            self.shaderProg.materialTable.clear()
         self.topLevelComponent.clear()
         self.topLevelComponent.addChild(self.scene)
         self.topLevelComponent.initialize()
+        # free meshes only the previous scene used. Purge after initialize, so meshes both scenes share are kept
+        purged = geometryCache.purge()
+        self.topLevelComponent.update(np.identity(4))
+        self.picker.build(self.topLevelComponent)
+        # baked Components are not instanced, so bake first
+        if self.staticBatching:
+            self.staticBatcher.build(self.topLevelComponent)
+        else:
+            self.staticBatcher.clear()
+        if self.instancing:
+            self.instancer.build(self.topLevelComponent)
+        else:
+            self.instancer.clear()
+        # takes what is left after batching and instancing
+        if self.indirectDrawing and IndirectRenderer.supported():
+            self.indirectRenderer.build(self.topLevelComponent)
+        else:
+            self.indirectRenderer.clear()
+        if self.debug > 1:
+            print("Geometry cache: ", geometryCache.stats(), "purged: ", purged)
+            print("Instance groups: ", len(self.instancer.groups))
+            print("Static batches: ", len(self.staticBatcher.batches))
+            print("Indirect draws: ", len(self.indirectRenderer.components))
 
     def InitGL(self):
+        # meshes cached for the previous GL context cannot be used in the new one
+        geometryCache.clear()
         self.shaderProg = GLProgram()
         self.shaderProg.compile()
+        self.frameUniforms = FrameUniforms()
+        self.idPicker = IDPicker(self.shaderProg)
+        # like the cached meshes, instance buffers of the previous context are left behind
+        self.instancer = InstanceRenderer()
+        self.staticBatcher = StaticBatcher()
+        self.indirectRenderer = IndirectRenderer()
 
         # instantiate models, then can only be done with a compiled GL program
         self.basisAxes = ModelAxes(self.shaderProg, Point((0, 0, 0)))
@@ -169,11 +241,8 @@ class Sketch(CanvasBase):
 
         # set basic viewing matrix
         self.perspMat = self.glutility.perspective(45, self.size.width, self.size.height, 0.01, 100)
-        self.shaderProg.setMat4("projectionMat", self.perspMat)
-        self.shaderProg.setMat4("viewMat", self.glutility.view(self.getCameraPos(), self.lookAtPt, self.upVector))
         self.shaderProg.setMat4("modelMat", np.identity(4))
-
-        self.shaderProg.setVec3("viewPosition", np.array(self.getCameraPos()))
+        self.shaderProg.setMat4("normalMat", np.identity(4))
 
     def getCameraPos(self):
         ct = math.cos(self.cameraTheta)
@@ -212,20 +281,40 @@ class Sketch(CanvasBase):
     def OnDraw(self):
         gl.glClearColor(*self.backgroundColor, 1.0)
         gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
+        # picks drawn in earlier frames whose readback is done
+        self.idPicker.poll()
+        self.shaderProg.resetUniformCounters()
 
         self.viewMat = self.glutility.view(self.getCameraPos(), self.lookAtPt, self.upVector)
-        self.shaderProg.setMat4("viewMat", self.viewMat)
-        self.shaderProg.setVec3("viewPosition", np.array(self.getCameraPos()))
+        self.frameUniforms.update(self.perspMat, self.viewMat, np.array(self.getCameraPos()),
+                                  (self.size[0], self.size[1]))
+        # upload materials changed in place, such as by the a, d and s toggles
+        if self.shaderProg.materialTable is not None:
+            self.shaderProg.materialTable.sync()
 
         if not self.pauseScene and isinstance(self.scene, Animation):
             self.scene.animationUpdate()
         self.topLevelComponent.update(np.identity(4))
-        self.topLevelComponent.draw(self.shaderProg)
+        self.drawStats = {"drawn": 0, "culled": 0}
+        frustum = Frustum(self.viewMat, self.perspMat) if self.frustumCulling else None
+        self.topLevelComponent.enqueue(self.renderQueue, frustum, self.drawStats)
+        self.renderQueue.sort(np.array(self.getCameraPos()))
+        self.renderQueue.flush(self.shaderProg, self.drawStats)
+        self.staticBatcher.draw(self.shaderProg, frustum, self.drawStats)
+        self.indirectRenderer.draw(self.shaderProg, frustum, self.drawStats)
+        self.instancer.draw(self.shaderProg, self.drawStats)
+        # a subtree culled in traversal counts all its Displayables, also those the renderers above draw or cull
+        # themselves, so derive the culled count from the drawn one once every renderer has drawn
+        self.drawStats["culled"] = self.topLevelComponent.drawableNum - self.drawStats["drawn"]
+        self.idPicker.render(self.topLevelComponent, self.viewMat, self.perspMat)
 
         # draw the axes on the canvas bottom right corner
         resultPt = self.unprojectCanvas(0.9 * self.size[0], 0.1 * self.size[1], 0.3)
         self.basisAxes.setCurrentPosition(resultPt)
+        self.basisAxes.update()
         self.basisAxes.draw(self.shaderProg)
+        self.drawStats["uniformCalls"] = self.shaderProg.uniformCalls
+        self.drawStats["uniformCallsSkipped"] = self.shaderProg.uniformCallsSkipped
 
         self.SwapBuffers()
 
@@ -277,9 +366,26 @@ class Sketch(CanvasBase):
         result = Point([(1 - u) * r1 + u * r2 for r1, r2 in zip(result1, result2)])
         return result
 
+    def pick(self, x, y):
+        """
+        Find what is under a canvas point, by casting a ray from the near plane to the far plane
+
+        :param x: canvas x coordinate
+        :type x: int
+        :param y: canvas y coordinate, from the bottom
+        :type y: int
+        :return: the closest hit, or None
+        :rtype: PickResult
+        """
+        near = np.array(self.unprojectCanvas(x, y, 0).coords, dtype=np.float64)
+        far = np.array(self.unprojectCanvas(x, y, 1).coords, dtype=np.float64)
+        # pick what the last frame showed, its update reported every Component which moved since the last pick
+        self.picker.refit()
+        return self.picker.pick(near, far - near)
+
     def Interrupt_MouseL(self, x, y):
         """
-        When mouse click detected, store current position in last_mouse_leftPosition
+        When mouse click detected, store current position in last_mouse_leftPosition, and pick what is under it
 
         :param x: Mouse click's x coordinate
         :type x: int
@@ -289,6 +395,22 @@ class Sketch(CanvasBase):
         """
         self.last_mouse_leftPosition[0] = x
         self.last_mouse_leftPosition[1] = y
+        if self.gpuPicking:
+            self.idPicker.requestPick(x, y, self.OnPick)
+        else:
+            self.OnPick(self.pick(x, y))
+
+    def OnPick(self, result):
+        """
+        Receive the result of a left click pick
+
+        :param result: the closest hit, or None
+        :type result: PickResult
+        :return: None
+        """
+        self.pickResult = result
+        if self.debug > 1:
+            print("Picked: ", result)
 
     def Interrupt_MouseMiddleDragging(self, x, y):
         """
@@ -369,28 +491,15 @@ class Sketch(CanvasBase):
         if keycode in [wx.WXK_LEFT]:
             self.counter -= 1
             if self.counter < 1:
-                self.counter = 4
-            if self.counter == 1:
-                self.switchScene(SceneOne(self.shaderProg))
-            elif self.counter == 2:
-                self.switchScene(SceneTwo(self.shaderProg))
-            elif self.counter == 3:
-                self.switchScene(SceneThree(self.shaderProg))
-            elif self.counter == 4:
-                self.switchScene(SceneFour(self.shaderProg))
+                self.counter = len(self.sceneClasses)
+            # shapes shared with the previous scenes come from geometry cache, they are not generated again
+            self.switchScene(self.sceneClasses[self.counter - 1](self.shaderProg))
             self.update()
         if keycode in [wx.WXK_RIGHT]:
             self.counter += 1
-            if self.counter > 4:
+            if self.counter > len(self.sceneClasses):
                 self.counter = 1
-            if self.counter == 1:
-                self.switchScene(SceneOne(self.shaderProg))
-            elif self.counter == 2:
-                self.switchScene(SceneTwo(self.shaderProg))
-            elif self.counter == 3:
-                self.switchScene(SceneThree(self.shaderProg))
-            elif self.counter == 4:
-                self.switchScene(SceneFour(self.shaderProg))
+            self.switchScene(self.sceneClasses[self.counter - 1](self.shaderProg))
             self.update()
         if keycode in [wx.WXK_UP]:
             self.Interrupt_Scroll(1)
@@ -433,42 +542,37 @@ class Sketch(CanvasBase):
                     self.scene.lights.remove(self.scene.lightMask[3])
                     self.scene.initialize()
 
-        # Using a, d and s to toggle ambient, diffuse and specular lights
+        # Using a, d and s to toggle ambient, diffuse and specular lights. Materials are changed in place, the material
+        # table uploads them before the next frame
         if chr(keycode) in "aA":
             if self.scene.toggleflag[0] == False:
                 for m in self.scene.materials:
                     m.ambient = np.array((0.0, 0.0, 0.0, 0.0))
                 self.scene.toggleflag[0] = True
-                self.scene.initialize()
             else:
                 for i in range(len(self.scene.materials)):
                     self.scene.materials[i].ambient = self.scene.ambientMask[i]
                 self.scene.toggleflag[0] = False
-                self.scene.initialize()
 
         if chr(keycode) in "dD":
             if self.scene.toggleflag[1] == False:
                 for m in self.scene.materials:
                     m.diffuse = np.array((0.0, 0.0, 0.0, 0.0))
                 self.scene.toggleflag[1] = True
-                self.scene.initialize()
             else:
                 for i in range(len(self.scene.materials)):
                     self.scene.materials[i].diffuse = self.scene.diffuseMask[i]
                 self.scene.toggleflag[1] = False
-                self.scene.initialize()
 
         if chr(keycode) in "sS":
             if self.scene.toggleflag[2] == False:
                 for m in self.scene.materials:
                     m.specular = np.array((0.0, 0.0, 0.0, 0.0))
                 self.scene.toggleflag[2] = True
-                self.scene.initialize()
             else:
                 for i in range(len(self.scene.materials)):
                     self.scene.materials[i].specular = self.scene.specularMask[i]
                 self.scene.toggleflag[2] = False
-                self.scene.initialize()
 
 
         if chr(keycode) in "rR":
@@ -0,0 +1,265 @@
+"""
+Define static batching for Components which never move.
+Displayables in a subtree marked static are transformed into world space once, and those drawn with the same routing,
+texture and material are merged into one VBO/EBO pair, drawn with a single call. A member whose transformation,
+material, routing or texture changes leaves its batch, which is merged again without it before the next draw.
+First version in 10/18/2026
+
+:author: Zack(Wanzhi Wang)
+:version: 2026.10.18
+"""
+try:
+    import OpenGL
+
+    try:
+        import OpenGL.GL as gl
+        import OpenGL.GLU as glu
+    except ImportError:
+        from ctypes import util
+
+        orig_util_find_library = util.find_library
+
+
+        def new_util_find_library(name):
+            res = orig_util_find_library(name)
+            if res:
+                return res
+            return '/System/Library/Frameworks/' + name + '.framework/' + name
+
+
+        util.find_library = new_util_find_library
+        import OpenGL.GL as gl
+        import OpenGL.GLU as glu
+except ImportError:
+    raise ImportError("Required dependency PyOpenGL not present")
+
+import numpy as np
+
+import ParametricSurface
+from Displayable import Displayable
+from GLBuffer import VAO, VBO, EBO, COMPACT_COLOR_VERTEX_FORMAT
+
+
+def usesMaterial(routing):
+    """
+    Only the lighting routing reads the material, Components with other routings can share a batch whatever their
+    materials are
+    """
+    routing = str(routing).lower()
+    return "lighting" in routing or "illumination" in routing
+
+
+class StaticBatch:
+    """
+    Static Components sharing routing, texture and material, drawn from one merged world space mesh
+    """
+    members = None  # list<Component>
+    shaderProg = None
+    renderingRouting = None
+
+    vertices = None  # merged vertices in world space, in the 11 columns Displayable layout
+    indices = None  # merged triangle list
+    bakedMats = None  # id of member -> transformation its vertices were baked with
+    boundingCenter = None
+    boundingRadius = None
+    dirty = True  # members changed since the last merge
+    uploaded = False  # GL buffers hold the current merge
+
+    vao = None
+    vbo = None
+    ebo = None
+
+    def __init__(self, members):
+        self.members = list(members)
+        self.shaderProg = self.members[0].displayObj.shaderProg
+        self.renderingRouting = self.members[0].renderingRouting
+        for c in self.members:
+            c.staticBatch = self
+        self.dirty = True
+        self.uploaded = False
+        self.merge()
+
+    def merge(self):
+        """
+        Transform every member's vertices into world space and concatenate them.
+        Strips are unrolled into triangle lists, so meshes of both topologies can be merged.
+        """
+        vertexParts = []
+        indexParts = []
+        offset = 0
+        self.bakedMats = {}
+        for c in self.members:
+            d = c.displayObj
+            vertices = np.array(d.vertices, dtype=np.float64)
+            if d.triangleStrips:
+                indices = ParametricSurface.stripsToTriangles(d.indices)
+            else:
+                indices = np.asarray(d.indices)
+            # points are row vectors multiplied on the left of the column-major stored matrix,
+            # normals go through the inverse transpose of its upper left 3x3 part
+            m = np.array(c.transformationMat, dtype=np.float64)
+            vertices[:, 0:3] = vertices[:, 0:3] @ m[0:3, 0:3] + m[3, 0:3]
+            normals = vertices[:, 3:6] @ np.linalg.inv(m[0:3, 0:3]).T
+            lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+            vertices[:, 3:6] = normals / np.where(lengths > 0, lengths, 1)
+            vertexParts.append(vertices)
+            indexParts.append(indices.reshape(-1).astype(np.int64) + offset)
+            offset += vertices.shape[0]
+            self.bakedMats[id(c)] = m
+        self.vertices = np.concatenate(vertexParts) if vertexParts else np.zeros((0, 11))
+        self.indices = np.concatenate(indexParts) if indexParts else np.zeros(0, dtype=np.int64)
+
+        if self.vertices.shape[0]:
+            positions = self.vertices[:, 0:3]
+            self.boundingCenter = (positions.min(axis=0) + positions.max(axis=0)) / 2
+            self.boundingRadius = float(np.sqrt(np.max(np.sum((positions - self.boundingCenter) ** 2, axis=1))))
+        else:
+            self.boundingCenter, self.boundingRadius = None, None
+        self.dirty = False
+        self.uploaded = False
+
+    def upload(self, shaderProg):
+        """
+        Put the merged mesh into this batch's GL buffers. Must be called on the GL thread.
+        """
+        if self.vao is None:
+            self.vao = VAO()
+            self.vbo = VBO()
+            self.ebo = EBO()
+        self.vao.bind()
+        # merged meshes mix vertex colors of different Displayables, so color is stored per vertex
+        self.vbo.setFormattedBuffer(self.vertices, COMPACT_COLOR_VERTEX_FORMAT)
+        self.ebo.setBuffer(self.indices, self.vertices.shape[0])
+        COMPACT_COLOR_VERTEX_FORMAT.setAttribPointers(shaderProg, self.vbo, self.vao, self.vertices)
+        self.vao.unbind()
+        self.uploaded = True
+
+    def remove(self, component):
+        """
+        Take a member out of this batch, it is drawn on its own from now on
+        """
+        self.members.remove(component)
+        component.staticBatch = None
+        self.dirty = True
+
+    def moved(self, component):
+        """
+        :return: if the member's transformation is no longer the one its vertices were baked with
+        :rtype: bool
+        """
+        return not np.array_equal(component.transformationMat, self.bakedMats[id(component)])
+
+    def rebake(self):
+        """
+        Merge again before the next draw, for members whose Displayable was initialized again
+        """
+        self.dirty = True
+
+    def dissolve(self):
+        for c in self.members:
+            c.staticBatch = None
+        self.members = []
+        self.delete()
+
+    def sync(self):
+        """
+        Members bound to a FlatSceneGraph get new matrices without going through Component.update, compare them with
+        the baked ones
+        """
+        for c in list(self.members):
+            if c.sceneGraph is not None and self.moved(c):
+                self.remove(c)
+
+    def draw(self, shaderProg, frustum=None, stats=None):
+        self.sync()
+        if self.dirty:
+            self.merge()
+        if not self.members:
+            return
+        if frustum is not None and self.boundingRadius is not None and \
+                not frustum.intersectsSphere(self.boundingCenter, self.boundingRadius):
+            if stats is not None:
+                stats["culled"] += len(self.members)
+            return
+        if not self.uploaded:
+            self.upload(shaderProg)
+
+        first = self.members[0]
+        shaderProg.use()
+        # vertices are already in world space
+        shaderProg.setMat4("modelMat", np.identity(4))
+        shaderProg.setMat4("normalMat", np.identity(4))
+        # the material is shared by all members when the routing reads it
+        shaderProg.setMaterial(first.material)
+        shaderProg.setFragmentShaderRouting(self.renderingRouting)
+        if first.textureOn:
+            first.texture.bind(shaderProg.getUniformLocation("textureImage"))
+        else:
+            first.texture.unbind(shaderProg.getUniformLocation("textureImage"))
+        self.vao.bind()
+        self.ebo.draw()
+        self.vao.unbind()
+        if stats is not None:
+            stats["drawn"] += len(self.members)
+
+    def delete(self):
+        if self.vao is not None:
+            self.vao.delete()
+            self.vbo.delete()
+            self.ebo.delete()
+            self.vao = self.vbo = self.ebo = None
+        self.uploaded = False
+
+
+class StaticBatcher:
+    """
+    Find the static subtrees of a Component tree, merge their Displayables into batches and draw them.
+    Component.setStatic marks a subtree, every Displayable below it is baked unless it is the only one of its batch.
+    """
+    minMembers = 2
+    batches = None
+
+    def __init__(self):
+        self.batches = []
+
+    def build(self, root):
+        """
+        Rebake after the tree has changed. Call it after root is initialized and updated.
+
+        :type root: Component
+        :return: number of batches
+        :rtype: int
+        """
+        self.clear()
+        candidates = {}
+        stack = [(root, False)]
+        while stack:
+            c, static = stack.pop()
+            static = static or c.static
+            stack.extend((child, static) for child in reversed(c.children))
+            if not static or not isinstance(c.displayObj, Displayable):
+                continue
+            material = c.material if usesMaterial(c.renderingRouting) else None
+            key = (c.displayObj.shaderProg, str(c.renderingRouting), c.texture.textureName if c.textureOn else 0,
+                   id(material))
+            candidates.setdefault(key, []).append(c)
+        for members in candidates.values():
+            if len(members) >= self.minMembers:
+                self.batches.append(StaticBatch(members))
+        return len(self.batches)
+
+    def clear(self):
+        for b in self.batches:
+            b.dissolve()
+        self.batches = []
+
+    def draw(self, shaderProg, frustum=None, stats=None):
+        """
+        Draw every batch with one draw call each. Component traversal skips the members, so call this after it.
+        """
+        for b in self.batches:
+            b.draw(shaderProg, frustum, stats)
+            if len(b.members) < self.minMembers:
+                # too few members left to save anything, the rest are drawn on their own from the next frame
+                b.dissolve()
+        self.batches = [b for b in self.batches if b.members]
@@ -0,0 +1,7 @@
+"""
+Let the tests import the modules in the repository root, which is not a package
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
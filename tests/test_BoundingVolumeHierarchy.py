@@ -0,0 +1,115 @@
+"""
+Check BVH queries against brute force over all boxes, and incremental refits against full ones
+"""
+import copy
+
+import numpy as np
+
+from BoundingVolumeHierarchy import BVH, componentBounds
+from Component import Component
+from DisplayableCube import DisplayableCube
+from Frustum import Frustum
+from GLUtility import GLUtility
+from Point import Point
+
+
+class NoProgram:
+    """
+    Displayables only call use() on their program before generating geometry, which needs no GL context
+    """
+
+    def use(self):
+        pass
+
+
+def treeCopy(bvh):
+    """
+    Copy the tree structure and node boxes, objects are shared
+    """
+    result = copy.copy(bvh)
+    result.nodeMin = bvh.nodeMin.copy()
+    result.nodeMax = bvh.nodeMax.copy()
+    return result
+
+
+def randomBoxes(n, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(-20, 20, (n, 3))
+    halfSizes = rng.uniform(0.1, 1.0, (n, 3))
+    return centers - halfSizes, centers + halfSizes
+
+
+def cubeTree(n):
+    root = Component(Point((0, 0, 0)))
+    for i in range(n):
+        child = Component(Point((i % 10, i // 10, 0)), DisplayableCube(NoProgram(), 0.5, 0.5, 0.5))
+        root.addChild(child)
+    root.update(np.identity(4))
+    return root
+
+
+def testRayQueryMatchesBruteForce():
+    boxMin, boxMax = randomBoxes(500)
+    bvh = BVH(boxMin, boxMax)
+    rng = np.random.default_rng(1)
+    for _ in range(50):
+        origin = rng.uniform(-30, 30, 3)
+        direction = rng.normal(size=3)
+        hit, _ = BVH.rayBoxes(origin, direction, boxMin, boxMax)
+        objects, distances = bvh.rayQuery(origin, direction)
+        assert set(objects.tolist()) == set(np.flatnonzero(hit).tolist())
+        assert np.all(np.diff(distances) >= 0)
+
+
+def testFrustumQueryMatchesBruteForce():
+    boxMin, boxMax = randomBoxes(500)
+    bvh = BVH(boxMin, boxMax)
+    glUtility = GLUtility()
+    frustum = Frustum(glUtility.view([0, 0, 30], [0, 0, 0], [0, 1, 0]), glUtility.perspective(45, 800, 600, 0.01, 40))
+    expected = np.flatnonzero(frustum.boxesVisible(boxMin, boxMax))
+    assert sorted(bvh.frustumQuery(frustum).tolist()) == expected.tolist()
+
+
+def testNearestMatchesBruteForce():
+    boxMin, boxMax = randomBoxes(500)
+    bvh = BVH(boxMin, boxMax)
+    rng = np.random.default_rng(2)
+    for point in rng.uniform(-25, 25, (50, 3)):
+        distances, _ = BVH.boxDistances(point, boxMin, boxMax)
+        index, distance = bvh.nearest(point)
+        assert np.isclose(distance, distances.min())
+        assert np.isclose(distances[index], distances.min())
+
+
+def testPartialRefitMatchesFullRefit():
+    boxMin, boxMax = randomBoxes(300)
+    bvh = BVH(boxMin, boxMax)
+    changed = np.array([3, 17, 150, 299])
+    boxMin, boxMax = boxMin.copy(), boxMax.copy()
+    boxMin[changed] += 5
+    boxMax[changed] += 7
+    full = treeCopy(bvh)
+    full.refit(boxMin, boxMax)
+    bvh.refit(boxMin, boxMax, changed)
+    assert np.array_equal(bvh.nodeMin, full.nodeMin)
+    assert np.array_equal(bvh.nodeMax, full.nodeMax)
+
+
+def testComponentUpdateFeedsRefit():
+    root = cubeTree(40)
+    bvh = BVH.fromComponent(root)
+    assert bvh.refitComponents() == 0
+
+    root.children[7].setCurrentPosition(Point((3, 12, 4)))
+    root.children[21].setCurrentScale((2, 2, 2))
+    root.update(np.identity(4))
+    assert bvh.changed == {root.children[7].bvhIndex, root.children[21].bvhIndex}
+    assert bvh.refitComponents() == 2
+    assert not bvh.changed
+
+    full = treeCopy(bvh)
+    full.refit(*componentBounds(bvh.objects))
+    assert np.allclose(bvh.nodeMin, full.nodeMin)
+    assert np.allclose(bvh.nodeMax, full.nodeMax)
+    objects, _ = bvh.rayQuery(np.array([3.0, 12.0, 20.0]), np.array([0.0, 0.0, -1.0]))
+    assert root.children[7].bvhIndex in objects.tolist()
@@ -0,0 +1,55 @@
+"""
+Check FlatSceneGraph world matrices against the recursive Component.update they replace
+"""
+import numpy as np
+
+from Component import Component
+from FlatSceneGraph import FlatSceneGraph
+from GLUtility import GLUtility
+from Point import Point
+
+
+def randomTree(n, seed=0):
+    """
+    Component tree of n joints without Displayables, each attached to a random earlier joint
+    """
+    rng = np.random.default_rng(seed)
+    components = [Component(Point((0, 0, 0)))]
+    for i in range(1, n):
+        c = Component(Point(tuple(rng.uniform(-2, 2, 3))))
+        c.setCurrentScale((rng.uniform(0.5, 1.5),) * 3)
+        for axis in c.axisBucket:
+            c.setCurrentAngle(rng.uniform(-90, 90), axis)
+        if i % 5 == 0:
+            c.setPreRotation(GLUtility.rotate(rng.uniform(0, 360), Point((0, 1, 0))))
+        components[rng.integers(i)].addChild(c)
+        components.append(c)
+    return components
+
+
+def assertMatchesComponents(graph, flat, plain):
+    for f, p in zip(flat, plain):
+        assert np.allclose(graph.worldMats[f.nodeIndex], p.transformationMat, atol=1e-4)
+        assert np.allclose(graph.normalMats[f.nodeIndex], p.normalMat, atol=1e-3)
+
+
+def testUpdateMatchesComponentUpdate():
+    plain = randomTree(60)
+    flat = randomTree(60)
+    plain[0].update(np.identity(4))
+    graph = FlatSceneGraph.fromComponent(flat[0])
+    flat[0].update(np.identity(4))
+    # both trees come from the same seed, so joints pair up by construction order
+    assertMatchesComponents(graph, flat, plain)
+
+    # incremental updates only recompute the changed nodes and their descendants
+    for components in (plain, flat):
+        components[7].setCurrentPosition(Point((1, 2, 3)))
+        components[3].setCurrentAngle(45, components[3].vAxis)
+        components[0].update(np.identity(4))
+    assertMatchesComponents(graph, flat, plain)
+
+    rootMat = GLUtility.translate(0, 0, -5)
+    plain[0].update(rootMat)
+    flat[0].update(rootMat)
+    assertMatchesComponents(graph, flat, plain)
@@ -0,0 +1,62 @@
+"""
+Check that instance groups pick up the world matrices of members bound to a FlatSceneGraph
+"""
+import numpy as np
+
+from Component import Component
+from DisplayableCube import DisplayableCube
+from FlatSceneGraph import FlatSceneGraph
+from Instancing import InstanceGroup
+from Point import Point
+
+
+class TableProgram:
+    """
+    Displayables only call use() on their program before generating geometry, and groups ask it for material slots
+    """
+
+    def use(self):
+        pass
+
+    def materialIndex(self, material):
+        return 0
+
+
+def flatCubes(n):
+    root = Component(Point((0, 0, 0)))
+    program = TableProgram()
+    for i in range(n):
+        root.addChild(Component(Point((i, 0, 0)), DisplayableCube(program, 0.5, 0.5, 0.5)))
+    graph = FlatSceneGraph.fromComponent(root)
+    root.update(np.identity(4))
+    return root, graph
+
+
+def testSyncGathersMovedGraphMembers():
+    root, graph = flatCubes(20)
+    group = InstanceGroup(root.children)
+    group.changedMin = group.changedMax = None
+
+    group.sync()
+    assert group.changedMin is None
+
+    for i in (3, 7):
+        root.children[i].setCurrentPosition(Point((i, 2, 0)))
+    root.update(np.identity(4))
+    group.sync()
+    assert (group.changedMin, group.changedMax) == (3, 7)
+    for c in root.children:
+        assert np.array_equal(group.data[c.instanceIndex, 0:16], graph.worldMats[c.nodeIndex].ravel())
+
+
+def testSyncAfterRemove():
+    root, graph = flatCubes(10)
+    group = InstanceGroup(root.children)
+    group.remove(root.children[2])
+    group.changedMin = group.changedMax = None
+
+    root.children[5].setCurrentPosition(Point((5, 3, 0)))
+    root.update(np.identity(4))
+    group.sync()
+    assert (group.changedMin, group.changedMax) == (4, 4)
+    assert np.array_equal(group.data[4, 0:16], graph.worldMats[root.children[5].nodeIndex].ravel())
@@ -0,0 +1,25 @@
+"""
+Check strip triangulation against the triangle list it replaces
+"""
+import numpy as np
+
+import ParametricSurface
+
+
+def testGridStripsMatchGridTriangles():
+    for rows, cols, wrap in ((2, 2, False), (5, 7, False), (18, 36, True)):
+        strips = ParametricSurface.gridStripIndices(rows, cols, wrapColumns=wrap)
+        triangles = ParametricSurface.gridIndices(rows, cols, wrapColumns=wrap).reshape(-1, 3)
+        converted = ParametricSurface.stripsToTriangles(strips)
+        assert ParametricSurface.stripTriangleNum(strips) == len(converted) == len(triangles)
+        # same triangles with the same winding, up to the rotation of their vertices
+        canonical = lambda t: {tuple(np.roll(row, -int(np.argmin(row)))) for row in t}
+        assert canonical(converted) == canonical(triangles)
+
+
+def testStripTriangleNumCountsEveryRun():
+    strips = np.array([0, 1, 2, 3, -1, 4, 5, -1, 6, 7, 8])
+    assert ParametricSurface.stripTriangleNum(strips) == len(ParametricSurface.stripsToTriangles(strips)) == 3
+    fans = ParametricSurface.fanStripIndices(0, 1, 6)
+    assert ParametricSurface.stripTriangleNum(fans) == len(ParametricSurface.fanIndices(0, 1, 6)) // 3
+    assert ParametricSurface.stripTriangleNum(np.zeros(0, dtype=np.int64)) == 0
@@ -0,0 +1,29 @@
+"""
+Check the render queue order: state first, then distance buckets front to back, then material and mesh
+"""
+import types
+
+import numpy as np
+
+from RenderQueue import RenderQueue
+
+
+def packet(center, material, mesh, routing="lighting"):
+    return types.SimpleNamespace(center=np.array(center, dtype=float), key=(routing, 0, material, mesh),
+                                 depth=0.0, bucket=0)
+
+
+def testBucketsAreFrontToBack():
+    queue = RenderQueue()
+    queue.packets = [packet((0, 0, -9), 1, 1), packet((0, 0, -1), 2, 1), packet((0, 0, -8), 2, 1),
+                     packet((0, 0, -1.5), 1, 1)]
+    queue.sort(np.zeros(3))
+    # 1 and 1.5 share a bucket, as do 8 and 9, materials are grouped inside each bucket
+    assert [p.center[2] for p in queue.packets] == [-1.5, -1, -9, -8]
+
+
+def testStateComesBeforeDistance():
+    queue = RenderQueue()
+    queue.packets = [packet((0, 0, -1), 1, 1, "vertex"), packet((0, 0, -50), 1, 1, "lighting")]
+    queue.sort(np.zeros(3))
+    assert [p.key[0] for p in queue.packets] == ["lighting", "vertex"]